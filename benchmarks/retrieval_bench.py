@@ -0,0 +1,250 @@
+"""
+Retrieval benchmark for MemoryManager and KnowledgeManager.
+
+Generates deterministic synthetic corpora (clustered unit vectors, fixed seed), ingests them
+through the public batch APIs and reports, per (target, backend, size):
+- ingest rows/sec
+- p50/p99 query latency (ms), measured end to end through query()/get_similar_messages()
+- on-disk size (bytes)
+- recall@k against exact (brute-force NumPy) cosine search
+
+Results are emitted as one JSON object per line so runs can be appended to a file and
+tracked over time.
+
+Usage:
+    python -m benchmarks.retrieval_bench --sizes 10000,100000 --dim 384 --output bench.jsonl
+"""
+
+from __future__ import annotations
+import argparse
+import datetime
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from core.knowledge_manager import KnowledgeManager
+from core.memory_manager import MemoryManager
+
+
+logger = logging.getLogger("nia.benchmarks.retrieval")
+
+TARGETS = ("knowledge", "memory")
+# MemoryManager has no vector search without LanceDB (it falls back to substring matching),
+# so only the knowledge target is benchmarked on the mmap/memory backends.
+BACKENDS = {"knowledge": ("lancedb", "mmap", "memory"), "memory": ("lancedb",)}
+
+
+class SyntheticCorpus:
+    """Clustered, unit-normalized float32 vectors addressed by text ids 'doc-<i>' / 'query-<j>'."""
+
+    def __init__(self, size: int, dim: int, n_queries: int = 100, seed: int = 0, clusters: int = 64, noise: float = 0.35) -> None:
+        rng = np.random.default_rng(seed)
+        centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+        assign = rng.integers(0, clusters, size=size)
+        self.vectors = centers[assign] + noise * rng.standard_normal((size, dim)).astype(np.float32)
+        self.vectors /= np.linalg.norm(self.vectors, axis=1, keepdims=True)
+
+        # Queries are perturbed corpus rows so every query has meaningful neighbours
+        picks = rng.integers(0, size, size=n_queries)
+        self.queries = self.vectors[picks] + noise * rng.standard_normal((n_queries, dim)).astype(np.float32)
+        self.queries /= np.linalg.norm(self.queries, axis=1, keepdims=True)
+        self.size = size
+        self.dim = dim
+
+    @staticmethod
+    def doc_text(i: int) -> str:
+        return f"doc-{i}"
+
+    @staticmethod
+    def query_text(j: int) -> str:
+        return f"query-{j}"
+
+    def vector_for(self, text: str) -> List[float]:
+        kind, _, idx = text.partition("-")
+        table = self.vectors if kind == "doc" else self.queries
+        return table[int(idx)].tolist()
+
+    def exact_top_k(self, k: int, chunk: int = 65536) -> np.ndarray:
+        """Ground-truth neighbour ids for every query, computed in corpus chunks to bound RAM."""
+        best_ids = np.zeros((len(self.queries), 0), dtype=np.int64)
+        best_scores = np.zeros((len(self.queries), 0), dtype=np.float32)
+        for start in range(0, self.size, chunk):
+            scores = self.queries @ self.vectors[start:start + chunk].T
+            ids = np.broadcast_to(np.arange(start, start + scores.shape[1]), scores.shape)
+            all_scores = np.concatenate([best_scores, scores], axis=1)
+            all_ids = np.concatenate([best_ids, ids], axis=1)
+            keep = np.argsort(-all_scores, axis=1, kind="stable")[:, :k]
+            best_scores = np.take_along_axis(all_scores, keep, axis=1)
+            best_ids = np.take_along_axis(all_ids, keep, axis=1)
+        return best_ids
+
+
+class SyntheticEmbeddings:
+    """Embeddings client that returns the corpus vector for a synthetic text id."""
+
+    def __init__(self, corpus: SyntheticCorpus) -> None:
+        self.corpus = corpus
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.corpus.vector_for(text)
+
+    def embed_documents(self, texts: Sequence[str]) -> List[List[float]]:
+        return [self.corpus.vector_for(t) for t in texts]
+
+
+def _batches(n: int, batch_size: int) -> Iterator[range]:
+    for start in range(0, n, batch_size):
+        yield range(start, min(start + batch_size, n))
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _git_rev() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def _ids_from_results(results: List[Dict[str, Any]], key: str) -> List[int]:
+    ids = []
+    for r in results:
+        value = r.get(key) or ""
+        if value.startswith("doc-"):
+            ids.append(int(value[4:]))
+    return ids
+
+
+def run_case(target: str, backend: str, corpus: SyntheticCorpus, k: int, truth: np.ndarray,
+             workdir: str, batch_size: int = 10000) -> Dict[str, Any]:
+    """Ingest the corpus into one manager/backend and measure it."""
+    embeddings = SyntheticEmbeddings(corpus)
+    path = os.path.join(workdir, f"{target}-{backend}-{corpus.size}")
+    shutil.rmtree(path, ignore_errors=True)
+
+    if target == "knowledge":
+        mgr = KnowledgeManager(index_path=path, embeddings_client=embeddings, enabled=True, backend=backend,
+                               shard_strategy="none")
+        mgr.top_k_default = k
+        ingest = lambda rows: mgr.add_sources((corpus.doc_text(i), corpus.doc_text(i), None) for i in rows)
+        search = lambda text: mgr.query(text, top_k=k)
+        id_key = "text"
+    else:
+        mgr = MemoryManager(persist=True, enabled=True, db_path=path, collection="bench",
+                            embeddings_client=embeddings, max_items=k)
+        ingest = lambda rows: mgr.store_messages(("bench", corpus.doc_text(i)) for i in rows)
+        search = lambda text: mgr.get_similar_messages(text, top_k=k)
+        id_key = "text"
+
+    t0 = time.perf_counter()
+    for rows in _batches(corpus.size, batch_size):
+        ingest(rows)
+    ingest_s = time.perf_counter() - t0
+
+    latencies = []
+    hits = 0
+    for j in range(len(corpus.queries)):
+        q0 = time.perf_counter()
+        results = search(corpus.query_text(j))
+        latencies.append((time.perf_counter() - q0) * 1000)
+        hits += len(set(_ids_from_results(results, id_key)) & set(truth[j].tolist()))
+
+    return {
+        "target": target,
+        "backend": backend,
+        "size": corpus.size,
+        "dim": corpus.dim,
+        "k": k,
+        "queries": len(corpus.queries),
+        "ingest_rows_per_s": corpus.size / ingest_s if ingest_s > 0 else None,
+        "query_p50_ms": float(np.percentile(latencies, 50)),
+        "query_p99_ms": float(np.percentile(latencies, 99)),
+        "disk_bytes": _dir_size(path),
+        "recall_at_k": hits / float(k * len(corpus.queries)),
+    }
+
+
+def run(sizes: Sequence[int], dim: int, targets: Sequence[str], backends: Sequence[str], k: int = 10,
+        n_queries: int = 100, seed: int = 0, workdir: Optional[str] = None, batch_size: int = 10000) -> List[Dict[str, Any]]:
+    """Run every requested case and return one result dict per case."""
+    own_dir = workdir is None
+    workdir = workdir or tempfile.mkdtemp(prefix="nia_bench_")
+    meta = {
+        "benchmark": "retrieval",
+        "timestamp": datetime.datetime.utcnow().isoformat() + "Z",
+        "git_rev": _git_rev(),
+        "seed": seed,
+    }
+    results = []
+    try:
+        for size in sizes:
+            corpus = SyntheticCorpus(size, dim, n_queries=n_queries, seed=seed)
+            truth = corpus.exact_top_k(k)
+            for target in targets:
+                for backend in backends:
+                    if backend not in BACKENDS[target]:
+                        logger.info("Skipping %s/%s: backend has no vector search for this target.", target, backend)
+                        continue
+                    logger.info("Running %s/%s with %s vectors (dim=%s).", target, backend, size, dim)
+                    results.append({**meta, **run_case(target, backend, corpus, k, truth, workdir, batch_size)})
+    finally:
+        if own_dir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="NIA retrieval benchmark")
+    parser.add_argument("--sizes", default="10000", help="Comma-separated corpus sizes (e.g. 10000,100000,1000000)")
+    parser.add_argument("--dim", type=int, default=384, help="Vector dimension")
+    parser.add_argument("--targets", default=",".join(TARGETS), help="knowledge,memory")
+    parser.add_argument("--backends", default="lancedb,mmap", help="lancedb,mmap,memory")
+    parser.add_argument("--k", type=int, default=10, help="Top-k for latency and recall")
+    parser.add_argument("--queries", type=int, default=100, help="Queries per case")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=10000, help="Rows per ingest call")
+    parser.add_argument("--workdir", default=None, help="Keep indexes here instead of a temp dir")
+    parser.add_argument("--output", default=None, help="Append JSON lines to this file (stdout if omitted)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+    results = run(
+        sizes=[int(s) for s in args.sizes.split(",") if s],
+        dim=args.dim,
+        targets=[t for t in args.targets.split(",") if t],
+        backends=[b for b in args.backends.split(",") if b],
+        k=args.k,
+        n_queries=args.queries,
+        seed=args.seed,
+        workdir=args.workdir,
+        batch_size=args.batch_size,
+    )
+    lines = [json.dumps(r, sort_keys=True) for r in results]
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+    else:
+        sys.stdout.write("\n".join(lines) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
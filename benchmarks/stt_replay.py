@@ -0,0 +1,295 @@
+"""
+Recorded-audio replay harness for the live STT pipeline.
+
+Replaces the microphone with a fake sounddevice input stream that plays WAV/FLAC files
+into the shared AudioCaptureHub at real-time or accelerated pace, then drives
+STTManager's full listening loop (capture ring -> VAD/energy gate -> DeepFilterNet ->
+Vosk -> adaptive endpointing) exactly as a voice session would, one session per utterance.
+Reports, per file:
+- real-time factor: process CPU time / audio duration (and wall time for the run)
+- end-of-utterance latency: trailing silence at each endpoint (p50/max, ms), plus the
+  endpoint lag (audio captured after the deciding frame, i.e. the step-size penalty)
+- dropped audio: samples consumers skipped after falling behind the ring, and overflows
+- allocations: tracemalloc peak and the blocks still held by core/ code afterwards
+
+No microphone or PortAudio is needed. With --fake-recognizer no Vosk model is needed
+either, which isolates the cost of the audio path itself.
+
+Usage:
+    python -m benchmarks.stt_replay recordings/*.wav --speed 4 --output stt_bench.jsonl
+"""
+
+from __future__ import annotations
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from core import vosk_models
+from core.batch_transcriber import iter_audio_files, load_audio
+from core.config import settings
+from core.endpointing import ENDPOINT
+from core.stt_manager import STTManager
+
+
+logger = logging.getLogger("nia.benchmarks.stt_replay")
+
+
+class ReplayInputStream:
+    """Stands in for sd.RawInputStream: plays int16 audio into the callback from a thread.
+
+    Blocks are paced at `speed` x real time. Once the audio is exhausted the stream keeps
+    delivering silence (like an idle microphone) until it is stopped.
+    """
+
+    def __init__(self, audio: np.ndarray, speed: float = 1.0, *, samplerate: int, blocksize: int,
+                 callback, dtype: str = "int16", channels: int = 1, device: Any = None) -> None:
+        if speed <= 0:
+            raise ValueError("Replay speed must be positive")
+        self.audio = np.ascontiguousarray(audio, dtype=np.int16)
+        self.speed = speed
+        self.samplerate = samplerate
+        self.blocksize = blocksize
+        self.callback = callback
+        self.delivered = 0  # samples handed to the callback, including trailing silence
+        self.late_blocks = 0  # blocks delivered more than one block period behind schedule
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.delivered >= self.audio.shape[0]
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="nia-replay", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+
+    def close(self) -> None:
+        pass
+
+    def _run(self) -> None:
+        period = self.blocksize / self.samplerate / self.speed
+        silence = np.zeros(self.blocksize, dtype=np.int16)
+        t0 = time.perf_counter()
+        block_index = 0
+        while not self._stop.is_set():
+            delay = t0 + block_index * period - time.perf_counter()
+            if delay > 0:
+                if self._stop.wait(delay):
+                    return
+            elif -delay > period:
+                self.late_blocks += 1
+            start = self.delivered
+            block = self.audio[start:start + self.blocksize]
+            if block.shape[0] < self.blocksize:
+                block = np.concatenate([block, silence[:self.blocksize - block.shape[0]]])
+            self.callback(block.tobytes(), self.blocksize, None, None)
+            self.delivered += self.blocksize
+            block_index += 1
+
+
+class NullRecognizer:
+    """Stands in for KaldiRecognizer when no model is wanted: accepts audio, never decodes."""
+
+    def __init__(self, *args) -> None:
+        self.samples = 0
+
+    def AcceptWaveform(self, data) -> bool:
+        self.samples += len(data) // 2
+        return False
+
+    def Result(self) -> str:
+        return json.dumps({"text": ""})
+
+    def PartialResult(self) -> str:
+        return json.dumps({"partial": ""})
+
+    def FinalResult(self) -> str:
+        return json.dumps({"text": ""})
+
+
+def _git_rev() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def _to_int16(audio: np.ndarray) -> np.ndarray:
+    return (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+
+
+async def _replay(audio: np.ndarray, speed: float, use_vad: Optional[bool], use_dfn: Optional[bool],
+                  fake_recognizer: bool, trace_allocations: bool, profile: Optional[str]) -> Dict[str, Any]:
+    if fake_recognizer:
+        vosk_models.register(settings["stt"]["vosk_model_path"], object())
+    mgr = STTManager(asyncio.get_running_loop(), profile=profile)
+    if use_vad is False:
+        mgr.use_vad, mgr.vad_provider = False, None
+    if use_dfn is False and mgr.enhancer is not None:
+        mgr.enhancer.close()
+        mgr.use_dfn, mgr.enhancer = False, None
+    if fake_recognizer:
+        mgr.recognizer = NullRecognizer()
+    await mgr.wait_until_ready()
+
+    streams: List[ReplayInputStream] = []
+
+    def stream_factory(**kwargs) -> ReplayInputStream:
+        stream = ReplayInputStream(audio, speed, **kwargs)
+        streams.append(stream)
+        return stream
+
+    mgr.capture._stream_factory = stream_factory
+
+    if trace_allocations:
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        base_traced, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+    utterances: List[Dict[str, Any]] = []
+    cpu0, wall0 = time.process_time(), time.perf_counter()
+    try:
+        while True:
+            finals, partials = [], 0
+            async for event in mgr.listen_stream():
+                if event.kind == "partial":
+                    partials += 1
+                elif event.text:
+                    finals.append(event.text)
+            reason = mgr.endpointer.last_reason
+            if reason == ENDPOINT or finals:
+                utterances.append({
+                    "text": " ".join(finals),
+                    "reason": reason,
+                    "partials": partials,
+                    "eou_latency_ms": mgr.endpointer.last_eou_latency_ms if reason == ENDPOINT else None,
+                    "endpoint_lag_ms": mgr.last_endpoint_lag_ms if reason == ENDPOINT else None,
+                })
+            if not streams or streams[0].finished:
+                break
+        cpu_s, wall_s = time.process_time() - cpu0, time.perf_counter() - wall0
+        if trace_allocations:
+            _, peak = tracemalloc.get_traced_memory()
+            core_dir = os.path.dirname(os.path.abspath(sys.modules[STTManager.__module__].__file__))
+            diff = [d for d in tracemalloc.take_snapshot().compare_to(before, "filename")
+                    if d.traceback[0].filename.startswith(core_dir)]
+    finally:
+        if trace_allocations:
+            tracemalloc.stop()
+        stream = streams[0] if streams else None
+        mgr.shutdown()
+        if fake_recognizer:
+            vosk_models.forget(settings["stt"]["vosk_model_path"])  # later STTManagers load the real model
+
+    delivered_s = (stream.delivered if stream else 0) / mgr.sample_rate
+    latencies = [u["eou_latency_ms"] for u in utterances if u["eou_latency_ms"] is not None]
+    lags = [u["endpoint_lag_ms"] for u in utterances if u["endpoint_lag_ms"] is not None]
+    result: Dict[str, Any] = {
+        "utterances": len(utterances),
+        "transcript": " ".join(u["text"] for u in utterances if u["text"]),
+        "audio_s": round(audio.shape[0] / mgr.sample_rate, 3),
+        "replayed_s": round(delivered_s, 3),
+        "speed": speed,
+        "profile": mgr.profile,
+        "wall_s": round(wall_s, 3),
+        "cpu_s": round(cpu_s, 3),
+        "rtf": round(cpu_s / delivered_s, 4) if delivered_s else None,
+        "eou_latency_p50_ms": float(np.percentile(latencies, 50)) if latencies else None,
+        "eou_latency_max_ms": max(latencies) if latencies else None,
+        "endpoint_lag_p50_ms": float(np.percentile(lags, 50)) if lags else None,
+        "endpoint_lag_max_ms": max(lags) if lags else None,
+        "dropped_samples": mgr.capture.dropped,
+        "dropped_blocks": -(-mgr.capture.dropped // mgr.capture.blocksize),
+        "overflows": mgr.capture.overflows,
+        "late_blocks": stream.late_blocks if stream else 0,
+        "vad": mgr.use_vad,
+        "dfn": mgr.enhancer is not None,
+        "fake_recognizer": fake_recognizer,
+    }
+    if mgr.enhancer is not None:
+        result["enhancement"] = mgr.enhancer.metrics()
+    if trace_allocations:
+        result["alloc_peak_kib"] = round((peak - base_traced) / 1024, 1)
+        result["alloc_retained_blocks"] = sum(d.count_diff for d in diff)
+        result["alloc_retained_kib"] = round(sum(d.size_diff for d in diff) / 1024, 1)
+    return result
+
+
+def replay(audio: np.ndarray, speed: float = 1.0, use_vad: Optional[bool] = None, use_dfn: Optional[bool] = None,
+           fake_recognizer: bool = False, trace_allocations: bool = True, profile: Optional[str] = None) -> Dict[str, Any]:
+    """Replay int16 (or float32 in [-1, 1]) 16 kHz mono audio through STTManager and measure it.
+
+    tracemalloc slows Python allocations, so compare RTF only between runs with the same setting.
+    """
+    if audio.dtype != np.int16:
+        audio = _to_int16(audio)
+    return asyncio.run(_replay(audio, speed, use_vad, use_dfn, fake_recognizer, trace_allocations, profile))
+
+
+def run(paths: Sequence[str], speed: float = 1.0, use_vad: Optional[bool] = None, use_dfn: Optional[bool] = None,
+        fake_recognizer: bool = False, trace_allocations: bool = True, profile: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Replay every WAV/FLAC file (directories are expanded) and return one result per file."""
+    meta = {
+        "benchmark": "stt_replay",
+        "timestamp": datetime.datetime.utcnow().isoformat() + "Z",
+        "git_rev": _git_rev(),
+    }
+    results = []
+    for path in iter_audio_files(paths):
+        logger.info("Replaying '%s' at %sx.", path, speed)
+        audio = load_audio(path, 16000)
+        results.append({**meta, "path": path,
+                        **replay(audio, speed, use_vad, use_dfn, fake_recognizer, trace_allocations, profile)})
+    return results
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay recorded audio through NIA's STT pipeline")
+    parser.add_argument("inputs", nargs="+", help="WAV/FLAC files or directories")
+    parser.add_argument("--speed", type=float, default=1.0, help="Playback pace as a multiple of real time")
+    parser.add_argument("--profile", default=None, help="STT latency profile (default: stt.profile)")
+    parser.add_argument("--no-vad", action="store_true", help="Use the energy gate instead of Silero VAD")
+    parser.add_argument("--no-dfn", action="store_true", help="Skip DeepFilterNet enhancement")
+    parser.add_argument("--fake-recognizer", action="store_true", help="Measure the audio path without a Vosk model")
+    parser.add_argument("--no-trace-alloc", action="store_true", help="Skip tracemalloc (slightly lower RTF)")
+    parser.add_argument("--output", default=None, help="Append JSON lines to this file (stdout if omitted)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+    results = run(
+        args.inputs,
+        speed=args.speed,
+        use_vad=False if args.no_vad else None,
+        use_dfn=False if args.no_dfn else None,
+        fake_recognizer=args.fake_recognizer,
+        trace_allocations=not args.no_trace_alloc,
+        profile=args.profile,
+    )
+    lines = [json.dumps(r, sort_keys=True) for r in results]
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+    else:
+        sys.stdout.write("\n".join(lines) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
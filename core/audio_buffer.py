@@ -0,0 +1,123 @@
+"""
+AudioRingBuffer — Fixed-capacity sample ring with zero-copy frame views.
+
+The backing array holds every sample twice (a "mirrored" ring of 2 x capacity), so any
+window of up to `capacity` samples is one contiguous slice of the array. Readers get
+plain NumPy views (no copies, no per-block allocation) that stay valid until the writer
+has written `capacity - len(view)` further samples.
+
+The buffer itself is not locked; a single thread should own writes and reads, or the
+caller must serialize them (AudioCaptureHub does this for its subscribers).
+
+With `track_reads=False` the ring is writer-only: readers keep their own absolute
+cursors and use view()/latest(), so write() does no overrun accounting and read()/
+frames() are unavailable.
+"""
+
+from __future__ import annotations
+import logging
+from typing import Iterator, Optional
+
+import numpy as np
+
+
+logger = logging.getLogger("nia.core.audio_buffer")
+
+
+class AudioRingBuffer:
+    def __init__(self, capacity: int, dtype: np.dtype = np.float32, track_reads: bool = True) -> None:
+        if capacity <= 0:
+            raise ValueError("Ring buffer capacity must be positive")
+        self.capacity = int(capacity)
+        self.dtype = np.dtype(dtype)
+        self.track_reads = track_reads
+        self._buf = np.zeros(2 * self.capacity, dtype=self.dtype)
+        self._write_total = 0  # samples ever written
+        self._read_total = 0  # samples ever consumed by read()/frames()
+        self.dropped = 0  # unread samples overwritten because the reader fell behind
+
+    # --- Properties --------------------------------------------------------------
+    @property
+    def available(self) -> int:
+        """Unread samples."""
+        return self._write_total - self._read_total
+
+    @property
+    def write_total(self) -> int:
+        return self._write_total
+
+    # --- Write path --------------------------------------------------------------
+    def write(self, samples: np.ndarray) -> int:
+        """Copy samples into the ring (twice, for the mirror) and return how many were written."""
+        data = np.asarray(samples)
+        n = int(data.shape[0])
+        if n == 0:
+            return 0
+        if n > self.capacity:
+            # Only the newest `capacity` samples can be kept
+            self._write_total += n - self.capacity
+            data = data[-self.capacity:]
+            n = self.capacity
+
+        cap = self.capacity
+        pos = self._write_total % cap
+        first = min(n, cap - pos)
+        self._buf[pos:pos + first] = data[:first]
+        self._buf[cap + pos:cap + pos + first] = data[:first]
+        rest = n - first
+        if rest:
+            self._buf[:rest] = data[first:]
+            self._buf[cap:cap + rest] = data[first:]
+        self._write_total += n
+        if not self.track_reads:
+            return n
+
+        overrun = self._write_total - self._read_total - cap
+        if overrun > 0:
+            self.dropped += overrun
+            self._read_total += overrun
+            logger.debug("Audio ring overrun: dropped %s unread samples.", overrun)
+        return n
+
+    # --- Read path ---------------------------------------------------------------
+    def view(self, start: int, n: int) -> np.ndarray:
+        """Contiguous view of `n` samples starting at absolute sample index `start`."""
+        if n > self.capacity:
+            raise ValueError(f"Cannot view {n} samples from a ring of {self.capacity}")
+        if start < self._write_total - self.capacity or start + n > self._write_total:
+            raise IndexError(f"Samples [{start}, {start + n}) are not in the ring")
+        pos = start % self.capacity
+        return self._buf[pos:pos + n]
+
+    def read(self, n: int) -> Optional[np.ndarray]:
+        """Consume `n` samples and return them as a view, or None if fewer are available."""
+        self._require_reads()
+        if self.available < n:
+            return None
+        frame = self.view(self._read_total, n)
+        self._read_total += n
+        return frame
+
+    def frames(self, frame_size: int) -> Iterator[np.ndarray]:
+        """Yield every complete frame currently buffered; a partial tail stays for the next call."""
+        self._require_reads()
+        if frame_size > self.capacity:
+            raise ValueError(f"Cannot view {frame_size} samples from a ring of {self.capacity}")
+        buf, cap = self._buf, self.capacity
+        while self._write_total - self._read_total >= frame_size:
+            pos = self._read_total % cap
+            self._read_total += frame_size
+            yield buf[pos:pos + frame_size]
+
+    def latest(self, n: int) -> np.ndarray:
+        """View of the most recent `n` samples (fewer if the ring has not filled yet)."""
+        n = min(int(n), self._write_total, self.capacity)
+        return self.view(self._write_total - n, n)
+
+    def clear(self) -> None:
+        """Discard unread samples; the backing array is reused."""
+        self._read_total = self._write_total
+
+    def _require_reads(self) -> None:
+        if not self.track_reads:
+            raise RuntimeError("This ring is writer-only; read it through view() or latest()")
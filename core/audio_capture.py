@@ -0,0 +1,190 @@
+"""
+AudioCaptureHub — One long-lived microphone stream shared by every audio consumer.
+
+- Owns a single sd.RawInputStream, opened once and kept open, so listening starts instantly.
+- The PortAudio callback writes int16 blocks into one shared AudioRingBuffer.
+- Consumers (wake spotter, transcriber, VAD, level meter) each hold an AudioSubscription
+  with their own read cursor and receive zero-copy views into the ring.
+- Because the ring is always filling, a new consumer can start in the past: the
+  transcriber starts with a pre-roll, or right where the wake spotter fired.
+"""
+
+from __future__ import annotations
+import logging
+import threading
+from typing import Any, Callable, Optional
+
+import numpy as np
+
+try:
+    import sounddevice as sd
+except (ImportError, OSError):  # PortAudio missing; a stream_factory must be injected
+    sd = None
+
+from core.audio_buffer import AudioRingBuffer
+
+
+logger = logging.getLogger("nia.core.audio_capture")
+
+
+class AudioSubscription:
+    """A consumer's cursor into the hub's ring buffer."""
+
+    def __init__(self, hub: "AudioCaptureHub", name: str, start: int) -> None:
+        self.hub = hub
+        self.name = name
+        self.cursor = start  # absolute sample index of the next unread sample
+        self.dropped = 0  # samples skipped because this consumer fell behind the ring
+        self.closed = False
+
+    @property
+    def available(self) -> int:
+        return self.hub.ring.write_total - self.cursor
+
+    def read(self, n: int, timeout: Optional[float] = None) -> Optional[np.ndarray]:
+        """Wait for `n` new samples and return them as an int16 view, or None on timeout/close.
+
+        The view is only valid until the ring wraps over it, so consume (or copy) it promptly.
+        """
+        hub = self.hub
+        with hub._cond:
+            if not hub._cond.wait_for(lambda: self.closed or not hub.running or self.available >= n, timeout):
+                return None
+            if self.closed or self.available < n:
+                return None
+            self._skip_overrun()
+            view = hub.ring.view(self.cursor, n)
+            self.cursor += n
+            return view
+
+    def read_available(self, max_n: Optional[int] = None, timeout: Optional[float] = None) -> Optional[np.ndarray]:
+        """Return every unread sample (up to `max_n`) once at least one is available."""
+        hub = self.hub
+        with hub._cond:
+            if not hub._cond.wait_for(lambda: self.closed or not hub.running or self.available > 0, timeout):
+                return None
+            if self.closed or self.available <= 0:
+                return None
+            self._skip_overrun()
+            n = min(self.available, max_n or hub.ring.capacity, hub.ring.capacity)
+            view = hub.ring.view(self.cursor, n)
+            self.cursor += n
+            return view
+
+    def skip_to_now(self) -> None:
+        """Discard everything buffered so far."""
+        with self.hub._cond:
+            self.cursor = self.hub.ring.write_total
+
+    def _skip_overrun(self) -> None:
+        oldest = self.hub.ring.write_total - self.hub.ring.capacity
+        if self.cursor < oldest:
+            self.dropped += oldest - self.cursor
+            self.hub.dropped += oldest - self.cursor
+            logger.warning("Audio consumer '%s' fell behind; skipped %s samples.", self.name, oldest - self.cursor)
+            self.cursor = oldest
+
+    def close(self) -> None:
+        self.hub.unsubscribe(self)
+
+
+class AudioCaptureHub:
+    def __init__(
+        self,
+        sample_rate: int = 16000,
+        blocksize: int = 1600,
+        capacity_s: float = 10.0,
+        device: Optional[Any] = None,
+        stream_factory: Optional[Callable[..., Any]] = None,
+    ) -> None:
+        self.sample_rate = sample_rate
+        self.blocksize = blocksize
+        self.device = device
+        # Subscriptions keep their own cursors (and count their own drops), so the ring only writes
+        self.ring = AudioRingBuffer(int(sample_rate * capacity_s), dtype=np.int16, track_reads=False)
+        self._stream_factory = stream_factory
+        self._stream = None
+        self._cond = threading.Condition()
+        self._subscribers: list[AudioSubscription] = []
+        self.running = False
+        self.overflows = 0  # callbacks PortAudio flagged with an input overflow
+        self.dropped = 0  # samples consumers skipped because they fell behind the ring
+
+    # --- Lifecycle ---------------------------------------------------------------
+    def start(self) -> None:
+        """Open the microphone once; later calls are no-ops while it stays open."""
+        with self._cond:
+            if self.running:
+                return
+            factory = self._stream_factory
+            if factory is None:
+                if sd is None:
+                    raise RuntimeError("sounddevice/PortAudio is not available for audio capture")
+                factory = sd.RawInputStream
+            self._stream = factory(samplerate=self.sample_rate, blocksize=self.blocksize, dtype="int16",
+                                   channels=1, device=self.device, callback=self._callback)
+            self._stream.start()
+            self.running = True
+        logger.info("Audio capture started (rate=%s, block=%s).", self.sample_rate, self.blocksize)
+
+    def stop(self) -> None:
+        with self._cond:
+            stream, self._stream = self._stream, None
+            self.running = False
+            self._cond.notify_all()
+        if stream is not None:
+            try:
+                stream.stop()
+                stream.close()
+            except Exception:
+                logger.exception("Error closing audio capture stream.")
+        logger.info("Audio capture stopped.")
+
+    # --- Subscribers -------------------------------------------------------------
+    def subscribe(self, name: str, preroll_samples: int = 0, start: Optional[int] = None) -> AudioSubscription:
+        """Register a consumer whose cursor starts `preroll_samples` before now.
+
+        `start` instead gives an absolute sample index (e.g. a position recorded by another
+        subscriber); it is clamped to what the ring still holds.
+        """
+        with self._cond:
+            ring = self.ring
+            oldest = max(ring.write_total - ring.capacity, 0)
+            if start is None:
+                start = ring.write_total - min(max(preroll_samples, 0), ring.write_total, ring.capacity)
+            start = min(max(int(start), oldest), ring.write_total)
+            sub = AudioSubscription(self, name, start)
+            self._subscribers.append(sub)
+        return sub
+
+    def unsubscribe(self, sub: AudioSubscription) -> None:
+        with self._cond:
+            sub.closed = True
+            if sub in self._subscribers:
+                self._subscribers.remove(sub)
+            self._cond.notify_all()
+
+    # --- Capture -----------------------------------------------------------------
+    def _callback(self, indata, frames, time, status) -> None:
+        """PortAudio callback: one copy into the shared ring, then wake the consumers."""
+        if status:
+            self.overflows += 1
+            logger.warning("Audio capture status: %s", status)
+        samples = np.frombuffer(indata, dtype=np.int16)
+        with self._cond:
+            self.ring.write(samples)
+            self._cond.notify_all()
+
+    def latest(self, n: int) -> np.ndarray:
+        """Copy of the most recent `n` samples, e.g. for pre-roll or a second-pass decode."""
+        with self._cond:
+            return self.ring.latest(n).copy()
+
+    def level_dbfs(self, window_s: float = 0.1) -> float:
+        """RMS level of the most recent audio in dBFS, for level meters."""
+        with self._cond:
+            recent = self.ring.latest(int(self.sample_rate * window_s))
+            if recent.shape[0] == 0:
+                return -120.0
+            rms = float(np.sqrt(np.mean(np.square(recent, dtype=np.float64))))
+        return 20.0 * np.log10(max(rms / 32768.0, 1e-6))
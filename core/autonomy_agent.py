@@ -17,9 +17,19 @@ from typing import Optional, List
 
 from core.config import settings
 from core.memory_manager import MemoryManager
+from core.retrieval import RetrievalCoordinator
 
 logger = logging.getLogger("nia.core.autonomy")
 
+# Suggestions used when no memory context is available, by trigger type
+_FALLBACK_SUGGESTIONS = {
+    "decision_keyword": "I can help you think through that decision. What factors are you considering?",
+    "hesitation": "It sounds like you're thinking through something. Want to talk it out?",
+    "repetition": "I notice you've mentioned this before. Would you like some help with it?",
+}
+_TOPIC_FALLBACK = "I noticed you mentioned {topic}. Would you like some help with that?"
+_DEFAULT_FALLBACK = "Is there anything I can help you with right now?"
+
 
 @dataclass
 class AutonomousSuggestion:
@@ -32,7 +42,7 @@ class AutonomousSuggestion:
 
 
 class AutonomyAgent:
-    def __init__(self, loop: asyncio.AbstractEventLoop, memory: MemoryManager | None = None):
+    def __init__(self, loop: asyncio.AbstractEventLoop, memory: MemoryManager | None = None, retrieval: RetrievalCoordinator | None = None):
         self.loop = loop
         self._stop_event = threading.Event()
         self._paused_event = threading.Event()
@@ -49,6 +59,8 @@ class AutonomyAgent:
         self.use_memory = bool(cfg.get("use_memory", True))
         self.max_memory_snippets = int(cfg.get("max_memory_snippets", 5))
         self.memory = memory or MemoryManager()
+        # Shared per-turn retrieval; reuses the embedding/search already done for the Brain
+        self.retrieval = retrieval
         
         # Context-aware configuration
         self.confidence_threshold = float(cfg.get("confidence_threshold", 0.6))
@@ -142,7 +154,9 @@ class AutonomyAgent:
         memory_context = []
         if self.use_memory and self.memory and self._last_user_input:
             try:
-                if self.loop.is_running():
+                if self.retrieval is not None:
+                    sims = self.retrieval.retrieve(self._last_user_input, timeout=2.0).memory
+                elif self.loop.is_running():
                     fut = asyncio.run_coroutine_threadsafe(
                         self.memory.query_memory(topic=self._last_user_input, recent_n=self.max_memory_snippets, min_score=0.0),
                         self.loop,
@@ -245,14 +259,16 @@ class AutonomyAgent:
 
         # Fallback to lightweight templates
         if trigger_type == "high_value_topic" and topic:
-            return f"I noticed you mentioned {topic}. Would you like some help with that?"
-        if trigger_type == "decision_keyword":
-            return "I can help you think through that decision. What factors are you considering?"
-        if trigger_type == "hesitation":
-            return "It sounds like you're thinking through something. Want to talk it out?"
-        if trigger_type == "repetition":
-            return "I notice you've mentioned this before. Would you like some help with it?"
-        return "Is there anything I can help you with right now?"
+            return _TOPIC_FALLBACK.format(topic=topic)
+        return _FALLBACK_SUGGESTIONS.get(trigger_type, _DEFAULT_FALLBACK)
+
+    def fixed_phrases(self) -> List[str]:
+        """Every fallback suggestion that needs no memory context (for TTS cache prewarming)."""
+        return [
+            *(_TOPIC_FALLBACK.format(topic=t) for t in self.high_value_topics),
+            *_FALLBACK_SUGGESTIONS.values(),
+            _DEFAULT_FALLBACK,
+        ]
 
     def _generate_suggestion(self) -> Optional[AutonomousSuggestion]:
         """
@@ -0,0 +1,269 @@
+"""
+Offline batch transcription of WAV/FLAC files through the live STT pipeline.
+
+- Same stages as STTManager: Silero VAD (or the energy gate), optional DeepFilterNet,
+  Vosk decoding and adaptive endpointing, which here splits a file into segments.
+- Files fan out over a process pool; each worker loads the Vosk model (and VAD/DFN)
+  once in its initializer and then transcribes many files.
+- Every result reports the real-time factor (processing time / audio duration).
+
+Usage:
+    python -m core.batch_transcriber recordings/ --workers 4 --output transcripts.jsonl
+"""
+
+from __future__ import annotations
+import argparse
+import json
+import logging
+import multiprocessing as mp
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+from vosk import KaldiRecognizer
+
+from core import vosk_models
+from core.audio_buffer import AudioRingBuffer
+from core.config import settings
+from core.endpointing import CONTINUE, NO_SPEECH, AdaptiveEndpointer, frame_energy_flags
+
+
+logger = logging.getLogger("nia.core.batch_transcriber")
+
+AUDIO_EXTENSIONS = (".wav", ".flac")
+
+
+def iter_audio_files(paths: Iterable[str]) -> Iterator[str]:
+    """Expand files and directories (recursively) into WAV/FLAC paths, sorted per directory."""
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith(AUDIO_EXTENSIONS):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+
+def load_audio(path: str, sample_rate: int = 16000) -> np.ndarray:
+    """Read a WAV/FLAC file as mono float32 at `sample_rate` (linear-interpolation resample)."""
+    import soundfile as sf
+
+    audio, file_rate = sf.read(path, dtype="float32", always_2d=True)
+    mono = audio.mean(axis=1) if audio.shape[1] > 1 else audio[:, 0]
+    if file_rate != sample_rate and mono.size:
+        n_out = int(round(mono.size * sample_rate / file_rate))
+        positions = np.arange(n_out, dtype=np.float64) * (file_rate / sample_rate)
+        mono = np.interp(positions, np.arange(mono.size), mono).astype(np.float32)
+    return np.ascontiguousarray(mono, dtype=np.float32)
+
+
+class FilePipeline:
+    """VAD -> enhancement -> Vosk -> endpointing over a whole in-memory signal."""
+
+    def __init__(self, model: Any, sample_rate: int = 16000, blocksize: int = 8000,
+                 vad_provider: Optional[Any] = None, dfn_provider: Optional[Any] = None,
+                 stt_cfg: Optional[Dict[str, Any]] = None) -> None:
+        stt_cfg = stt_cfg if stt_cfg is not None else settings.get("stt", {})
+        self.model = model
+        self.sample_rate = sample_rate
+        self.blocksize = blocksize
+        self.frame_size = 512
+        self.vad_provider = vad_provider
+        self.dfn_provider = dfn_provider
+        self.endpointer = AdaptiveEndpointer.from_config(stt_cfg)
+        self.energy_dbfs = float((stt_cfg.get("endpointing", {}) or {}).get("energy_threshold_dbfs", -45.0))
+
+    def transcribe(self, audio: np.ndarray) -> List[Dict[str, Any]]:
+        """Return [{start_s, end_s, text}] segments for a mono float32 signal."""
+        recognizer = KaldiRecognizer(self.model, self.sample_rate)
+        ring = AudioRingBuffer(max(self.sample_rate, 2 * self.blocksize), dtype=np.float32)
+        frame_ms = 1000.0 * self.frame_size / self.sample_rate
+        if self.vad_provider is not None and hasattr(self.vad_provider, "reset"):
+            self.vad_provider.reset()
+        self.endpointer.start()
+
+        # Quantize once per file; without enhancement Vosk reads slices of this directly
+        pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16) if self.dfn_provider is None else None
+        segments: List[Dict[str, Any]] = []
+        texts: List[str] = []
+        seg_start: Optional[float] = None
+
+        def close_segment(end_s: float, result_json: str) -> None:
+            nonlocal seg_start
+            text = json.loads(result_json).get("text", "")
+            if text:
+                texts.append(text)
+            if texts and seg_start is not None:
+                segments.append({"start_s": round(seg_start, 3), "end_s": round(end_s, 3), "text": " ".join(texts)})
+            texts.clear()
+            seg_start = None
+
+        for start in range(0, audio.shape[0], self.blocksize):
+            block = audio[start:start + self.blocksize]
+            ring.write(block)
+            n_frames = ring.available // self.frame_size
+            frames = ring.read(n_frames * self.frame_size).reshape(n_frames, self.frame_size) if n_frames else None
+            if frames is None:
+                flags = np.zeros(0, dtype=bool)
+            elif self.vad_provider is not None:
+                flags = np.asarray(self.vad_provider.process_frames(frames), dtype=bool)
+            else:
+                flags = frame_energy_flags(frames, self.energy_dbfs)
+
+            if self.endpointer.in_speech or flags.any():
+                if seg_start is None:
+                    seg_start = start / self.sample_rate
+                if pcm is not None:
+                    data = pcm[start:start + self.blocksize].tobytes()
+                else:
+                    chunk = np.asarray(self.dfn_provider.enhance_frame(block), dtype=np.float32)
+                    data = (np.clip(chunk, -1.0, 1.0) * 32767).astype(np.int16).tobytes()
+                if recognizer.AcceptWaveform(data):
+                    self.endpointer.note_final()
+                    text = json.loads(recognizer.Result()).get("text", "")
+                    if text:
+                        texts.append(text)
+
+            block_end_s = (start + block.shape[0]) / self.sample_rate
+            for is_speech in flags:
+                decision = self.endpointer.update(frame_ms, bool(is_speech))
+                if decision != CONTINUE:
+                    if decision != NO_SPEECH:
+                        close_segment(block_end_s, recognizer.FinalResult())
+                    self.endpointer.start()
+                    break
+
+        close_segment(audio.shape[0] / self.sample_rate, recognizer.FinalResult())
+        return segments
+
+
+# --- Process-pool workers -------------------------------------------------------
+_worker_pipeline: Optional[FilePipeline] = None
+
+
+def _init_worker(model_path: str, sample_rate: int, blocksize: int, use_vad: bool, use_dfn: bool) -> None:
+    """Load the model and providers once per worker process."""
+    global _worker_pipeline
+    from core.stt_manager import build_dfn_provider, build_vad_provider
+
+    stt_cfg = settings.get("stt", {})
+    model = vosk_models.get_model(model_path)
+    vad = build_vad_provider(stt_cfg, sample_rate) if use_vad else None
+    dfn = build_dfn_provider(settings, sample_rate) if use_dfn else None
+    _worker_pipeline = FilePipeline(model, sample_rate, blocksize, vad, dfn, stt_cfg)
+
+
+def _transcribe_file(path: str) -> Dict[str, Any]:
+    pipeline = _worker_pipeline
+    result: Dict[str, Any] = {"path": path}
+    try:
+        t0 = time.perf_counter()
+        audio = load_audio(path, pipeline.sample_rate)
+        t1 = time.perf_counter()
+        segments = pipeline.transcribe(audio)
+        t2 = time.perf_counter()
+    except Exception as exc:
+        logger.exception("Failed to transcribe '%s'.", path)
+        result["error"] = str(exc)
+        return result
+    duration = audio.shape[0] / pipeline.sample_rate
+    result.update(
+        text=" ".join(seg["text"] for seg in segments),
+        segments=segments,
+        duration_s=round(duration, 3),
+        load_s=round(t1 - t0, 4),
+        decode_s=round(t2 - t1, 4),
+        rtf=round((t2 - t0) / duration, 4) if duration > 0 else None,
+    )
+    return result
+
+
+class BatchTranscriber:
+    def __init__(
+        self,
+        model_path: Optional[str] = None,
+        workers: Optional[int] = None,
+        sample_rate: int = 16000,
+        blocksize: int = 8000,
+        use_vad: Optional[bool] = None,
+        use_dfn: Optional[bool] = None,
+    ) -> None:
+        """`workers=0` transcribes in this process (no pool), e.g. for debugging."""
+        stt_cfg = settings.get("stt", {})
+        self.model_path = model_path or stt_cfg["vosk_model_path"]
+        self.workers = (os.cpu_count() or 1) if workers is None else int(workers)
+        if use_vad is None:
+            use_vad = bool(stt_cfg.get("vad", False)) and stt_cfg.get("vad_engine", "").lower() == "silero"
+        if use_dfn is None:
+            use_dfn = bool(stt_cfg.get("deepfilternet", False)) or bool(settings.get("stt_enhancement", {}).get("enable", False))
+        self._init_args = (self.model_path, sample_rate, blocksize, bool(use_vad), bool(use_dfn))
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def __enter__(self) -> "BatchTranscriber":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def transcribe(self, paths: Iterable[str]) -> Iterator[Dict[str, Any]]:
+        """Yield one result dict per audio file, in input order."""
+        files = list(iter_audio_files(paths))
+        if not files:
+            return
+        if self.workers <= 0:
+            _init_worker(*self._init_args)
+            yield from map(_transcribe_file, files)
+            return
+        if self._pool is None:
+            # spawn, not fork: STTManager calls this from a process running audio, ONNX and
+            # enhancement threads, and a forked child could inherit one of their locks held
+            self._pool = ProcessPoolExecutor(max_workers=min(self.workers, len(files)),
+                                             mp_context=mp.get_context("spawn"),
+                                             initializer=_init_worker, initargs=self._init_args)
+        yield from self._pool.map(_transcribe_file, files)
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Transcribe WAV/FLAC files with NIA's STT pipeline")
+    parser.add_argument("inputs", nargs="+", help="Audio files or directories")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (0 = in-process)")
+    parser.add_argument("--model", default=None, help="Vosk model path (default: stt.vosk_model_path)")
+    parser.add_argument("--no-vad", action="store_true", help="Use the energy gate instead of Silero VAD")
+    parser.add_argument("--no-dfn", action="store_true", help="Skip DeepFilterNet enhancement")
+    parser.add_argument("--output", default=None, help="Append JSON lines to this file (stdout if omitted)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+    out = open(args.output, "a", encoding="utf-8") if args.output else sys.stdout
+    total_audio = total_time = 0.0
+    try:
+        with BatchTranscriber(model_path=args.model, workers=args.workers,
+                              use_vad=False if args.no_vad else None,
+                              use_dfn=False if args.no_dfn else None) as batch:
+            t0 = time.perf_counter()
+            for result in batch.transcribe(args.inputs):
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                out.flush()
+                total_audio += result.get("duration_s") or 0.0
+            total_time = time.perf_counter() - t0
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    if total_audio:
+        logger.info("Transcribed %.1f s of audio in %.1f s (aggregate RTF %.3f).",
+                    total_audio, total_time, total_time / total_audio)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
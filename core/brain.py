@@ -20,6 +20,7 @@ try:
     from core.knowledge_manager import KnowledgeManager  # optional use
 except Exception:
     KnowledgeManager = None  # type: ignore
+from core.retrieval import RetrievalCoordinator
 
 logger = logging.getLogger("nia.core.brain")
 
@@ -46,6 +47,9 @@ class Brain:
         self.knowledge_enabled = bool(settings.get("knowledge", {}).get("enabled", True))
         self.knowledge_top_k = int(settings.get("knowledge", {}).get("top_k", 5))
         self.knowledge_mgr = KnowledgeManager() if self.knowledge_enabled and KnowledgeManager else None
+        # Per-turn retrieval shared with other consumers; main() attaches semantic memory
+        self.retrieval = RetrievalCoordinator(knowledge=self.knowledge_mgr, knowledge_top_k=self.knowledge_top_k) \
+            if self.knowledge_mgr is not None else None
 
         logger.info("LangChain ChatOllama initialized with model: %s", self.model_name)
         logger.info("System prompt loaded: %s", self.system_prompt[:50] + "..." if len(self.system_prompt) > 50 else self.system_prompt)
@@ -67,10 +71,10 @@ class Brain:
             
             # Retrieve knowledge docs if enabled
             knowledge_snippets: List[str] = []
-            if self.knowledge_mgr is not None and self.knowledge_enabled:
+            if self.retrieval is not None and self.knowledge_enabled:
                 try:
-                    docs = self.knowledge_mgr.query(prompt, top_k=self.knowledge_top_k)
-                    knowledge_snippets = [f"{d.get('source', d.get('name',''))}: {d.get('text','')}" for d in docs]
+                    bundle = await self.retrieval.aretrieve(prompt)
+                    knowledge_snippets = bundle.knowledge_snippets()
                 except Exception:
                     knowledge_snippets = []
 
@@ -151,7 +155,10 @@ class Brain:
     async def close(self):
         """Placeholder for any future cleanup, like closing client sessions."""
         logger.info("Brain shutting down.")
-        pass
+        if self.retrieval is not None:
+            self.retrieval.shutdown()
+        if self.knowledge_mgr is not None:
+            self.knowledge_mgr.close()
 
     def health_check(self) -> dict:
         """Returns a health check dictionary reflecting the new architecture."""
@@ -28,6 +28,16 @@ class BatchedSuggestion:
 
 
 class ConfirmationManager:
+    # Fixed prompts by trigger type; also prewarmed into the TTS audio cache at startup
+    CONFIRMATION_PROMPTS = {
+        "decision_keyword": "I noticed you're working through a decision. I have some thoughts that might help. Would you like to hear them?",
+        "high_value_topic": "I picked up on something important you mentioned. I might have some useful insights. Interested?",
+        "hesitation": "It sounds like you're thinking through something. I have some ideas that might help. Want to hear them?",
+        "repetition": "I notice this topic has come up before. I have some thoughts that might be helpful. Would you like to hear them?",
+    }
+    CONFIDENT_PROMPT = "I have a suggestion that might be helpful. Would you like to hear it?"
+    DEFAULT_PROMPT = "I have a thought. Would you like to hear it?"
+
     def __init__(self, tts_manager, stt_manager, loop: asyncio.AbstractEventLoop, brain: Any | None = None):
         self.tts_manager = tts_manager
         self.stt_manager = stt_manager
@@ -164,19 +174,16 @@ class ConfirmationManager:
         trigger = batched.primary_trigger
         confidence = batched.highest_confidence
         
-        if trigger == "decision_keyword":
-            return "I noticed you're working through a decision. I have some thoughts that might help. Would you like to hear them?"
-        elif trigger == "high_value_topic":
-            return "I picked up on something important you mentioned. I might have some useful insights. Interested?"
-        elif trigger == "hesitation":
-            return "It sounds like you're thinking through something. I have some ideas that might help. Want to hear them?"
-        elif trigger == "repetition":
-            return "I notice this topic has come up before. I have some thoughts that might be helpful. Would you like to hear them?"
-        else:
-            if confidence > 0.8:
-                return "I have a suggestion that might be helpful. Would you like to hear it?"
-            else:
-                return "I have a thought. Would you like to hear it?"
+        if trigger in self.CONFIRMATION_PROMPTS:
+            return self.CONFIRMATION_PROMPTS[trigger]
+        if confidence > 0.8:
+            return self.CONFIDENT_PROMPT
+        return self.DEFAULT_PROMPT
+
+    @classmethod
+    def fixed_phrases(cls) -> List[str]:
+        """Every confirmation prompt this manager can speak (for TTS cache prewarming)."""
+        return [*cls.CONFIRMATION_PROMPTS.values(), cls.CONFIDENT_PROMPT, cls.DEFAULT_PROMPT]
 
     async def _speak_suggestions(self, batched: BatchedSuggestion):
         """Speak the confirmed suggestions using Brain with memory context if available."""
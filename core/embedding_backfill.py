@@ -0,0 +1,263 @@
+"""
+Deferred embedding backfill for NIA's vector stores.
+
+- Write paths embed with a short timeout and store rows without a vector when Ollama is slow or down.
+- EmbeddingBackfill runs in a background thread, waits until the embedding service looks healthy,
+  then re-embeds rows missing vectors in batches and updates them in place.
+- Targets (MemoryManager, KnowledgeManager) expose pending_embeddings/apply_embeddings/count_pending_embeddings.
+"""
+
+from __future__ import annotations
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from core.config import settings
+
+
+logger = logging.getLogger("nia.core.backfill")
+
+_embed_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="nia-embed")
+
+
+def write_timeout_s() -> Optional[float]:
+    """Embedding timeout for write paths; None when no backfill will repair skipped vectors."""
+    cfg = settings.get("backfill", {}) if isinstance(settings, dict) else {}
+    if not cfg.get("enabled", True):
+        return None
+    timeout = float(cfg.get("write_embed_timeout_s", 0) or 0)
+    return timeout if timeout > 0 else None
+
+
+def embed_texts(client: Any, texts: Sequence[str], timeout_s: Optional[float] = None) -> List[Optional[List[float]]]:
+    """Embed texts (batched when the client supports it), giving up after `timeout_s`.
+
+    Raises on embedding errors and on timeout so callers can log and store rows without vectors.
+    """
+    def run() -> List[Optional[List[float]]]:
+        if len(texts) > 1 and hasattr(client, "embed_documents"):
+            return list(client.embed_documents(list(texts)))
+        return [client.embed_query(t) for t in texts]
+
+    if not timeout_s:
+        return run()
+    try:
+        return _embed_executor.submit(run).result(timeout=timeout_s)
+    except FutureTimeout:
+        raise TimeoutError(f"embedding took longer than {timeout_s:.1f}s") from None
+
+
+def create_or_add(db: Any, table: Any, table_name: str, records: List[Dict[str, Any]],
+                  pending: List[Dict[str, Any]]) -> Any:
+    """Write records to a LanceDB table without letting vector-less rows define its schema.
+
+    A new table is created from rows that have vectors; vector-less rows are added afterwards
+    (nullable) or, if no vector is known yet, held in `pending` for the backfill. Returns the table.
+    """
+    if table is None:
+        with_vec = [r for r in records if r.get("vector") is not None]
+        without = [r for r in records if r.get("vector") is None]
+        if not with_vec:
+            pending.extend(without)
+            return None
+        table = db.create_table(table_name, data=with_vec)
+        if without:
+            table.add(without)
+        return table
+    table.add(records)
+    return table
+
+
+class PendingSpool:
+    """JSON-lines file mirroring the rows create_or_add() holds in `pending`.
+
+    Until a first vector defines the table schema those rows exist nowhere else, so the
+    owner saves the list after every change and reloads it at startup; a crash or exit
+    before the embedding service returns loses nothing.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def load(self) -> List[Dict[str, Any]]:
+        if not os.path.exists(self.path):
+            return []
+        records = []
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        records.append(json.loads(line))
+        except (OSError, ValueError) as exc:
+            logger.error("Failed reading pending rows from '%s': %s", self.path, exc)
+        if records:
+            logger.info("Recovered %s row(s) awaiting embeddings from '%s'.", len(records), self.path)
+        return records
+
+    def save(self, records: List[Dict[str, Any]]) -> None:
+        try:
+            if not records:
+                if os.path.exists(self.path):
+                    os.unlink(self.path)
+                return
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                for record in records:
+                    f.write(json.dumps(record, default=str) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+        except OSError as exc:
+            logger.error("Failed saving pending rows to '%s': %s", self.path, exc)
+
+
+def null_vector_rows(table: Any, limit: int) -> List[Dict[str, Any]]:
+    """Return up to `limit` rows of a LanceDB table whose vector is NULL, with their _rowid."""
+    return table.search().where("vector IS NULL").with_row_id(True).limit(limit).to_list()
+
+
+def set_row_vector(table: Any, row_id: int, vector: List[float]) -> None:
+    table.update(where=f"_rowid = {int(row_id)}", values={"vector": vector})
+
+
+@dataclass
+class BackfillProgress:
+    pending: int = 0
+    embedded: int = 0
+    failed: int = 0
+    runs: int = 0
+    last_run: Optional[float] = None
+    healthy: Optional[bool] = None
+    per_target: Dict[str, int] = field(default_factory=dict)
+
+
+class EmbeddingBackfill:
+    def __init__(
+        self,
+        memory: Optional[Any] = None,
+        knowledge: Optional[Any] = None,
+        embeddings_client: Optional[Any] = None,
+        batch_size: Optional[int] = None,
+        interval_s: Optional[float] = None,
+        on_progress: Optional[Callable[[BackfillProgress], None]] = None,
+    ) -> None:
+        cfg = settings.get("backfill", {}) if isinstance(settings, dict) else {}
+        self.enabled = bool(cfg.get("enabled", True))
+        self.memory = memory
+        self.knowledge = knowledge
+        self._embeddings = embeddings_client
+        self.batch_size = int(batch_size or cfg.get("batch_size", 32))
+        self.interval_s = float(interval_s if interval_s is not None else cfg.get("interval_s", 30))
+        self.health_max_latency_s = float(cfg.get("health_max_latency_s", 2.0))
+        self.on_progress = on_progress
+        self.progress = BackfillProgress()
+
+        self._stop_event = threading.Event()
+        self._wake_event = threading.Event()
+        self.worker_thread: Optional[threading.Thread] = None
+
+    # --- Lifecycle ---------------------------------------------------------------------
+    def start(self) -> None:
+        if not self.enabled:
+            logger.info("Embedding backfill disabled by configuration.")
+            return
+        if self.worker_thread and self.worker_thread.is_alive():
+            return
+        self._stop_event.clear()
+        self.worker_thread = threading.Thread(target=self._run_loop, daemon=True)
+        self.worker_thread.start()
+        logger.info("Embedding backfill started (interval=%ss, batch=%s).", self.interval_s, self.batch_size)
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self._wake_event.set()
+        if self.worker_thread:
+            self.worker_thread.join(timeout=2)
+        logger.info("Embedding backfill stopped.")
+
+    def trigger(self) -> None:
+        """Run a pass now instead of waiting for the next interval."""
+        self._wake_event.set()
+
+    def _run_loop(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Embedding backfill pass failed; will retry.")
+            self._wake_event.wait(self.interval_s)
+            self._wake_event.clear()
+
+    # --- Work ----------------------------------------------------------------------------
+    def _targets(self) -> Dict[str, Any]:
+        return {name: t for name, t in (("memory", self.memory), ("knowledge", self.knowledge)) if t is not None}
+
+    def _embedder(self) -> Optional[Any]:
+        if self._embeddings is not None:
+            return self._embeddings
+        for target in self._targets().values():
+            client = getattr(target, "_embeddings", None)
+            if client is not None:
+                return client
+        return None
+
+    def _embedding_healthy(self, client: Any) -> bool:
+        t0 = time.perf_counter()
+        try:
+            embed_texts(client, ["health check"], timeout_s=self.health_max_latency_s)
+        except Exception as exc:
+            logger.debug("Embedding service unhealthy: %s", exc)
+            return False
+        return time.perf_counter() - t0 <= self.health_max_latency_s
+
+    def run_once(self) -> BackfillProgress:
+        """Backfill every target until nothing is pending or a batch fails; return progress."""
+        progress = self.progress
+        progress.runs += 1
+        progress.last_run = time.time()
+        targets = self._targets()
+        progress.per_target = {name: t.count_pending_embeddings() for name, t in targets.items()}
+        progress.pending = sum(progress.per_target.values())
+        if progress.pending == 0:
+            return progress
+
+        client = self._embedder()
+        progress.healthy = client is not None and self._embedding_healthy(client)
+        if not progress.healthy:
+            logger.info("Embedding backfill waiting: %s rows pending, embedding service unavailable.", progress.pending)
+            self._report()
+            return progress
+
+        for name, target in targets.items():
+            while not self._stop_event.is_set():
+                batch = target.pending_embeddings(self.batch_size)
+                if not batch:
+                    break
+                try:
+                    vectors = embed_texts(client, [text for _, text in batch], timeout_s=None)
+                except Exception as exc:
+                    logger.warning("Embedding backfill batch for %s failed: %s", name, exc)
+                    progress.failed += len(batch)
+                    break
+                done = target.apply_embeddings([(handle, vec) for (handle, _), vec in zip(batch, vectors)])
+                progress.embedded += done
+                progress.per_target[name] = target.count_pending_embeddings()
+                progress.pending = sum(progress.per_target.values())
+                self._report()
+                if done < len(batch):
+                    break  # avoid spinning on rows that cannot be updated
+        return progress
+
+    def _report(self) -> None:
+        p = self.progress
+        logger.info("Embedding backfill: %s embedded, %s pending, %s failed.", p.embedded, p.pending, p.failed)
+        if self.on_progress:
+            try:
+                self.on_progress(p)
+            except Exception:
+                logger.exception("Backfill progress callback failed.")
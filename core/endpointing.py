@@ -0,0 +1,151 @@
+"""
+AdaptiveEndpointer — Decides when the user has finished speaking.
+
+Combines three signals per audio frame:
+- speech/non-speech from Silero VAD, or from a per-frame energy gate when VAD is off
+- Vosk final-result events (the decoder committed a segment, so trust silence sooner)
+- a trailing-silence threshold adapted to the speaker: a high percentile of their recent
+  intra-utterance pauses, scaled by a margin and clamped to [min_silence_ms, max_silence_ms]
+
+Also ends sessions that never contain speech (no_speech_timeout_ms) or run too long
+(max_utterance_ms), and records end-of-utterance latency (trailing silence at endpoint).
+"""
+
+from __future__ import annotations
+import logging
+from collections import deque
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+
+logger = logging.getLogger("nia.core.endpointing")
+
+CONTINUE = "continue"
+ENDPOINT = "endpoint"
+NO_SPEECH = "no_speech"
+MAX_LENGTH = "max_length"
+
+
+def frame_energy_flags(frames: np.ndarray, threshold_dbfs: float) -> np.ndarray:
+    """Speech flags for float32 frames in [-1, 1] (shape (n, frame)) from their RMS level."""
+    if frames.shape[0] == 0:
+        return np.zeros(0, dtype=bool)
+    power = np.einsum("ij,ij->i", frames, frames) / frames.shape[1]
+    # Compare in the power domain: rms_dbfs >= t  <=>  power >= 10 ** (t / 10)
+    return power >= 10.0 ** (threshold_dbfs / 10.0)
+
+
+class AdaptiveEndpointer:
+    def __init__(
+        self,
+        trigger_ms: int = 250,
+        min_silence_ms: int = 300,
+        max_silence_ms: int = 1200,
+        initial_silence_ms: int = 700,
+        percentile: float = 90.0,
+        margin: float = 1.25,
+        no_speech_timeout_ms: int = 5000,
+        max_utterance_ms: int = 20000,
+        history_size: int = 64,
+    ) -> None:
+        self.trigger_ms = trigger_ms
+        self.min_silence_ms = min_silence_ms
+        self.max_silence_ms = max_silence_ms
+        self.initial_silence_ms = initial_silence_ms
+        self.percentile = percentile
+        self.margin = margin
+        self.no_speech_timeout_ms = no_speech_timeout_ms
+        self.max_utterance_ms = max_utterance_ms
+
+        # Speaker statistics persist across utterances
+        self.pauses_ms: deque = deque(maxlen=history_size)
+        self.eou_latencies_ms: deque = deque(maxlen=history_size)
+        self.last_eou_latency_ms: Optional[float] = None
+        self.last_reason: Optional[str] = None
+        self.start()
+
+    @classmethod
+    def from_config(cls, stt_cfg: Dict[str, Any]) -> "AdaptiveEndpointer":
+        cfg = stt_cfg.get("endpointing", {}) or {}
+        return cls(
+            trigger_ms=int(stt_cfg.get("vad_trigger_ms", 250)),
+            min_silence_ms=int(cfg.get("min_silence_ms", stt_cfg.get("vad_release_ms", 300))),
+            max_silence_ms=int(cfg.get("max_silence_ms", 1200)),
+            initial_silence_ms=int(cfg.get("initial_silence_ms", 700)),
+            percentile=float(cfg.get("pause_percentile", 90)),
+            margin=float(cfg.get("pause_margin", 1.25)),
+            no_speech_timeout_ms=int(cfg.get("no_speech_timeout_ms", 5000)),
+            max_utterance_ms=int(cfg.get("max_utterance_ms", 20000)),
+        )
+
+    # --- Per utterance -----------------------------------------------------------
+    def start(self) -> None:
+        """Reset per-utterance state; speaker pause statistics are kept."""
+        self.elapsed_ms = 0.0
+        self.speech_ms = 0.0
+        self.silence_ms = 0.0
+        self.in_speech = False
+        self.saw_final = False
+
+    @property
+    def silence_threshold_ms(self) -> float:
+        """Trailing silence that ends an utterance, adapted to this speaker's pauses."""
+        if len(self.pauses_ms) < 3:
+            threshold = self.initial_silence_ms
+        else:
+            threshold = float(np.percentile(self.pauses_ms, self.percentile)) * self.margin
+        return float(min(max(threshold, self.min_silence_ms), self.max_silence_ms))
+
+    def note_final(self) -> None:
+        """The recognizer committed a segment (Vosk AcceptWaveform returned True)."""
+        self.saw_final = True
+
+    def update(self, frame_ms: float, is_speech: bool) -> str:
+        """Feed one frame's decision; returns CONTINUE or the reason the utterance ended."""
+        self.elapsed_ms += frame_ms
+        if is_speech:
+            if self.in_speech and self.silence_ms > 0:
+                # Speech resumed: the silence was a pause inside the utterance
+                self.pauses_ms.append(self.silence_ms)
+                self.saw_final = False
+            self.silence_ms = 0.0
+            self.speech_ms += frame_ms
+            if not self.in_speech and self.speech_ms >= self.trigger_ms:
+                self.in_speech = True
+        elif self.in_speech:
+            self.silence_ms += frame_ms
+        else:
+            self.speech_ms = 0.0  # a blip shorter than trigger_ms does not start an utterance
+
+        if self.in_speech:
+            threshold = self.min_silence_ms if self.saw_final else self.silence_threshold_ms
+            if self.silence_ms >= threshold:
+                return self._finish(ENDPOINT)
+        elif self.elapsed_ms >= self.no_speech_timeout_ms:
+            return self._finish(NO_SPEECH)
+        if self.elapsed_ms >= self.max_utterance_ms:
+            return self._finish(MAX_LENGTH)
+        return CONTINUE
+
+    def _finish(self, reason: str) -> str:
+        self.last_reason = reason
+        if reason == ENDPOINT:
+            self.last_eou_latency_ms = self.silence_ms
+            self.eou_latencies_ms.append(self.silence_ms)
+        logger.debug(
+            "Endpoint (%s) after %.0f ms: trailing silence %.0f ms, threshold %.0f ms, final=%s",
+            reason, self.elapsed_ms, self.silence_ms, self.silence_threshold_ms, self.saw_final,
+        )
+        return reason
+
+    # --- Metrics -----------------------------------------------------------------
+    def metrics(self) -> Dict[str, Any]:
+        latencies = list(self.eou_latencies_ms)
+        return {
+            "last_reason": self.last_reason,
+            "eou_latency_ms": self.last_eou_latency_ms,
+            "eou_latency_p50_ms": float(np.percentile(latencies, 50)) if latencies else None,
+            "silence_threshold_ms": self.silence_threshold_ms,
+            "pauses_observed": len(self.pauses_ms),
+        }
@@ -0,0 +1,167 @@
+"""
+EnhancementStage — DeepFilterNet enhancement as its own pipeline stage.
+
+- Runs the enhancer on a dedicated worker thread; the recognition thread only submits
+  blocks and collects whatever output is ready, so enhancement never blocks decoding.
+- Chunked one-shot enhancement: each call to the provider's enhance_frame gets a
+  whole number of hops, and the remainder carries into the next block so no samples
+  are dropped or reordered. No DeepFilterNet streaming state is kept between calls;
+  each chunk is enhanced independently.
+- Only VAD-positive blocks are enhanced; silence passes straight through.
+- Degrades instead of falling behind: blocks that waited longer than `max_lag_ms`, or
+  that overflow the `max_queue` budget, pass through unenhanced. Output order is
+  always the submission order.
+- flush() ends a session: blocks it gave up waiting for are discarded, never handed to
+  the next session's drain().
+"""
+
+from __future__ import annotations
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+
+logger = logging.getLogger("nia.core.enhancement")
+
+
+class _Block:
+    __slots__ = ("audio", "is_speech", "submitted", "skip", "session")
+
+    def __init__(self, audio: np.ndarray, is_speech: bool, session: int) -> None:
+        self.audio = audio
+        self.is_speech = is_speech
+        self.submitted = time.perf_counter()
+        self.skip = False
+        self.session = session
+
+
+class EnhancementStage:
+    def __init__(
+        self,
+        provider: Any,
+        sample_rate: int = 16000,
+        hop_size: Optional[int] = None,
+        max_queue: int = 8,
+        max_lag_ms: float = 300.0,
+    ) -> None:
+        self.provider = provider
+        self.sample_rate = sample_rate
+        # DeepFilterNet hops 10 ms (480 samples at its native 48 kHz)
+        self.hop_size = int(hop_size or getattr(provider, "hop_size", None) or sample_rate // 100)
+        self.max_queue = max_queue
+        self.max_lag_ms = max_lag_ms
+
+        self._cond = threading.Condition()
+        self._pending: deque = deque()
+        self._ready: deque = deque()
+        self._in_flight = 0
+        self._carry = np.zeros(0, dtype=np.float32)
+        self._closed = False
+        self._session = 0  # bumped by flush(); output of older blocks is dropped
+        self.stats = {"enhanced": 0, "passthrough": 0, "late": 0, "overflow": 0, "discarded": 0}
+
+        self._thread = threading.Thread(target=self._run, name="nia-dfn", daemon=True)
+        self._thread.start()
+
+    # --- Recognition-thread API --------------------------------------------------
+    def submit(self, audio: np.ndarray, is_speech: bool) -> None:
+        """Queue a float32 block (copied; callers may reuse their buffer). Never blocks."""
+        audio = np.array(audio, dtype=np.float32, copy=True)
+        with self._cond:
+            block = _Block(audio, is_speech, self._session)
+            if len(self._pending) >= self.max_queue:
+                # Over budget: everything still waiting passes through unenhanced
+                for queued in self._pending:
+                    if not queued.skip:
+                        queued.skip = True
+                        self.stats["overflow"] += 1
+            self._pending.append(block)
+            self._in_flight += 1
+            self._cond.notify_all()
+
+    def drain(self) -> List[np.ndarray]:
+        """Return every chunk that is ready, in order, without waiting."""
+        with self._cond:
+            out = list(self._ready)
+            self._ready.clear()
+        return out
+
+    def flush(self, timeout: float = 0.5) -> List[np.ndarray]:
+        """Wait (up to `timeout`) for submitted blocks, then return all output including the tail.
+
+        This ends the session: on timeout, blocks still queued or being processed are
+        discarded so none of their audio reaches the next session.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._cond.wait_for(lambda: self._in_flight == 0, max(deadline - time.monotonic(), 0))
+            if self._in_flight == 0 and self._carry.size:
+                self._ready.append(self._carry)
+            elif self._in_flight:
+                self.stats["discarded"] += self._in_flight
+                self._in_flight -= len(self._pending)
+                self._pending.clear()
+            self._carry = np.zeros(0, dtype=np.float32)
+            self._session += 1
+            out = list(self._ready)
+            self._ready.clear()
+        return out
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout=1)
+
+    def metrics(self) -> Dict[str, int]:
+        with self._cond:
+            return dict(self.stats, queued=len(self._pending))
+
+    # --- Worker ------------------------------------------------------------------
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._closed or self._pending)
+                if self._closed:
+                    return
+                block = self._pending.popleft()
+            out = self._process(block)
+            with self._cond:
+                if block.session == self._session:
+                    self._ready.extend(out)
+                else:
+                    # flush() gave up on this block; drop its output and the carry it left
+                    self._carry = np.zeros(0, dtype=np.float32)
+                self._in_flight -= 1
+                self._cond.notify_all()
+
+    def _process(self, block: _Block) -> List[np.ndarray]:
+        late = (time.perf_counter() - block.submitted) * 1000 > self.max_lag_ms
+        if late:
+            self._count("late")
+        if block.skip or late or not block.is_speech or not getattr(self.provider, "enabled", False):
+            self._count("passthrough")
+            out = [self._carry, block.audio] if self._carry.size else [block.audio]
+            self._carry = np.zeros(0, dtype=np.float32)
+            return out
+
+        buf = np.concatenate([self._carry, block.audio]) if self._carry.size else block.audio
+        usable = (buf.shape[0] // self.hop_size) * self.hop_size
+        self._carry = buf[usable:].copy()
+        if usable == 0:
+            return []
+        try:
+            enhanced = np.asarray(self.provider.enhance_frame(buf[:usable]), dtype=np.float32).reshape(-1)
+        except Exception:
+            logger.exception("Enhancement failed; passing audio through.")
+            enhanced = buf[:usable]
+        self._count("enhanced")
+        return [enhanced]
+
+    def _count(self, name: str) -> None:
+        with self._cond:
+            self.stats[name] += 1
@@ -6,12 +6,23 @@ Design goals:
 - Provide a simple API for add/query/clear.
 - Prefer Haystack components if available; gracefully fall back to direct LanceDB ops.
 - Share embedding client with MemoryManager style (default Ollama embeddings), injectable for tests.
+- Without LanceDB, persist to an append-only memory-mapped vector store so restarts need no re-embed.
+- Optionally shard documents by source or name hash across LanceDB tables; queries fan out over
+  a thread pool and per-shard top-k lists are heap-merged. Shards can be rebuilt/compacted/dropped.
+  Documents ingested into the unsharded table before sharding was enabled are still searched.
 """
 
 from __future__ import annotations
+import heapq
+import itertools
 import os
-from typing import List, Dict, Any, Optional
+import re
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 import logging
+import weakref
 
 try:
     import lancedb  # type: ignore
@@ -30,11 +41,25 @@ except Exception:  # pragma: no cover
     Document = None  # type: ignore
 
 from core.config import settings
+from core.embedding_backfill import PendingSpool, create_or_add, embed_texts, null_vector_rows, set_row_vector, write_timeout_s
+from core.retrieval import RetrievalCoordinator
+from core.vector_store import MmapVectorStore
 
 
 logger = logging.getLogger("nia.core.knowledge")
 
 
+def _cosine(a: List[float], b: List[float]) -> float:
+    if not a or not b or len(a) != len(b):
+        return 0.0
+    dot = sum(x*y for x, y in zip(a, b))
+    na = sum(x*x for x in a) ** 0.5
+    nb = sum(y*y for y in b) ** 0.5
+    if na == 0 or nb == 0:
+        return 0.0
+    return dot / (na * nb)
+
+
 class KnowledgeManager:
     def __init__(
         self,
@@ -43,6 +68,9 @@ class KnowledgeManager:
         embedding_model: Optional[str] = None,
         embeddings_client: Optional[Any] = None,
         enabled: Optional[bool] = None,
+        backend: Optional[str] = None,
+        shard_strategy: Optional[str] = None,
+        shard_count: Optional[int] = None,
     ) -> None:
         cfg = settings.get("knowledge", {}) if isinstance(settings, dict) else {}
         self.enabled = enabled if enabled is not None else bool(cfg.get("enabled", True))
@@ -53,17 +81,41 @@ class KnowledgeManager:
         self._embeddings = embeddings_client
         self._db = None
         self._table = None
+        # 'lancedb' (default), 'mmap' (on-disk fallback store) or 'memory' (RAM only)
+        self.backend = (backend or cfg.get("backend", "lancedb")).lower()
+        self.fallback_path = cfg.get("fallback_path") or os.path.join(self.index_path, "fallback")
+        self._fallback: Optional[MmapVectorStore] = None
+        self._retrieval: Optional[RetrievalCoordinator] = None
+
+        # Sharding: 'none', 'source' (one table per source) or 'hash' (shard_count tables by name)
+        shard_cfg = cfg.get("sharding", {}) or {}
+        if shard_strategy is None:
+            shard_strategy = shard_cfg.get("strategy", "source") if shard_cfg.get("enabled", False) else "none"
+        self.shard_strategy = shard_strategy.lower()
+        self.shard_count = max(1, int(shard_count or shard_cfg.get("shards", 4)))
+        self.shard_workers = max(1, int(shard_cfg.get("max_workers", 4)))
+        self._shards: Dict[str, Any] = {}
+        self._shard_executor: Optional[ThreadPoolExecutor] = None
+        self._shard_executor_lock = threading.Lock()  # queries may arrive on several threads at once
 
-        # In-memory fallback store (list of dict records)
+        # In-memory fallback store (list of dict records). With the mmap fallback this only
+        # holds records added before the first vector fixed the store's dimension.
         self._inmem_store: List[Dict[str, Any]] = []
+        # LanceDB records that arrived before any vector defined a table schema; written by the
+        # backfill and mirrored to a spool file next to the index so they survive restarts
+        self._unembedded: List[Dict[str, Any]] = []
+        self._pending_spool: Optional[PendingSpool] = None
+        # Serializes table/shard/_unembedded changes between callers and the backfill thread
+        self._write_lock = threading.RLock()
+        # Caches of search results over this index, told to drop them after writes
+        self._write_listeners: "weakref.WeakSet[Any]" = weakref.WeakSet()
 
         if not self.enabled:
             return
 
-        if lancedb is None:
-            logger.warning("LanceDB not available; KnowledgeManager will use in-memory store.")
-            # proceed with in-memory fallback
-        else:
+        if self.backend == "lancedb" and lancedb is None:
+            logger.warning("LanceDB not available; KnowledgeManager will use the fallback store.")
+        elif self.backend == "lancedb":
             os.makedirs(self.index_path, exist_ok=True)
             try:
                 self._db = lancedb.connect(self.index_path)
@@ -71,12 +123,23 @@ class KnowledgeManager:
                     self._table = self._db.open_table(self.collection)
                 except Exception:
                     self._table = None
+                if self.sharded:
+                    self._open_shards()
+                self._pending_spool = PendingSpool(os.path.join(self.index_path, f"{self.collection}.pending.jsonl"))
+                self._unembedded = self._pending_spool.load()
             except Exception as exc:  # pragma: no cover
                 logger.error("Failed to initialize LanceDB for KnowledgeManager: %s", exc)
                 # fallback to in-memory
                 self._db = None
                 self._table = None
 
+        if self._db is None and self.backend != "memory":
+            try:
+                self._fallback = MmapVectorStore(self.fallback_path)
+            except Exception as exc:
+                logger.error("Failed to open fallback vector store at '%s': %s", self.fallback_path, exc)
+                self._fallback = None
+
         if self._embeddings is None and OllamaEmbeddings is not None:
             try:
                 self._embeddings = OllamaEmbeddings(model=self.embedding_model)
@@ -84,111 +147,442 @@ class KnowledgeManager:
                 logger.error("Failed to initialize Ollama embeddings for KnowledgeManager: %s", exc)
                 self._embeddings = None
 
+    def add_write_listener(self, listener: Any) -> None:
+        """Have `listener.invalidate()` called after every write (e.g. a RetrievalCoordinator)."""
+        self._write_listeners.add(listener)
+
+    def _notify_write(self) -> None:
+        for listener in list(self._write_listeners):
+            listener.invalidate()
+
     def add_source(self, name: str, text: str, metadata: Optional[Dict[str, Any]] = None) -> None:
+        self.add_sources([(name, text, metadata)])
+
+    def add_sources(self, items: Iterable[Tuple[str, str, Optional[Dict[str, Any]]]]) -> None:
+        """Add many (name, text, metadata) documents with one embedding call and one write per table."""
         if not self.enabled:
             return
-        metadata = metadata or {}
-        # Build record
-        vector = None
-        if self._embeddings is not None:
-            try:
-                vector = self._embeddings.embed_query(text)
-            except Exception as exc:  # pragma: no cover
-                logger.warning("Embedding failed for knowledge '%s': %s", name, exc)
+        items = list(items)
+        if not items:
+            return
+        vectors = self._embed_many([text for _, text, _ in items], label=items[0][0])
 
-        record: Dict[str, Any] = {
-            "name": name,
-            "text": text,
-            "vector": vector,
-            "source": metadata.get("source", name),
-            "meta": metadata,
-        }
+        records: List[Dict[str, Any]] = []
+        for (name, text, metadata), vector in zip(items, vectors):
+            metadata = metadata or {}
+            records.append({
+                "name": name,
+                "text": text,
+                "vector": vector,
+                "source": metadata.get("source", name),
+                "meta": metadata,
+            })
 
-        if self._db is not None:
-            try:
-                if self._table is None:
-                    self._table = self._db.create_table(self.collection, data=[record])
-                else:
-                    self._table.add([record])
-            except Exception as exc:  # pragma: no cover
-                logger.error("Failed adding knowledge record: %s", exc)
-        else:
-            # In-memory fallback
-            self._inmem_store.append(record)
+        with self._write_lock:
+            held = len(self._unembedded)
+            if self._db is not None and self.sharded:
+                self._add_to_shards(records)
+            elif self._db is not None:
+                try:
+                    self._table = create_or_add(self._db, self._table, self.collection, records, self._unembedded)
+                except Exception as exc:  # pragma: no cover
+                    logger.error("Failed adding knowledge record: %s", exc)
+            elif self._fallback is not None and (self._fallback.ready or any(r["vector"] is not None for r in records)):
+                self._append_fallback(records)
+            else:
+                # In-memory fallback
+                self._inmem_store.extend(records)
+            if len(self._unembedded) != held:
+                self._save_pending()
+        self._notify_write()
+
+    def _embed_many(self, texts: List[str], label: str = "") -> List[Optional[List[float]]]:
+        if self._embeddings is None:
+            return [None] * len(texts)
+        try:
+            return embed_texts(self._embeddings, texts, timeout_s=write_timeout_s())
+        except Exception as exc:
+            logger.warning("Embedding failed for knowledge '%s': %s", label, exc)
+            return [None] * len(texts)
+
+    def _append_fallback(self, records: List[Dict[str, Any]]) -> None:
+        """Persist records to the mmap store, flushing any records held back for lack of a dimension."""
+        pending = [] if self._fallback.ready else self._inmem_store
+        items = [(self._fallback_record(r), r.get("vector")) for r in pending + records]
+        try:
+            self._fallback.append_many(items)
+            pending.clear()
+        except Exception as exc:  # pragma: no cover
+            logger.error("Failed adding knowledge record to fallback store: %s", exc)
+            self._inmem_store.extend(records)
+
+    @staticmethod
+    def _fallback_record(record: Dict[str, Any]) -> Dict[str, Any]:
+        return {k: record.get(k) for k in ("name", "text", "source", "meta")}
 
     def query(self, query_text: str, top_k: Optional[int] = None) -> List[Dict[str, Any]]:
         if not self.enabled or self._embeddings is None:
             return []
-        k = int(top_k or self.top_k_default)
         try:
             qvec = self._embeddings.embed_query(query_text)
+        except Exception as exc:  # pragma: no cover
+            logger.error("Knowledge query failed: %s", exc)
+            return []
+        return self.query_by_vector(qvec, top_k=top_k)
+
+    def query_by_vector(self, qvec: List[float], top_k: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Search with an already-embedded query vector; scores are cosine similarities."""
+        if not self.enabled:
+            return []
+        k = int(top_k or self.top_k_default)
+        try:
+            if self._db is not None and self.sharded:
+                return self._query_shards(qvec, k)
             if self._table is not None:
-                results = (
-                    self._table.search(qvec)  # type: ignore[attr-defined]
-                    .metric("cosine")
-                    .limit(k)
-                    .to_list()
-                )
-                normalized: List[Dict[str, Any]] = []
-                for r in results:
-                    normalized.append({
-                        "name": r.get("name"),
-                        "text": r.get("text"),
-                        "source": r.get("source"),
-                        "meta": r.get("meta", {}),
-                        **({"score": r.get("score")} if "score" in r else {}),
-                    })
-                return normalized
+                return self._search_table(self._table, qvec, k)
             else:
-                # In-memory cosine similarity search
-                def cosine(a: List[float], b: List[float]) -> float:
-                    if not a or not b or len(a) != len(b):
-                        return 0.0
-                    dot = sum(x*y for x, y in zip(a, b))
-                    na = sum(x*x for x in a) ** 0.5
-                    nb = sum(y*y for y in b) ** 0.5
-                    if na == 0 or nb == 0:
-                        return 0.0
-                    return dot / (na * nb)
-
-                scored = []
-                for r in self._inmem_store:
-                    vec = r.get("vector")
-                    score = cosine(qvec, vec) if vec else 0.0
-                    scored.append((score, r))
-                scored.sort(key=lambda t: t[0], reverse=True)
-                top = [r for _, r in scored[:k]]
-                return [{
-                    "name": r.get("name"),
-                    "text": r.get("text"),
-                    "source": r.get("source"),
-                    "meta": r.get("meta", {}),
-                    "score": s
-                } for s, r in scored[:k]]
+                return self._fallback_query(qvec, k)
         except Exception as exc:  # pragma: no cover
             logger.error("Knowledge query failed: %s", exc)
             return []
 
+    @staticmethod
+    def _search_table(table: Any, qvec: List[float], k: int) -> List[Dict[str, Any]]:
+        results = (
+            table.search(qvec)  # type: ignore[attr-defined]
+            .metric("cosine")
+            .limit(k)
+            .to_list()
+        )
+        normalized: List[Dict[str, Any]] = []
+        for r in results:
+            score = r.get("score")
+            if score is None and r.get("_distance") is not None:
+                score = 1.0 - float(r["_distance"])
+            normalized.append({
+                "name": r.get("name"),
+                "text": r.get("text"),
+                "source": r.get("source"),
+                "meta": r.get("meta", {}),
+                **({"score": score} if score is not None else {}),
+            })
+        return normalized
+
+    def _fallback_query(self, qvec: List[float], k: int) -> List[Dict[str, Any]]:
+        """Cosine search over the mmap store (NumPy) plus any RAM-only records."""
+        scored = []
+        if self._fallback is not None:
+            for row, score in self._fallback.search(qvec, k):
+                scored.append((score, self._fallback.get_record(row)))
+        for r in self._inmem_store:
+            vec = r.get("vector")
+            scored.append((_cosine(qvec, vec) if vec else 0.0, r))
+        scored.sort(key=lambda t: t[0], reverse=True)
+        return [{
+            "name": r.get("name"),
+            "text": r.get("text"),
+            "source": r.get("source"),
+            "meta": r.get("meta", {}),
+            "score": s
+        } for s, r in scored[:k]]
+
     def clear_index(self) -> None:
         if not self.enabled:
             return
-        if self._db is not None:
+        with self._write_lock:
+            if self._db is not None:
+                for key in list(self._shards):
+                    self.drop_shard(key)
+                try:
+                    if self._table is not None or not self.sharded:
+                        self._db.drop_table(self.collection)
+                    self._table = None
+                except Exception as exc:  # pragma: no cover
+                    logger.warning("Failed clearing knowledge index: %s", exc)
+            if self._fallback is not None:
+                try:
+                    self._fallback.clear()
+                except Exception as exc:  # pragma: no cover
+                    logger.warning("Failed clearing fallback vector store: %s", exc)
+            # Clear in-memory store too
+            self._inmem_store.clear()
+            self._unembedded.clear()
+            self._save_pending()
+        self._notify_write()
+
+    # --- Sharding ------------------------------------------------------------------
+    @property
+    def sharded(self) -> bool:
+        return self.shard_strategy in ("source", "hash")
+
+    def _shard_table_name(self, key: str) -> str:
+        return f"{self.collection}__{key}"
+
+    def shard_key_for(self, name: str, source: Optional[str] = None) -> str:
+        """Return the shard a document with this name/source is stored in.
+
+        Under the 'source' strategy documents without source metadata share the 'default'
+        shard; keying on the name would give every document a table of its own.
+        """
+        if self.shard_strategy == "hash":
+            return f"h{zlib.crc32(name.encode('utf-8')) % self.shard_count:03d}"
+        key = re.sub(r"[^A-Za-z0-9_-]+", "_", source or "").strip("_")
+        return key[:64] or "default"
+
+    def _table_names(self) -> List[str]:
+        if not hasattr(self._db, "list_tables"):  # pragma: no cover - older lancedb
+            return list(self._db.table_names(limit=100000))
+        names: List[str] = []
+        token = None
+        while True:
+            resp = self._db.list_tables(page_token=token)
+            names.extend(resp.tables)
+            token = resp.page_token
+            if not token:
+                return names
+
+    def _open_shards(self) -> None:
+        prefix = f"{self.collection}__"
+        try:
+            names = self._table_names()
+        except Exception as exc:  # pragma: no cover
+            logger.warning("Failed listing knowledge shards: %s", exc)
+            return
+        for table_name in names:
+            if table_name.startswith(prefix):
+                try:
+                    self._shards[table_name[len(prefix):]] = self._db.open_table(table_name)
+                except Exception as exc:  # pragma: no cover
+                    logger.warning("Failed opening knowledge shard '%s': %s", table_name, exc)
+        logger.info("Opened %s knowledge shard(s) (strategy=%s).", len(self._shards), self.shard_strategy)
+
+    def _add_to_shards(self, records: List[Dict[str, Any]]) -> None:
+        grouped: Dict[str, List[Dict[str, Any]]] = {}
+        for record in records:
+            # Only explicit source metadata picks a 'source' shard; record["source"] defaults to the name
+            source = (record.get("meta") or {}).get("source")
+            grouped.setdefault(self.shard_key_for(record["name"], source), []).append(record)
+        for key, rows in grouped.items():
             try:
-                self._db.drop_table(self.collection)
-                self._table = None
+                table = create_or_add(self._db, self._shards.get(key), self._shard_table_name(key), rows, self._unembedded)
+                if table is not None:
+                    self._shards[key] = table
             except Exception as exc:  # pragma: no cover
-                logger.warning("Failed clearing knowledge index: %s", exc)
-        # Clear in-memory store too
-        self._inmem_store.clear()
+                logger.error("Failed adding knowledge record to shard '%s': %s", key, exc)
 
-    def query_with_memory(self, query_text: str, memory_manager) -> Dict[str, List[Dict[str, Any]]]:
-        """Combine knowledge retrieval with semantic memory similar messages."""
-        knowledge_docs = self.query(query_text)
-        memory_snippets = []
+    def _query_shards(self, qvec: List[float], k: int) -> List[Dict[str, Any]]:
+        with self._write_lock:
+            shards = list(self._shards.items())
+            if self._table is not None:
+                # The unsharded table from before sharding was enabled; searched until cleared
+                shards.append(("<unsharded>", self._table))
+        if not shards:
+            return []
+        if len(shards) == 1:
+            return self._search_table(shards[0][1], qvec, k)
+        with self._shard_executor_lock:
+            if self._shard_executor is None:
+                self._shard_executor = ThreadPoolExecutor(max_workers=self.shard_workers,
+                                                          thread_name_prefix="nia-knowledge-shard")
+            executor = self._shard_executor
+
+        def search(item):
+            key, table = item
+            try:
+                return self._search_table(table, qvec, k)
+            except Exception as exc:
+                logger.warning("Knowledge shard '%s' query failed: %s", key, exc)
+                return []
+
+        per_shard = list(executor.map(search, shards))
+        # Each shard list is already best-first; heap-merge them and keep the global top k
+        merged = heapq.merge(*per_shard, key=lambda r: -(r.get("score") or 0.0))
+        return list(itertools.islice(merged, k))
+
+    def close(self) -> None:
+        """Release the shard query threads and the query_with_memory coordinator."""
+        if self._retrieval is not None:
+            self._retrieval.shutdown()
+            self._retrieval = None
+        with self._shard_executor_lock:
+            executor, self._shard_executor = self._shard_executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def list_shards(self) -> Dict[str, int]:
+        """Return shard key -> row count."""
+        counts: Dict[str, int] = {}
+        for key, table in self._shards.items():
+            try:
+                counts[key] = int(table.count_rows())
+            except Exception:  # pragma: no cover
+                counts[key] = -1
+        return counts
+
+    def drop_shard(self, key: str) -> None:
+        with self._write_lock:
+            if self._db is None or key not in self._shards:
+                return
+            try:
+                self._db.drop_table(self._shard_table_name(key))
+            except Exception as exc:  # pragma: no cover
+                logger.warning("Failed dropping knowledge shard '%s': %s", key, exc)
+            self._shards.pop(key, None)
+        self._notify_write()
+
+    def compact_shard(self, key: str) -> None:
+        """Merge small fragments and prune old versions of one shard."""
+        table = self._shards.get(key)
+        if table is None:
+            return
+        try:
+            if hasattr(table, "optimize"):
+                table.optimize()
+            else:  # pragma: no cover - older lancedb
+                table.compact_files()
+                table.cleanup_old_versions()
+        except Exception as exc:  # pragma: no cover
+            logger.warning("Failed compacting knowledge shard '%s': %s", key, exc)
+
+    def rebuild_shard(self, key: str) -> None:
+        """Re-embed and rewrite one shard, e.g. after switching embedding models."""
+        table = self._shards.get(key)
+        if table is None or self._db is None:
+            return
+        try:
+            rows = table.to_arrow().to_pylist()
+        except Exception as exc:  # pragma: no cover
+            logger.error("Failed reading knowledge shard '%s' for rebuild: %s", key, exc)
+            return
+        records = []
+        for r in rows:
+            vector = r.get("vector")
+            if self._embeddings is not None:
+                try:
+                    vector = self._embeddings.embed_query(r.get("text") or "")
+                except Exception as exc:  # pragma: no cover
+                    logger.warning("Embedding failed while rebuilding '%s': %s", r.get("name"), exc)
+            records.append({k: r.get(k) for k in ("name", "text", "source", "meta")} | {"vector": vector})
+        if not records:
+            self.drop_shard(key)
+            return
         try:
-            memory_snippets = memory_manager.get_similar_messages(query_text, top_k=5) if memory_manager else []
-        except Exception:
-            memory_snippets = []
-        return {"knowledge": knowledge_docs, "memory": memory_snippets}
+            with self._write_lock:
+                self._shards[key] = self._db.create_table(self._shard_table_name(key), data=records, mode="overwrite")
+            logger.info("Rebuilt knowledge shard '%s' (%s rows).", key, len(records))
+        except Exception as exc:  # pragma: no cover
+            logger.error("Failed rebuilding knowledge shard '%s': %s", key, exc)
+
+    # --- Backfill protocol (see core.embedding_backfill) -------------------------------
+    def _lancedb_tables(self) -> List[Any]:
+        with self._write_lock:
+            tables = list(self._shards.values())
+            if self._table is not None:
+                tables.append(self._table)
+        return tables
+
+    def _ram_records_missing_vectors(self) -> List[Dict[str, Any]]:
+        with self._write_lock:
+            return self._unembedded + [r for r in self._inmem_store if r.get("vector") is None]
+
+    def count_pending_embeddings(self) -> int:
+        count = len(self._ram_records_missing_vectors())
+        for table in self._lancedb_tables():
+            try:
+                count += int(table.count_rows("vector IS NULL"))
+            except Exception as exc:  # pragma: no cover
+                logger.debug("Counting knowledge rows without vectors failed: %s", exc)
+        if self._fallback is not None:
+            count += len(self._fallback.missing_rows())
+        return count
 
+    def pending_embeddings(self, limit: int) -> List[Tuple[Any, str]]:
+        """Return up to `limit` (handle, text) pairs for documents stored without a vector."""
+        items: List[Tuple[Any, str]] = [
+            (("record", r), r.get("text") or "") for r in self._ram_records_missing_vectors()[:limit]
+        ]
+        for table in self._lancedb_tables():
+            if len(items) >= limit:
+                break
+            try:
+                rows = null_vector_rows(table, limit - len(items))
+                items.extend((("table", (table, r["_rowid"])), r.get("text") or "") for r in rows)
+            except Exception as exc:  # pragma: no cover
+                logger.warning("Listing knowledge rows without vectors failed: %s", exc)
+        if self._fallback is not None and len(items) < limit:
+            for row in self._fallback.missing_rows(limit - len(items)):
+                items.append((("mmap", row), self._fallback.get_record(row).get("text") or ""))
+        return items
+
+    def apply_embeddings(self, items: List[Tuple[Any, List[float]]]) -> int:
+        """Write backfilled vectors in place; returns how many documents were updated."""
+        done = 0
+        unembedded = []
+        mmap_rows, mmap_vectors = [], []
+        with self._write_lock:
+            unembedded_ids = {id(r) for r in self._unembedded}
+            for (kind, ref), vector in items:
+                if vector is None:
+                    continue
+                if kind == "record":
+                    ref["vector"] = vector
+                    if id(ref) in unembedded_ids:
+                        unembedded.append(ref)
+                    done += 1
+                elif kind == "table":
+                    table, row_id = ref
+                    try:
+                        set_row_vector(table, row_id, vector)
+                        done += 1
+                    except Exception as exc:  # pragma: no cover
+                        logger.warning("Updating knowledge vector for row %s failed: %s", row_id, exc)
+                elif kind == "mmap":
+                    mmap_rows.append(ref)
+                    mmap_vectors.append(vector)
+
+            if unembedded:
+                # Re-run the normal write path now that these records have vectors. Filter in
+                # place: a copy would drop records add_sources appends meanwhile
+                written = {id(r) for r in unembedded}
+                self._unembedded[:] = [r for r in self._unembedded if id(r) not in written]
+                if self.sharded:
+                    self._add_to_shards(unembedded)
+                else:
+                    try:
+                        self._table = create_or_add(self._db, self._table, self.collection, unembedded, self._unembedded)
+                    except Exception as exc:  # pragma: no cover
+                        logger.error("Failed writing backfilled knowledge records: %s", exc)
+                        self._unembedded.extend(unembedded)
+                self._save_pending()
+            if self._fallback is not None and not self._fallback.ready and any(r.get("vector") for r in self._inmem_store):
+                self._append_fallback([])
+            if mmap_rows:
+                try:
+                    self._fallback.update_vectors(mmap_rows, mmap_vectors)
+                    done += len(mmap_rows)
+                except Exception as exc:  # pragma: no cover
+                    logger.warning("Updating fallback store vectors failed: %s", exc)
+        if done:
+            self._notify_write()  # documents that had no vector are searchable now
+        return done
 
+    def _save_pending(self) -> None:
+        if self._pending_spool is not None:
+            self._pending_spool.save(self._unembedded)
+
+    def query_with_memory(self, query_text: str, memory_manager) -> Dict[str, List[Dict[str, Any]]]:
+        """Combine knowledge retrieval with semantic memory similar messages.
+
+        Both searches share a single embedding of `query_text` via RetrievalCoordinator.
+        """
+        if self._retrieval is None or self._retrieval.memory is not memory_manager:
+            if self._retrieval is not None:
+                self._retrieval.shutdown()
+            # memory_top_k comes from retrieval.memory_top_k
+            self._retrieval = RetrievalCoordinator(knowledge=self, memory=memory_manager)
+        try:
+            bundle = self._retrieval.retrieve(query_text)
+        except Exception as exc:  # pragma: no cover
+            logger.error("Combined knowledge/memory query failed: %s", exc)
+            return {"knowledge": [], "memory": []}
+        return {"knowledge": bundle.knowledge, "memory": bundle.memory}
@@ -10,10 +10,12 @@ Features:
 from __future__ import annotations
 import os
 import datetime
-from typing import List, Optional, Dict, Any
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 import asyncio
 
 import logging
+import threading
+import weakref
 
 try:
     import lancedb  # type: ignore
@@ -26,6 +28,7 @@ except Exception:  # pragma: no cover
     OllamaEmbeddings = None  # type: ignore
 
 from core.config import settings
+from core.embedding_backfill import PendingSpool, create_or_add, embed_texts, null_vector_rows, set_row_vector, write_timeout_s
 
 
 logger = logging.getLogger("nia.core.memory")
@@ -62,6 +65,14 @@ class MemoryManager:
         self._db = None
         self._table = None
         self._embeddings = embeddings_client
+        # Rows stored before any vector defined the table schema; written by the backfill and
+        # mirrored to a spool file next to the table so they survive restarts
+        self._unembedded: List[Dict[str, Any]] = []
+        self._pending_spool: Optional[PendingSpool] = None
+        # Serializes _table/_unembedded changes between callers and the backfill thread
+        self._write_lock = threading.RLock()
+        # Caches of search results over this store, told to drop them after writes
+        self._write_listeners: "weakref.WeakSet[Any]" = weakref.WeakSet()
 
         if self.enabled and self.persist:
             if lancedb is None:
@@ -77,6 +88,8 @@ class MemoryManager:
                 except Exception:
                     # Table does not exist yet; will create on first insert
                     self._table = None
+                self._pending_spool = PendingSpool(os.path.join(self.db_path, f"{self.collection}.pending.jsonl"))
+                self._unembedded = self._pending_spool.load()
             except Exception as exc:
                 logger.error("Failed to initialize LanceDB at '%s': %s", self.db_path, exc)
                 self.enabled = False
@@ -92,6 +105,19 @@ class MemoryManager:
                     logger.error("Failed to initialize Ollama embeddings: %s", exc)
                     self._embeddings = None
 
+    @property
+    def semantic_enabled(self) -> bool:
+        """True when vector search over the persistent store is possible."""
+        return bool(self.enabled and self.persist and self._embeddings and self._table is not None and self.enable_embeddings)
+
+    def add_write_listener(self, listener: Any) -> None:
+        """Have `listener.invalidate()` called after every write (e.g. a RetrievalCoordinator)."""
+        self._write_listeners.add(listener)
+
+    def _notify_write(self) -> None:
+        for listener in list(self._write_listeners):
+            listener.invalidate()
+
     # Backward-compatible API used by interfaces
     def store(self, role: str, text: str) -> None:
         self.store_message(role, text)
@@ -106,39 +132,106 @@ class MemoryManager:
         Always appends to in-memory session history. If semantic memory is enabled,
         also stores to LanceDB with an embedding vector.
         """
-        timestamp = datetime.datetime.utcnow().isoformat() + "Z"
-        entry = {"ts": timestamp, "user": user, "text": text}
+        self.store_messages([(user, text)])
+
+    def store_messages(self, messages: Iterable[Tuple[str, str]]) -> None:
+        """Store many (user, text) messages with one embedding call and one LanceDB write."""
+        entries = []
+        for user, text in messages:
+            timestamp = datetime.datetime.utcnow().isoformat() + "Z"
+            entries.append({"ts": timestamp, "user": user, "text": text})
+        if not entries:
+            return
 
         # Maintain recent in-memory buffer
-        self._history.append(entry)
+        self._history.extend(entries)
         if len(self._history) > self.max_items:
             self._history = self._history[-self.max_items:]
 
         # Persistent semantic store
-        if not (self.enabled and self.persist and self._embeddings and self._db and self.enable_embeddings):
+        if not (self.enabled and self.persist and self._embeddings and self._db is not None and self.enable_embeddings):
+            self._notify_write()
             return
 
+        texts = [e["text"] for e in entries]
         try:
-            vector = self._embeddings.embed_query(text)
-        except Exception as exc:  # pragma: no cover
+            vectors = embed_texts(self._embeddings, texts, timeout_s=write_timeout_s())
+        except Exception as exc:
             logger.warning("Embedding failed; message stored without vector: %s", exc)
-            vector = None
+            vectors = [None] * len(entries)
 
-        record: Dict[str, Any] = {
-            "ts": timestamp,
-            "user": user,
-            "text": text,
-            "vector": vector,
-        }
+        records: List[Dict[str, Any]] = [dict(entry, vector=vector) for entry, vector in zip(entries, vectors)]
 
-        try:
-            if self._table is None:
-                # Create table on first insert using this record as schema
-                self._table = self._db.create_table(self.collection, data=[record])
-            else:
-                self._table.add([record])
-        except Exception as exc:  # pragma: no cover
-            logger.error("Failed to write to LanceDB: %s", exc)
+        with self._write_lock:
+            held = len(self._unembedded)
+            try:
+                # Create table on first insert using a record with a vector as schema
+                self._table = create_or_add(self._db, self._table, self.collection, records, self._unembedded)
+            except Exception as exc:  # pragma: no cover
+                logger.error("Failed to write to LanceDB: %s", exc)
+            if len(self._unembedded) != held:
+                self._save_pending()
+        self._notify_write()
+
+    # Backfill protocol (see core.embedding_backfill)
+    def count_pending_embeddings(self) -> int:
+        with self._write_lock:
+            count, table = len(self._unembedded), self._table
+        if table is not None:
+            try:
+                count += int(table.count_rows("vector IS NULL"))
+            except Exception as exc:  # pragma: no cover
+                logger.debug("Counting rows without vectors failed: %s", exc)
+        return count
+
+    def pending_embeddings(self, limit: int) -> List[Tuple[Any, str]]:
+        """Return up to `limit` (handle, text) pairs for rows stored without a vector."""
+        with self._write_lock:
+            items: List[Tuple[Any, str]] = [(("ram", r), r.get("text") or "") for r in self._unembedded[:limit]]
+            table = self._table
+        if table is not None and len(items) < limit:
+            try:
+                rows = null_vector_rows(table, limit - len(items))
+                items.extend((("row", r["_rowid"]), r.get("text") or "") for r in rows)
+            except Exception as exc:  # pragma: no cover
+                logger.warning("Listing rows without vectors failed: %s", exc)
+        return items
+
+    def apply_embeddings(self, items: List[Tuple[Any, List[float]]]) -> int:
+        """Write backfilled vectors in place; returns how many rows were updated."""
+        done = 0
+        ram_records = []
+        with self._write_lock:
+            for (kind, ref), vector in items:
+                if vector is None:
+                    continue
+                if kind == "ram":
+                    ref["vector"] = vector
+                    ram_records.append(ref)
+                    continue
+                try:
+                    set_row_vector(self._table, ref, vector)
+                    done += 1
+                except Exception as exc:  # pragma: no cover
+                    logger.warning("Updating vector for row %s failed: %s", ref, exc)
+            if ram_records:
+                # Filter in place: a copy would drop rows store_messages appends meanwhile
+                written = {id(r) for r in ram_records}
+                self._unembedded[:] = [r for r in self._unembedded if id(r) not in written]
+                try:
+                    self._table = create_or_add(self._db, self._table, self.collection, ram_records, self._unembedded)
+                    done += len(ram_records)
+                except Exception as exc:  # pragma: no cover
+                    logger.error("Failed to write backfilled messages to LanceDB: %s", exc)
+                    self._unembedded.extend(ram_records)
+                self._save_pending()
+        if done:
+            self._notify_write()  # rows that had no vector are searchable now
+        return done
+
+    def _save_pending(self) -> None:
+        if self._pending_spool is not None:
+            self._pending_spool.save(self._unembedded)
 
     def get_similar_messages(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
         """Return top K semantically similar messages for a query.
@@ -156,6 +249,20 @@ class MemoryManager:
 
         try:
             qvec = self._embeddings.embed_query(query)
+        except Exception as exc:  # pragma: no cover
+            logger.error("Similarity search failed: %s", exc)
+            return []
+        return self.search_by_vector(qvec, top_k=top_k)
+
+    def search_by_vector(self, qvec: List[float], top_k: int = 5, min_score: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Return top K messages for an already-embedded query.
+
+        Lets callers that embed once per turn (see RetrievalCoordinator) skip a second embedding.
+        Scores are cosine similarities; rows below `min_score` are dropped when it is given.
+        """
+        if not (self.enabled and self.persist and self._table is not None):
+            return []
+        try:
             results = (
                 self._table.search(qvec)  # type: ignore[attr-defined]
                 .metric("cosine")
@@ -165,10 +272,14 @@ class MemoryManager:
             # Normalize result shape to list of dicts with ts,user,text and optional score
             normalized: List[Dict[str, Any]] = []
             for item in results:
-                # Some clients include distance/score; preserve if present
                 norm = {k: item.get(k) for k in ("ts", "user", "text")}
+                # Some clients include score, LanceDB reports cosine distance; preserve either
                 if "score" in item:
                     norm["score"] = item["score"]
+                elif item.get("_distance") is not None:
+                    norm["score"] = 1.0 - float(item["_distance"])
+                if min_score is not None and norm.get("score") is not None and norm["score"] < min_score:
+                    continue
                 normalized.append(norm)  # type: ignore[arg-type]
             return normalized
         except Exception as exc:  # pragma: no cover
@@ -193,14 +304,18 @@ class MemoryManager:
     def clear_memory(self) -> None:
         """Wipe the collection/storage."""
         self._history.clear()
-        if self.enabled and self.persist and self._db is not None:
-            try:
-                if self._table is not None:
-                    # Drop and recreate empty
-                    self._db.drop_table(self.collection)
-                    self._table = None
-            except Exception as exc:  # pragma: no cover
-                logger.warning("Failed to drop LanceDB table: %s", exc)
+        with self._write_lock:
+            self._unembedded.clear()
+            self._save_pending()
+            if self.enabled and self.persist and self._db is not None:
+                try:
+                    if self._table is not None:
+                        # Drop and recreate empty
+                        self._db.drop_table(self.collection)
+                        self._table = None
+                except Exception as exc:  # pragma: no cover
+                    logger.warning("Failed to drop LanceDB table: %s", exc)
+        self._notify_write()
 
     # New async semantic query APIs
     async def query_memory(self, topic: Optional[str] = None, recent_n: int = 5, min_score: Optional[float] = None) -> List[Dict[str, Any]]:
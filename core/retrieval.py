@@ -0,0 +1,233 @@
+"""
+RetrievalCoordinator — One embedding per turn, shared by every retrieval consumer.
+
+- Embeds the user utterance once and fans out knowledge and memory searches concurrently.
+- Returns a merged, deduplicated, score-normalized RetrievalBundle.
+- Caches in-flight and recent bundles by normalized text, so Brain, AutonomyAgent and
+  KnowledgeManager.query_with_memory all reuse the same work for the same turn.
+
+Knowledge and memory must share an embedding model (both default to memory.embedding_model).
+"""
+
+from __future__ import annotations
+import asyncio
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.config import settings
+
+
+logger = logging.getLogger("nia.core.retrieval")
+
+
+@dataclass
+class ContextItem:
+    kind: str  # "knowledge" or "memory"
+    text: str
+    score: float  # normalized to [0, 1]
+    source: Optional[str] = None
+    ts: Optional[str] = None
+    user: Optional[str] = None
+
+
+@dataclass
+class RetrievalBundle:
+    query: str
+    knowledge: List[Dict[str, Any]] = field(default_factory=list)
+    memory: List[Dict[str, Any]] = field(default_factory=list)
+    items: List[ContextItem] = field(default_factory=list)
+    embed_ms: float = 0.0
+    search_ms: float = 0.0
+
+    def knowledge_snippets(self) -> List[str]:
+        return [f"{d.get('source', d.get('name',''))}: {d.get('text','')}" for d in self.knowledge]
+
+    def memory_snippets(self) -> List[str]:
+        return [f"[{r.get('ts','')}] {r.get('user', r.get('role',''))}: {r.get('text','')}" for r in self.memory if r.get("text")]
+
+
+def _normalize_key(text: str) -> str:
+    return re.sub(r"\s+", " ", (text or "").strip().lower())
+
+
+def _normalized_scores(rows: List[Dict[str, Any]]) -> List[float]:
+    """Map cosine similarities to [0, 1]; rows without a score get a rank-based score."""
+    scores = []
+    for rank, row in enumerate(rows):
+        score = row.get("score")
+        if score is None:
+            scores.append(1.0 - rank / max(len(rows), 1))
+        else:
+            scores.append(min(max(float(score), 0.0), 1.0))
+    return scores
+
+
+class RetrievalCoordinator:
+    def __init__(
+        self,
+        knowledge: Optional[Any] = None,
+        memory: Optional[Any] = None,
+        embeddings_client: Optional[Any] = None,
+        knowledge_top_k: Optional[int] = None,
+        memory_top_k: Optional[int] = None,
+        cache_size: Optional[int] = None,
+        cache_ttl_s: Optional[float] = None,
+    ) -> None:
+        cfg = settings.get("retrieval", {}) if isinstance(settings, dict) else {}
+        self._embeddings = embeddings_client
+        self.knowledge_top_k = knowledge_top_k or int(settings.get("knowledge", {}).get("top_k", 5))
+        self.memory_top_k = memory_top_k or int(cfg.get("memory_top_k", 5))
+        self.cache_size = int(cache_size if cache_size is not None else cfg.get("cache_size", 8))
+        self.cache_ttl_s = float(cache_ttl_s if cache_ttl_s is not None else cfg.get("cache_ttl_s", 30))
+
+        # Turn jobs and the memory searches they fan out to use separate pools so a
+        # turn job can never wait on a search queued behind other turn jobs.
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="nia-retrieval")
+        self._search_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="nia-retrieval-search")
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[str, Tuple[float, Future]]" = OrderedDict()
+        self._knowledge = self._memory = None
+        self.knowledge = knowledge
+        self.memory = memory
+
+    # Sources register this coordinator so their writes drop cached bundles
+    @property
+    def knowledge(self) -> Optional[Any]:
+        return self._knowledge
+
+    @knowledge.setter
+    def knowledge(self, manager: Optional[Any]) -> None:
+        self._knowledge = manager
+        self._watch(manager)
+
+    @property
+    def memory(self) -> Optional[Any]:
+        return self._memory
+
+    @memory.setter
+    def memory(self, manager: Optional[Any]) -> None:
+        self._memory = manager
+        self._watch(manager)
+
+    # --- Public API ------------------------------------------------------------------
+    def submit(self, text: str) -> Future:
+        """Start (or join) retrieval for `text` and return a Future[RetrievalBundle]."""
+        key = _normalize_key(text)
+        now = time.time()
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                started, fut = cached
+                fresh = now - started <= self.cache_ttl_s
+                if fresh and not (fut.done() and fut.exception() is not None):
+                    self._cache.move_to_end(key)
+                    return fut
+            fut = self._executor.submit(self._run, text)
+            self._cache[key] = (now, fut)
+            while len(self._cache) > max(self.cache_size, 1):
+                self._cache.popitem(last=False)
+        return fut
+
+    def retrieve(self, text: str, timeout: Optional[float] = None) -> RetrievalBundle:
+        """Blocking retrieval, for worker threads."""
+        return self.submit(text).result(timeout=timeout)
+
+    async def aretrieve(self, text: str) -> RetrievalBundle:
+        """Awaitable retrieval, for the asyncio loop."""
+        return await asyncio.wrap_future(self.submit(text))
+
+    def invalidate(self) -> None:
+        """Drop cached bundles, e.g. after new knowledge or memory was written."""
+        with self._lock:
+            self._cache.clear()
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
+        self._search_executor.shutdown(wait=False)
+
+    # --- Internals ---------------------------------------------------------------------
+    def _watch(self, manager: Optional[Any]) -> None:
+        add_listener = getattr(manager, "add_write_listener", None)
+        if add_listener is not None:
+            add_listener(self)
+        self.invalidate()  # bundles from the previous source are stale
+
+    def _embedder(self) -> Optional[Any]:
+        if self._embeddings is not None:
+            return self._embeddings
+        for mgr in (self.memory, self.knowledge):
+            client = getattr(mgr, "_embeddings", None) if mgr is not None else None
+            if client is not None:
+                return client
+        return None
+
+    def _run(self, text: str) -> RetrievalBundle:
+        bundle = RetrievalBundle(query=text)
+        qvec = None
+        embedder = self._embedder()
+        t0 = time.perf_counter()
+        if embedder is not None:
+            try:
+                qvec = embedder.embed_query(text)
+            except Exception as exc:
+                logger.warning("Embedding failed for retrieval; using non-semantic fallbacks: %s", exc)
+        t1 = time.perf_counter()
+        bundle.embed_ms = (t1 - t0) * 1000
+
+        memory_future = self._search_executor.submit(self._search_memory, text, qvec) if self.memory is not None else None
+        bundle.knowledge = self._search_knowledge(qvec)
+        if memory_future is not None:
+            try:
+                bundle.memory = memory_future.result()
+            except Exception as exc:
+                logger.warning("Memory retrieval failed: %s", exc)
+        bundle.search_ms = (time.perf_counter() - t1) * 1000
+        bundle.items = self._merge(bundle.knowledge, bundle.memory)
+        logger.debug(
+            "Retrieval for '%s': %s knowledge, %s memory, %s merged (embed %.1f ms, search %.1f ms)",
+            text[:40], len(bundle.knowledge), len(bundle.memory), len(bundle.items), bundle.embed_ms, bundle.search_ms,
+        )
+        return bundle
+
+    def _search_knowledge(self, qvec: Optional[List[float]]) -> List[Dict[str, Any]]:
+        if self.knowledge is None or qvec is None:
+            return []
+        try:
+            return self.knowledge.query_by_vector(qvec, top_k=self.knowledge_top_k)
+        except Exception as exc:
+            logger.warning("Knowledge retrieval failed: %s", exc)
+            return []
+
+    def _search_memory(self, text: str, qvec: Optional[List[float]]) -> List[Dict[str, Any]]:
+        if qvec is not None and getattr(self.memory, "semantic_enabled", False):
+            return self.memory.search_by_vector(qvec, top_k=self.memory_top_k)
+        # Substring fallback over the in-RAM session history
+        return self.memory.get_similar_messages(text, top_k=self.memory_top_k)
+
+    @staticmethod
+    def _merge(knowledge: List[Dict[str, Any]], memory: List[Dict[str, Any]]) -> List[ContextItem]:
+        merged: Dict[str, ContextItem] = {}
+        for kind, rows in (("knowledge", knowledge), ("memory", memory)):
+            for row, score in zip(rows, _normalized_scores(rows)):
+                text = row.get("text") or ""
+                key = _normalize_key(text)
+                if not key:
+                    continue
+                existing = merged.get(key)
+                if existing is not None and existing.score >= score:
+                    continue
+                merged[key] = ContextItem(
+                    kind=kind,
+                    text=text,
+                    score=score,
+                    source=row.get("source", row.get("name")) if kind == "knowledge" else None,
+                    ts=row.get("ts"),
+                    user=row.get("user", row.get("role")),
+                )
+        return sorted(merged.values(), key=lambda item: item.score, reverse=True)
@@ -0,0 +1,274 @@
+"""
+Out-of-process audio capture through a shared-memory ring buffer.
+
+The PortAudio callback normally runs in NIA's own interpreter, where LLM streaming, VAD
+and TTS synthesis compete for the GIL; a late callback means an input overflow and lost
+audio. With `stt.capture_process: true` a small child process owns the microphone instead:
+
+- Its callback only copies int16 PCM into a SharedAudioRing (multiprocessing.shared_memory),
+  so capture keeps up no matter how busy the main process is.
+- ProcessCaptureStream is a drop-in stream for AudioCaptureHub: a reader thread in the main
+  process pulls new samples from the shared ring and feeds the hub like a local callback.
+  If the main process stalls, audio waits in the shared ring (10 s by default) instead of
+  being dropped by PortAudio.
+- A multiprocessing Pipe carries only control and status (started/error/stop, overflow
+  counts), never audio, so a stalled reader can never block the capture process.
+"""
+
+from __future__ import annotations
+import logging
+import multiprocessing as mp
+import threading
+import time
+from multiprocessing import shared_memory
+from typing import Any, Callable, Optional, Tuple
+
+import numpy as np
+
+
+logger = logging.getLogger("nia.core.shared_audio")
+
+_HEADER_SLOTS = 4  # int64: write_total, overflows, callbacks, reserved
+_HEADER_BYTES = _HEADER_SLOTS * 8
+
+
+class SharedAudioRing:
+    """Single-writer int16 ring in shared memory; readers keep their own absolute cursors."""
+
+    def __init__(self, shm: shared_memory.SharedMemory, capacity: int, owner: bool) -> None:
+        self.shm = shm
+        self.capacity = capacity
+        self.owner = owner
+        self._header = np.ndarray((_HEADER_SLOTS,), dtype=np.int64, buffer=shm.buf)
+        self._data = np.ndarray((capacity,), dtype=np.int16, buffer=shm.buf, offset=_HEADER_BYTES)
+
+    @classmethod
+    def create(cls, capacity: int) -> "SharedAudioRing":
+        shm = shared_memory.SharedMemory(create=True, size=_HEADER_BYTES + 2 * int(capacity))
+        ring = cls(shm, int(capacity), owner=True)
+        ring._header[:] = 0
+        return ring
+
+    @classmethod
+    def attach(cls, name: str, capacity: int) -> "SharedAudioRing":
+        return cls(shared_memory.SharedMemory(name=name), int(capacity), owner=False)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @property
+    def write_total(self) -> int:
+        return int(self._header[0])
+
+    @property
+    def overflows(self) -> int:
+        return int(self._header[1])
+
+    # --- Writer (capture process) ------------------------------------------------
+    def write(self, samples: np.ndarray, overflow: bool = False) -> None:
+        """Copy samples in, then publish them by advancing write_total."""
+        n = written = samples.shape[0]
+        if n > self.capacity:
+            samples, n = samples[-self.capacity:], self.capacity
+        total = int(self._header[0]) + written - n  # skipped samples still count as written
+        pos = total % self.capacity
+        first = min(n, self.capacity - pos)
+        self._data[pos:pos + first] = samples[:first]
+        if n > first:
+            self._data[:n - first] = samples[first:]
+        if overflow:
+            self._header[1] += 1
+        self._header[2] += 1
+        self._header[0] = total + n
+
+    # --- Reader (main process) ---------------------------------------------------
+    def read_since(self, cursor: int, max_n: Optional[int] = None) -> Tuple[np.ndarray, int, int]:
+        """Copy samples written after absolute index `cursor`.
+
+        Returns (samples, new_cursor, dropped); `dropped` counts samples the writer had
+        already overwritten before they could be read.
+        """
+        total = self.write_total
+        dropped = max(total - self.capacity - cursor, 0)
+        start = cursor + dropped
+        n = total - start if max_n is None else min(total - start, max_n)
+        if n <= 0:
+            return np.zeros(0, dtype=np.int16), start, dropped
+        pos = start % self.capacity
+        first = min(n, self.capacity - pos)
+        out = np.empty(n, dtype=np.int16)
+        out[:first] = self._data[pos:pos + first]
+        if n > first:
+            out[first:] = self._data[:n - first]
+        # The writer may have lapped us while copying: discard what it overwrote
+        overwritten = max(self.write_total - self.capacity - start, 0)
+        if overwritten:
+            out = out[overwritten:]
+            dropped += min(overwritten, n)
+        return out, start + n, dropped
+
+    def close(self) -> None:
+        self._header = self._data = None  # release the buffer exports before closing
+        self.shm.close()
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def _capture_process(ring_name: str, capacity: int, samplerate: int, blocksize: int, device: Any,
+                     conn, stream_factory: Optional[Callable[..., Any]]) -> None:
+    """Child process: open the input stream and copy every block into the shared ring."""
+    ring = SharedAudioRing.attach(ring_name, capacity)
+    stream = None
+    try:
+        if stream_factory is None:
+            import sounddevice as sd
+            stream_factory = sd.RawInputStream
+
+        def callback(indata, frames, time_info, status) -> None:
+            ring.write(np.frombuffer(indata, dtype=np.int16), overflow=bool(status))
+
+        stream = stream_factory(samplerate=samplerate, blocksize=blocksize, dtype="int16",
+                                channels=1, device=device, callback=callback)
+        stream.start()
+        conn.send(("started", None))
+        while True:
+            if conn.poll(1.0):
+                message = conn.recv()
+                if message == "stop":
+                    break
+    except (EOFError, OSError):
+        pass  # parent went away
+    except Exception as exc:
+        try:
+            conn.send(("error", repr(exc)))
+        except Exception:
+            pass
+    finally:
+        if stream is not None:
+            try:
+                stream.stop()
+                stream.close()
+            except Exception:
+                pass
+        try:
+            conn.send(("stopped", {"overflows": ring.overflows, "samples": ring.write_total}))
+        except Exception:
+            pass
+        ring.close()
+
+
+class ProcessCaptureStream:
+    """AudioCaptureHub stream that captures in a child process (see module docstring)."""
+
+    def __init__(self, *, samplerate: int, blocksize: int, callback: Callable[..., None],
+                 dtype: str = "int16", channels: int = 1, device: Any = None,
+                 capacity_s: float = 10.0, stream_factory: Optional[Callable[..., Any]] = None,
+                 start_timeout: float = 10.0) -> None:
+        self.samplerate = samplerate
+        self.blocksize = blocksize
+        self.callback = callback
+        self.device = device
+        self.capacity = int(samplerate * capacity_s)
+        self.stream_factory = stream_factory  # must be picklable; the child opens the stream
+        self.start_timeout = start_timeout
+        self.dropped = 0  # samples the reader lost because the main process fell > capacity behind
+        self._ring: Optional[SharedAudioRing] = None
+        self._process = None
+        self._conn = None
+        self._reader: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @classmethod
+    def factory(cls, **options) -> Callable[..., "ProcessCaptureStream"]:
+        """A stream_factory for AudioCaptureHub with extra options bound (capacity_s, ...)."""
+        return lambda **kwargs: cls(**kwargs, **options)
+
+    @property
+    def overflows(self) -> int:
+        return self._ring.overflows if self._ring is not None else 0
+
+    def start(self) -> None:
+        ctx = mp.get_context("spawn")  # a fresh interpreter: nothing of ours competes for its GIL
+        self._ring = SharedAudioRing.create(self.capacity)
+        parent_conn, child_conn = ctx.Pipe()
+        self._conn = parent_conn
+        self._process = ctx.Process(
+            target=_capture_process,
+            args=(self._ring.name, self.capacity, self.samplerate, self.blocksize, self.device,
+                  child_conn, self.stream_factory),
+            name="nia-capture",
+            daemon=True,
+        )
+        self._process.start()
+        child_conn.close()
+        if not parent_conn.poll(self.start_timeout):
+            self._teardown()
+            raise RuntimeError("Capture process did not start in time")
+        kind, detail = parent_conn.recv()
+        if kind != "started":
+            self._teardown()
+            raise RuntimeError(f"Capture process failed: {detail}")
+        self._stop.clear()
+        self._reader = threading.Thread(target=self._read_loop, name="nia-capture-reader", daemon=True)
+        self._reader.start()
+        logger.info("Capture process %s started (ring %.1f s).", self._process.pid, self.capacity / self.samplerate)
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._reader is not None:
+            self._reader.join(timeout=1)
+            self._reader = None
+        if self._conn is not None:
+            try:
+                self._conn.send("stop")
+                if self._conn.poll(2.0):
+                    kind, detail = self._conn.recv()
+                    if kind == "stopped":
+                        logger.info("Capture process stopped: %s", detail)
+            except (EOFError, OSError):
+                pass
+        self._teardown()
+
+    def close(self) -> None:
+        pass
+
+    def _teardown(self) -> None:
+        if self._process is not None:
+            self._process.join(timeout=2)
+            if self._process.is_alive():
+                self._process.terminate()
+            self._process = None
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        if self._ring is not None:
+            self._ring.close()
+            self._ring = None
+
+    def _read_loop(self) -> None:
+        """Forward new samples to the hub in block-sized callbacks."""
+        ring = self._ring
+        cursor = 0  # everything since the stream opened, including blocks written before we got here
+        seen_overflows = ring.overflows
+        poll_s = self.blocksize / self.samplerate / 2
+        while not self._stop.is_set():
+            samples, cursor, dropped = ring.read_since(cursor)
+            if dropped:
+                self.dropped += dropped
+                logger.warning("Main process fell behind the capture ring; %s samples lost.", dropped)
+            overflows = ring.overflows
+            status = "input overflow" if overflows != seen_overflows else None
+            seen_overflows = overflows
+            for start in range(0, samples.shape[0], self.blocksize):
+                block = samples[start:start + self.blocksize]
+                self.callback(block, block.shape[0], None, status)
+                status = None
+            if samples.shape[0] == 0:
+                if self._process is not None and not self._process.is_alive():
+                    logger.error("Capture process exited unexpectedly.")
+                    return
+                time.sleep(poll_s)
@@ -5,20 +5,37 @@ with optional Silero VAD for voice activity detection and DeepFilterNet for
 noise suppression. All enhancements are feature-flagged via config.
 """
 import asyncio
+import importlib.util
 import json
 import logging
-import queue
-from typing import Optional
+import os
+import threading
+import time
+from contextlib import closing
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable, List, Optional
 
-import sounddevice as sd
 from vosk import Model, KaldiRecognizer
 import numpy as np
 
+from core.audio_buffer import AudioRingBuffer
+from core.audio_capture import AudioCaptureHub
+from core import vosk_models
 from core.config import settings
+from core.enhancement import EnhancementStage
+from core.shared_audio import ProcessCaptureStream
+from core.endpointing import CONTINUE, AdaptiveEndpointer, frame_energy_flags
 
 logger = logging.getLogger("nia.core.stt_manager")
 
 
+@dataclass
+class TranscriptEvent:
+    kind: str  # "partial" (may still change) or "final" (a committed segment)
+    text: str
+    timestamp: float = field(default_factory=time.time)
+
+
 # --- Optional provider wrappers -------------------------------------------------
 
 class _SileroVADProvider:
@@ -71,6 +88,105 @@ class _SileroVADProvider:
             self._enabled = False
             return True
 
+    def process_frames(self, frames: np.ndarray) -> np.ndarray:
+        """Evaluate consecutive frames; returns one speech flag per frame."""
+        return np.array([self.process_frame(f) for f in frames], dtype=bool)
+
+
+class _SileroOnnxVADProvider:
+    """Silero VAD on onnxruntime (CPU) from a local or packaged ONNX model.
+
+    No torch import and no network fetch. The LSTM state and the 64-sample context
+    carry over between calls, and `process_frames` evaluates many frames per call.
+    """
+
+    # (frame samples, context samples) per supported sample rate
+    RATE_CONFIG = {16000: (512, 64), 8000: (256, 32)}
+    PACKAGED_MODEL = "silero_vad.onnx"
+
+    def __init__(self, sample_rate: int, model_path: Optional[str] = None, threshold: float = 0.5):
+        self.sample_rate = sample_rate
+        self.threshold = threshold
+        self._enabled = False
+        self._session = None
+        try:
+            import onnxruntime as ort  # type: ignore
+            if sample_rate not in self.RATE_CONFIG:
+                raise ValueError(f"Unsupported sample rate {sample_rate}; Silero supports {sorted(self.RATE_CONFIG)}")
+            self.frame_samples, self.context_samples = self.RATE_CONFIG[sample_rate]
+            path = model_path or self._packaged_model_path()
+            if not path or not os.path.exists(path):
+                raise FileNotFoundError(f"Silero ONNX model not found (vad_model_path={model_path!r})")
+            options = ort.SessionOptions()
+            options.inter_op_num_threads = 1
+            options.intra_op_num_threads = 1
+            self._session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+            self.reset()
+            self._enabled = True
+            logger.info("Silero VAD (onnxruntime) initialized from '%s'.", path)
+        except ImportError as e:
+            logger.error("onnxruntime missing. VAD disabled. Reason: %s", e)
+            logger.error("To enable VAD, install: pip install onnxruntime")
+        except Exception as e:
+            logger.error("Silero ONNX VAD initialization failed. VAD disabled. Reason: %s", e)
+            logger.error("Set stt.vad_model_path to a local silero_vad .onnx file, or pip install silero-vad")
+
+    @classmethod
+    def _packaged_model_path(cls) -> Optional[str]:
+        """Locate the ONNX model shipped in the silero-vad package without importing it."""
+        spec = importlib.util.find_spec("silero_vad")
+        if spec is None or not spec.submodule_search_locations:
+            return None
+        for location in spec.submodule_search_locations:
+            candidate = os.path.join(location, "data", cls.PACKAGED_MODEL)
+            if os.path.exists(candidate):
+                return candidate
+        return None
+
+    @property
+    def enabled(self) -> bool:
+        return self._enabled
+
+    def reset(self) -> None:
+        """Clear the recurrent state, e.g. between utterances."""
+        self._state = np.zeros((2, 1, 128), dtype=np.float32)
+        self._sr = np.array(self.sample_rate, dtype=np.int64)
+        self._input = np.zeros((1, self.context_samples + self.frame_samples), dtype=np.float32)
+        self._context = np.zeros(self.context_samples, dtype=np.float32)
+        self.last_probs = np.zeros(0, dtype=np.float32)
+
+    def speech_probs(self, frames: np.ndarray) -> np.ndarray:
+        """Per-frame speech probabilities for consecutive frames (shape (n, frame) or flat)."""
+        frames = np.asarray(frames, dtype=np.float32).reshape(-1, self.frame_samples)
+        n, ctx = frames.shape[0], self.context_samples
+        if n == 0:
+            return np.zeros(0, dtype=np.float32)
+        probs = np.empty(n, dtype=np.float32)
+        self._input[0, :ctx] = self._context
+        for i in range(n):
+            self._input[0, ctx:] = frames[i]
+            out, self._state = self._session.run(None, {"input": self._input, "state": self._state, "sr": self._sr})
+            probs[i] = out[0, 0]
+            self._input[0, :ctx] = frames[i, -ctx:]
+        self._context[:] = frames[-1, -ctx:]
+        self.last_probs = probs
+        return probs
+
+    def process_frames(self, frames: np.ndarray) -> np.ndarray:
+        """Speech flags for consecutive frames. If disabled, every frame counts as speech."""
+        if not self._enabled:
+            return np.ones(max(np.asarray(frames).size // self.frame_samples, 1), dtype=bool)
+        try:
+            return self.speech_probs(frames) >= self.threshold
+        except Exception as e:
+            logger.error("Silero ONNX VAD runtime error; disabling VAD. Reason: %s", e)
+            self._enabled = False
+            return np.ones(max(np.asarray(frames).size // self.frame_samples, 1), dtype=bool)
+
+    def process_frame(self, audio_float_mono: np.ndarray) -> bool:
+        """Return True if frame contains speech, False otherwise."""
+        return bool(self.process_frames(audio_float_mono)[-1])
+
 
 class _DeepFilterNetProvider:
     """Wrapper for DeepFilterNet enhancement with graceful fallback."""
@@ -107,6 +223,12 @@ class _DeepFilterNetProvider:
     def enabled(self) -> bool:
         return self._enabled
 
+    @property
+    def hop_size(self) -> int:
+        """Samples per enhancer hop at our sample rate (DeepFilterNet: 10 ms)."""
+        hop = getattr(self._enhancer, "hop_size", None)
+        return int(hop() if callable(hop) else hop) if hop else self.sample_rate // 100
+
     def enhance_frame(self, audio_float_mono: np.ndarray) -> np.ndarray:
         if not self._enabled:
             return audio_float_mono
@@ -127,227 +249,481 @@ class _DeepFilterNetProvider:
             return audio_float_mono
 
 
+def stt_profile_config(stt_cfg: dict, profile: Optional[str] = None) -> dict:
+    """Return the stt settings with the selected latency profile's keys laid over them."""
+    name = profile or stt_cfg.get("profile")
+    if not name:
+        return dict(stt_cfg)
+    overrides = (stt_cfg.get("profiles") or {}).get(name)
+    if overrides is None:
+        logger.warning("Unknown STT profile '%s'; using the base stt settings.", name)
+        return dict(stt_cfg)
+    merged = dict(stt_cfg, profile=name)
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = {**merged[key], **value}
+        else:
+            merged[key] = value
+    return merged
+
+
+def build_vad_provider(stt_cfg: dict, sample_rate: int):
+    """Create the configured Silero VAD provider; None if it is unavailable."""
+    if str(stt_cfg.get("vad_runtime", "onnx")).lower() == "onnx":
+        provider = _SileroOnnxVADProvider(
+            sample_rate,
+            model_path=stt_cfg.get("vad_model_path"),
+            threshold=float(stt_cfg.get("vad_threshold", 0.5)),
+        )
+    else:
+        provider = _SileroVADProvider(sample_rate)
+    return provider if provider.enabled else None
+
+
+def build_dfn_provider(cfg: dict, sample_rate: int) -> Optional[_DeepFilterNetProvider]:
+    """Create the DeepFilterNet provider if enabled in config and available; else None."""
+    stt_cfg = cfg.get("stt", {})
+    # Check both old and new config locations for DeepFilterNet
+    use_dfn = bool(stt_cfg.get("deepfilternet", False))
+    model_dir = stt_cfg.get("deepfilternet_model_dir", None)
+    enhancement_cfg = cfg.get("stt_enhancement", {})
+    if enhancement_cfg.get("enable", False):
+        use_dfn = True
+        model_dir = enhancement_cfg.get("model_dir", model_dir)
+    if not use_dfn:
+        return None
+    provider = _DeepFilterNetProvider(model_dir, sample_rate)
+    if not provider.enabled:
+        logger.warning("DeepFilterNet was configured but is unavailable. Audio enhancement disabled.")
+        return None
+    return provider
+
+
+class _EnergyGate:
+    """RMS gate in dBFS with a hangover, so quiet audio never reaches the recognizer."""
+
+    def __init__(self, sample_rate: int, threshold_dbfs: float = -45.0, hangover_ms: int = 600):
+        self.sample_rate = sample_rate
+        self.threshold_dbfs = threshold_dbfs
+        self.hangover_samples = int(sample_rate * hangover_ms / 1000)
+        self._scratch = np.zeros(0, dtype=np.float32)
+        self._quiet_samples = 0
+        self.is_open = False
+        self.level_dbfs = -120.0
+
+    def rms_dbfs(self, pcm: np.ndarray) -> float:
+        n = pcm.shape[0]
+        if n == 0:
+            return -120.0
+        if self._scratch.shape[0] < n:
+            self._scratch = np.zeros(n, dtype=np.float32)
+        x = self._scratch[:n]
+        np.multiply(pcm, 1.0 / 32768.0, out=x, casting="unsafe")
+        rms = float(np.sqrt(np.dot(x, x) / n))
+        return 20.0 * float(np.log10(max(rms, 1e-6)))
+
+    def update(self, pcm: np.ndarray) -> bool:
+        """Feed one int16 block; return True while the gate is open (speech or hangover)."""
+        self.level_dbfs = self.rms_dbfs(pcm)
+        if self.level_dbfs >= self.threshold_dbfs:
+            self.is_open = True
+            self._quiet_samples = 0
+        elif self.is_open:
+            self._quiet_samples += pcm.shape[0]
+            if self._quiet_samples > self.hangover_samples:
+                self.is_open = False
+        return self.is_open
+
+    def reset(self) -> None:
+        self.is_open = False
+        self._quiet_samples = 0
+
+
 class STTManager:
-    def __init__(self, loop: asyncio.AbstractEventLoop):
+    def __init__(self, loop: asyncio.AbstractEventLoop, profile: Optional[str] = None):
         self.loop = loop
+        # The latency profile ('balanced', 'low_latency', ...) overrides the base stt settings
+        stt_cfg = stt_profile_config(settings.get("stt", {}), profile)
+        self.profile = stt_cfg.get("profile")
         self.sample_rate = 16000
-        self.blocksize = 8000  # Keep large blocksize for Vosk
+        # Samples per gate/endpoint step, and per Vosk call (Vosk runs on its own cadence)
+        self.blocksize = int(stt_cfg.get("read_blocksize", 8000))
+        self.decode_blocksize = int(stt_cfg.get("decode_blocksize", self.blocksize))
         self.vad_blocksize = 512  # Silero VAD expects 512 samples for 16kHz
-        self.model_path = settings["stt"]["vosk_model_path"]
-        try:
-            self.model = Model(self.model_path)
-        except Exception as e:
-            logger.error(
-                "Failed to load Vosk model from '%s'. "
-                "Please ensure you have downloaded and placed the model correctly.",
-                self.model_path
-            )
-            raise e
-
-        self.recognizer = KaldiRecognizer(self.model, self.sample_rate)
-        self.audio_queue = queue.Queue()
+        # Vosk models load and warm up in the background, so the interface can come up
+        # immediately; listening awaits `model_ready`. The registry holds every configured
+        # model by key, so sessions can switch models without a restart.
+        self.models = vosk_models.VoskModelRegistry.from_config(stt_cfg, sample_rate=self.sample_rate)
+        self.model_key = self.models.default
+        self.model_path = self.models.paths[self.model_key]
+        self.model: Optional[Model] = None
+        self.recognizer: Optional[KaldiRecognizer] = None
+        self._recognizer_key = self.model_key  # the model the current recognizer was built for
+        self.model_ready = self.models.get_async(self.model_key)
+        self.models.preload(stt_cfg.get("preload_models") or [])
         self.is_listening = False
-        self._stop_event = asyncio.Event()
-        self.stream = None
+        # One stop flag per listening session, so a session that is still winding down
+        # can never be revived (or a new one stopped) by the next listen call.
+        self._session_stops: set[threading.Event] = set()
+        self._session_lock = threading.Lock()  # the recognizer and VAD state serve one session at a time
+        self._last_partial = ""
+        self.last_endpoint_lag_ms: Optional[float] = None
         self._wake_listener_running = False
         self._wake_listener_thread = None
         self._wake_callback = None
         
-        # VAD frame buffer for proper frame size
-        self.vad_buffer = np.array([], dtype=np.float32)
+        # One long-lived microphone stream shared by the wake listener and transcription
+        self.capture = AudioCaptureHub(
+            sample_rate=self.sample_rate,
+            blocksize=int(stt_cfg.get("capture_blocksize", 1600)),
+            capacity_s=float(stt_cfg.get("capture_buffer_s", 10)),
+            device=stt_cfg.get("input_device"),
+            # Optionally capture in a child process, writing into a shared-memory ring
+            stream_factory=ProcessCaptureStream.factory(capacity_s=float(stt_cfg.get("capture_buffer_s", 10)))
+            if stt_cfg.get("capture_process", False) else None,
+        )
+        # Pre-roll: a session starts this far back in the always-filling capture ring, and
+        # while the speech gate is closed the same amount of audio is held back and decoded
+        # as soon as speech starts, so the first syllables are never clipped.
+        self.preroll_samples = int(self.sample_rate * float(stt_cfg.get("preroll_ms", 500)) / 1000)
+        self._held_audio = AudioRingBuffer(max(self.preroll_samples, 1), dtype=np.int16)
+        self._wake_mark: Optional[tuple] = None  # (ring position right after the wake word, monotonic time)
+
+        # Sample path: captured int16 blocks go to Vosk as they are; only the speech gate and
+        # DeepFilterNet see float32, scaled into reusable scratch buffers. VAD framing uses a
+        # preallocated ring (one second) that yields 512-sample frames as views.
+        self.vad_buffer = AudioRingBuffer(self.sample_rate, dtype=np.float32)
+        self._block_f32 = np.zeros(self.blocksize, dtype=np.float32)
+        self._decode_f32 = np.zeros(self.blocksize, dtype=np.float32)
+        self._decode_i16 = np.zeros(self.blocksize, dtype=np.int16)
+        self._decode_pending = AudioRingBuffer(2 * self.decode_blocksize, dtype=np.int16)
 
         # Feature flags and providers
-        stt_cfg = settings.get("stt", {})
         self.use_vad = bool(stt_cfg.get("vad", False)) and (stt_cfg.get("vad_engine", "").lower() == "silero")
-        self.vad_trigger_ms = int(stt_cfg.get("vad_trigger_ms", 250))
-        self.vad_release_ms = int(stt_cfg.get("vad_release_ms", 300))
-        # Check both old and new config locations for DeepFilterNet
-        self.use_dfn = bool(stt_cfg.get("deepfilternet", False))
-        self.dfn_model_dir = stt_cfg.get("deepfilternet_model_dir", None)
-        
-        # Also check the new stt_enhancement section
+        # End-of-utterance detection: VAD (or energy) + Vosk finals + adaptive trailing silence
+        self.endpointer = AdaptiveEndpointer.from_config(stt_cfg)
+        self.endpoint_energy_dbfs = float((stt_cfg.get("endpointing", {}) or {}).get("energy_threshold_dbfs", -45.0))
+        self.vad_provider = build_vad_provider(stt_cfg, self.sample_rate) if self.use_vad else None
+        if self.use_vad and self.vad_provider is None:
+            logger.warning("VAD was configured but is unavailable. Transcriptions may be less accurate without voice activity detection.")
+            self.use_vad = False
+
         enhancement_cfg = settings.get("stt_enhancement", {})
-        if enhancement_cfg.get("enable", False):
-            self.use_dfn = True
-            self.dfn_model_dir = enhancement_cfg.get("model_dir", self.dfn_model_dir)
-
-        self.vad_provider: Optional[_SileroVADProvider] = None
-        if self.use_vad:
-            self.vad_provider = _SileroVADProvider(self.sample_rate)
-            if not self.vad_provider.enabled:
-                logger.warning("VAD was configured but is unavailable. Transcriptions may be less accurate without voice activity detection.")
-                self.use_vad = False
+        self.dfn_provider = build_dfn_provider(settings, self.sample_rate)
+        self.use_dfn = self.dfn_provider is not None
 
-        self.dfn_provider: Optional[_DeepFilterNetProvider] = None
+        # Enhancement runs as its own pipeline stage so it can never stall decoding
+        self.enhancer: Optional[EnhancementStage] = None
         if self.use_dfn:
-            self.dfn_provider = _DeepFilterNetProvider(self.dfn_model_dir, self.sample_rate)
-            if not self.dfn_provider.enabled:
-                logger.warning("DeepFilterNet was configured but is unavailable. Audio enhancement disabled.")
-                self.use_dfn = False
+            self.enhancer = EnhancementStage(
+                self.dfn_provider,
+                sample_rate=self.sample_rate,
+                max_queue=int(enhancement_cfg.get("max_queue_blocks", 8)),
+                max_lag_ms=float(enhancement_cfg.get("max_lag_ms", 300)),
+            )
 
         # Wake-word configuration
         hybrid_cfg = settings.get("hybrid", {})
         self.wake_words = [w.lower() for w in hybrid_cfg.get("wake_words", ["nia", "hey nia", "okay nia"]) ]
         self.passive_enabled = bool(hybrid_cfg.get("passive_enabled", True))
+        self.wake_mode = str(hybrid_cfg.get("wake_mode", "passive")).lower()
+        self.wake_energy_threshold_dbfs = float(hybrid_cfg.get("wake_energy_threshold_dbfs", -45.0))
+        self.wake_hangover_ms = int(hybrid_cfg.get("wake_hangover_ms", 600))
+        self.wake_confirm = bool(hybrid_cfg.get("wake_confirm", True))
+        self.wake_confirm_window_s = float(hybrid_cfg.get("wake_confirm_window_s", 2.0))
+        self.wake_handoff_s = float(hybrid_cfg.get("wake_handoff_s", 3.0))
+
+    def _to_float32(self, pcm: np.ndarray) -> np.ndarray:
+        """Scale an int16 PCM block into the reusable float32 scratch buffer and return a view."""
+        if pcm.shape[0] > self._block_f32.shape[0]:
+            self._block_f32 = np.zeros(pcm.shape[0], dtype=np.float32)
+        out = self._block_f32[:pcm.shape[0]]
+        np.multiply(pcm, 1.0 / 32768.0, out=out, casting="unsafe")
+        return out
+
+    def start_capture(self) -> None:
+        """Open the shared microphone ahead of the first session, so the pre-roll is already filled."""
+        try:
+            self.capture.start()
+        except Exception as e:
+            logger.warning("Could not start audio capture ahead of listening: %s", e)
+
+    def _to_int16(self, audio_float: np.ndarray) -> np.ndarray:
+        """Quantize an enhanced float32 chunk into the reusable int16 scratch buffer and return a view."""
+        n = audio_float.shape[0]
+        if n > self._decode_i16.shape[0]:
+            self._decode_f32 = np.zeros(n, dtype=np.float32)
+            self._decode_i16 = np.zeros(n, dtype=np.int16)
+        clipped = self._decode_f32[:n]
+        np.clip(audio_float, -1.0, 1.0, out=clipped)
+        out = self._decode_i16[:n]
+        np.multiply(clipped, 32767, out=out, casting="unsafe")
+        return out
+
+    async def wait_until_ready(self) -> None:
+        """Wait for the background model load; raises if the model failed to load."""
+        if not self.model_ready.done():
+            logger.info("Waiting for the Vosk model to finish loading...")
+        await asyncio.wrap_future(self.model_ready)
+
+    async def transcribe_files(self, paths: List[str], workers: Optional[int] = None) -> List[dict]:
+        """Transcribe WAV/FLAC files or directories offline through a process pool.
+
+        Returns one result per file with its text, segments and real-time factor.
+        """
+        from core.batch_transcriber import BatchTranscriber
 
-    def _audio_callback(self, indata, frames, time, status):
-        """This is called (from a separate thread) for each audio block."""
-        if status:
-            logger.warning("Audio callback status: %s", status)
-        if self.is_listening:
-            # Keep callback lightweight; push raw PCM to queue
-            self.audio_queue.put(bytes(indata))
+        def run() -> List[dict]:
+            with BatchTranscriber(model_path=self.model_path, workers=workers,
+                                  sample_rate=self.sample_rate, blocksize=self.blocksize,
+                                  use_vad=self.use_vad, use_dfn=self.use_dfn) as batch:
+                return list(batch.transcribe(paths))
 
-    async def listen_and_transcribe(self) -> str | None:
+        return await self.loop.run_in_executor(None, run)
+
+    def select_model(self, key: str) -> None:
+        """Switch the model used from the next session on.
+
+        Returns immediately: the model loads in the background (if it is not resident) and
+        the next listen awaits it, while capture keeps running and filling the pre-roll.
+        A session already in progress finishes on its current recognizer.
         """
-        Listens for speech and returns the final transcript.
-        This is an async method that handles the streaming audio loop.
+        self.model_ready = self.models.get_async(key)
+        self.model_key = key
+        self.model_path = self.models.paths[key]
+        self.model = None
+        logger.info("STT model switched to '%s'.", key)
+
+    def _ensure_model(self) -> Model:
+        """Blocking access to the loaded model, for worker threads."""
+        if self.model is None:
+            self.model = self.model_ready.result()
+        return self.model
+
+    async def listen_stream(self) -> AsyncIterator[TranscriptEvent]:
+        """
+        Listens for one utterance and yields partial and final TranscriptEvents as they happen.
+        Events are pushed from the worker thread onto an asyncio.Queue; nothing polls.
         """
+        await self.wait_until_ready()
         self.is_listening = True
-        self._stop_event.clear()
+        stop = threading.Event()
+        self._session_stops.add(stop)
         logger.info("STTManager is now listening.")
-        
-        transcription_complete = self.loop.create_future()
-        self.loop.run_in_executor(None, self._transcription_loop, transcription_complete)
 
+        events: asyncio.Queue = asyncio.Queue()
+
+        def emit(event: Optional[TranscriptEvent]) -> None:
+            self.loop.call_soon_threadsafe(events.put_nowait, event)
+
+        worker = self.loop.run_in_executor(None, self._transcription_loop, emit, stop)
         try:
-            return await transcription_complete
+            while True:
+                event = await events.get()
+                if event is None:  # end of utterance
+                    break
+                yield event
+            await worker  # surface errors from the transcription loop
+        finally:
+            # Reached on completion, on consumer break and on cancellation alike
+            stop.set()
+            self._session_stops.discard(stop)
+            self.is_listening = bool(self._session_stops)
+            logger.info("STTManager stopped listening.")
+
+    async def listen_and_transcribe(self) -> str | None:
+        """
+        Listens for speech and returns the final transcript.
+        Built on listen_stream(); final segments are joined once at the end.
+        """
+        finals = []
+        try:
+            async for event in self.listen_stream():
+                if event.kind == "final" and event.text:
+                    finals.append(event.text)
         except asyncio.CancelledError:
             logger.info("STT transcription was cancelled.")
-            self._stop_event.set()
-            # The future might be cancelled before a result is set
-            if not transcription_complete.done():
-                # This ensures the transcription_loop can exit if it's waiting on the future
-                transcription_complete.cancel()
-            await asyncio.sleep(0.2) 
+            await asyncio.sleep(0.2)
             return None
-        finally:
-            self.is_listening = False
-            logger.info("STTManager stopped listening.")
+        return " ".join(finals).strip()
 
-    def _transcription_loop(self, future: asyncio.Future):
+    def _transcription_loop(self, emit: Callable[[Optional[TranscriptEvent]], None], stop: threading.Event):
         """
-        The core loop that processes audio from the queue with Vosk.
-        This runs in a thread to not block the main event loop.
+        The core loop that processes audio from the capture hub with Vosk.
+        This runs in a thread to not block the main event loop; results go out
+        through `emit`, which is called with None once the utterance has ended -
+        also when setup fails, so listen_stream() never waits on a dead worker.
         """
         try:
-            self.stream = sd.RawInputStream(samplerate=self.sample_rate, blocksize=self.blocksize, dtype='int16',
-                                            channels=1, callback=self._audio_callback)
-            with self.stream:
-                full_transcript = ""
-                in_speech = False
-                speech_ms = 0
-                silence_ms = 0
-                last_audio_time = 0
-                timeout_threshold = 5000  # 5 seconds of silence (increased for slower systems)
-                import time
-                start_time = time.time()
-                
-                while not self._stop_event.is_set():
-                    try:
-                        data = self.audio_queue.get(timeout=0.1)
-                        last_audio_time = 0  # Reset timeout when we get audio
-                        # Compute frame duration in ms based on byte length
-                        num_samples = len(data) // 2  # int16 mono
-                        frame_ms = int(1000 * num_samples / self.sample_rate)
-
-                        # Convert to float32 mono [-1, 1] for VAD/DFN
-                        audio_float = np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32768.0
-
-                        is_speech_frame = True
-                        if self.use_vad and self.vad_provider is not None:
-                            # Buffer audio for VAD processing (512 samples per frame)
-                            self.vad_buffer = np.concatenate([self.vad_buffer, audio_float])
-                            
-                            # Process VAD frames when we have exactly 512 samples
-                            if len(self.vad_buffer) >= self.vad_blocksize:
-                                vad_frame = self.vad_buffer[:self.vad_blocksize]
-                                self.vad_buffer = self.vad_buffer[self.vad_blocksize:]
-                                
-                                try:
-                                    is_speech_frame = self.vad_provider.process_frame(vad_frame)
-                                    # Debug logging
-                                    if is_speech_frame:
-                                        logger.debug("VAD detected speech frame")
-                                except Exception as e:
-                                    logger.error("Silero VAD runtime error; disabling VAD. Reason: %s", e)
-                                    self.use_vad = False
-                                    self.vad_provider = None
-                                    is_speech_frame = True
-                        else:
-                            # If VAD is disabled, always process audio
-                            is_speech_frame = True
-
-                        if is_speech_frame:
-                            speech_ms += frame_ms
-                            silence_ms = 0
-                            last_audio_time = 0  # Reset timeout on speech
-                            start_time = time.time()  # Reset start time on speech
-                            if not in_speech and speech_ms >= self.vad_trigger_ms:
-                                in_speech = True
-
-                            # Enhance if enabled
-                            if self.use_dfn and self.dfn_provider is not None:
-                                audio_float = self.dfn_provider.enhance_frame(audio_float)
-                            # Back to int16 bytes
-                            data = (np.clip(audio_float, -1.0, 1.0) * 32767).astype(np.int16).tobytes()
-
-                            # Feed recognizer only during speech windows
-                            if self.recognizer.AcceptWaveform(data):
-                                result = json.loads(self.recognizer.Result())
-                                text = result.get("text", "")
-                                if text:
-                                    full_transcript += f" {text}"
-                                    logger.debug(f"STT partial result: {text}")
-                            else:
-                                # Partial accepted; we do not accumulate partials here
-                                partial = self.recognizer.PartialResult()
-                                if partial:
-                                    logger.debug(f"STT partial: {partial}")
-                        else:
-                            # Non-speech frame
-                            silence_ms += frame_ms
-                            speech_ms = 0
-                            if in_speech and silence_ms >= self.vad_release_ms:
-                                # End-of-utterance detected
-                                break
-                        
-                        # Check for overall timeout (5 seconds since last speech)
-                        if time.time() - start_time > 5.0:
-                            logger.debug("STT timeout after 5 seconds")
-                            break
-                            
-                    except queue.Empty:
-                        # Timeout waiting for audio; increment timeout counter
-                        last_audio_time += 100
-                        if last_audio_time >= timeout_threshold:
-                            logger.debug(f"STT timeout after {timeout_threshold}ms of silence")
-                            break
-                
-                final_result = json.loads(self.recognizer.FinalResult())
-                final_text = final_result.get('text', '')
-                full_transcript += f" {final_text}"
-                
-                logger.debug(f"STT final result: '{full_transcript.strip()}'")
-                logger.debug(f"STT speech detection - in_speech: {in_speech}, speech_ms: {speech_ms}, silence_ms: {silence_ms}")
-
-                if not future.done():
-                    self.loop.call_soon_threadsafe(future.set_result, full_transcript.strip())
-        except Exception as e:
+            with self._session_lock:
+                if self.recognizer is None or self._recognizer_key != self.model_key:
+                    key = self.model_key
+                    self.recognizer = KaldiRecognizer(self._ensure_model(), self.sample_rate)
+                    self._recognizer_key = key
+                self._run_session(emit, stop)
+        except Exception:
             logger.exception("Error in STT transcription loop.")
-            if not future.done():
-                self.loop.call_soon_threadsafe(future.set_exception, e)
+            raise
+        finally:
+            emit(None)
+
+    def _run_session(self, emit: Callable[[Optional[TranscriptEvent]], None], stop: threading.Event):
+        self.vad_buffer.clear()
+        self.endpointer.start()
+        if self.vad_provider is not None and hasattr(self.vad_provider, "reset"):
+            self.vad_provider.reset()
+        # The shared capture hub keeps the microphone open, so listening starts immediately
+        self.capture.start()
+        subscription = self._subscribe_transcriber()
+        with closing(subscription):
+            self._held_audio.clear()
+            self._decode_pending.clear()
+            self._last_partial = ""
+            decision = CONTINUE
+            stalled_ms = 0
+            frame_ms = 1000.0 * self.vad_blocksize / self.sample_rate
+
+            while not stop.is_set():
+                pcm = subscription.read(self.blocksize, timeout=0.1)
+                if pcm is None:
+                    # No audio from the device at all; don't wait forever on a stalled stream
+                    stalled_ms += 100
+                    if stalled_ms >= self.endpointer.no_speech_timeout_ms:
+                        logger.warning("No audio from the capture device for %s ms; stopping.", stalled_ms)
+                        break
+                    continue
+                stalled_ms = 0
+
+                # Float32 mono [-1, 1] for the speech gate and DFN, without allocating
+                audio_float = self._to_float32(pcm)
+                frame_flags = self._speech_flags(audio_float)
+
+                # Feed the recognizer from the first speech frame on, including trailing
+                # silence so Vosk can commit the last segment itself.
+                has_speech = bool(frame_flags.any())
+                if self.endpointer.in_speech or has_speech:
+                    if self._held_audio.available:
+                        # Speech onset: decode the audio held back just before it first
+                        held = self._held_audio.read(self._held_audio.available)
+                        self._feed(held, False, emit)
+                    self._feed(pcm, has_speech, emit, audio_float)
+                else:
+                    self._held_audio.write(pcm)
+
+                for i, is_speech in enumerate(frame_flags):
+                    decision = self.endpointer.update(frame_ms, bool(is_speech))
+                    if decision != CONTINUE:
+                        # Audio captured after the deciding frame: how late the step size made us
+                        lag = ((len(frame_flags) - 1 - i) * self.vad_blocksize
+                               + self.vad_buffer.available + subscription.available)
+                        self.last_endpoint_lag_ms = 1000.0 * lag / self.sample_rate
+                        break
+                if decision != CONTINUE:
+                    break
+
+            if self.enhancer is not None:
+                for chunk in self.enhancer.flush(timeout=self.enhancer.max_lag_ms / 1000.0):
+                    self._queue_decode(self._to_int16(chunk), emit)
+            if self._decode_pending.available:
+                self._decode(self._decode_pending.read(self._decode_pending.available), emit)
+            final_result = json.loads(self.recognizer.FinalResult())
+            final_text = final_result.get('text', '')
+            if final_text:
+                emit(TranscriptEvent("final", final_text))
+
+            logger.debug(f"STT final result: '{final_text}'")
+            logger.debug("STT endpointing: %s", self.endpointer.metrics())
+            if self.enhancer is not None:
+                logger.debug("STT enhancement: %s", self.enhancer.metrics())
+
+    def _subscribe_transcriber(self):
+        """Start right after a fresh wake word, otherwise `preroll_samples` back from now."""
+        mark, self._wake_mark = self._wake_mark, None
+        if mark is not None and time.monotonic() - mark[1] <= self.wake_handoff_s:
+            logger.debug("Transcription starts at the wake-word handoff (%s samples back).",
+                         self.capture.ring.write_total - mark[0])
+            return self.capture.subscribe("transcriber", start=mark[0])
+        return self.capture.subscribe("transcriber", preroll_samples=self.preroll_samples)
+
+    def _feed(self, pcm: np.ndarray, is_speech: bool, emit: Callable[[Optional[TranscriptEvent]], None],
+              audio_float: Optional[np.ndarray] = None) -> None:
+        """Send int16 audio to the recognizer, through the enhancement stage when it is enabled.
+
+        Without enhancement the captured samples reach Vosk unconverted; `audio_float` is the
+        block's float32 copy, if one was already made for the speech gate.
+        """
+        if self.enhancer is not None:
+            if audio_float is None:
+                audio_float = np.multiply(pcm, 1.0 / 32768.0, dtype=np.float32)
+            # Enhancement runs on its own worker; decode whatever it has finished
+            self.enhancer.submit(audio_float, is_speech)
+            for chunk in self.enhancer.drain():
+                self._queue_decode(self._to_int16(chunk), emit)
+        else:
+            self._queue_decode(pcm, emit)
+
+    def _queue_decode(self, pcm: np.ndarray, emit: Callable[[Optional[TranscriptEvent]], None]) -> None:
+        """Feed Vosk on its own cadence: small blocks wait until `decode_blocksize` samples are pending."""
+        pending = self._decode_pending
+        if pcm.shape[0] >= self.decode_blocksize:
+            # Already a full decode step (the balanced profile): no buffering, no copy
+            if pending.available:
+                self._decode(pending.read(pending.available), emit)
+            self._decode(pcm, emit)
+            return
+        pending.write(pcm)
+        if pending.available >= self.decode_blocksize:
+            self._decode(pending.read(pending.available), emit)
+
+    def _decode(self, pcm: np.ndarray, emit: Callable[[Optional[TranscriptEvent]], None]) -> None:
+        """Feed one int16 chunk to Vosk and emit a final segment or a changed partial."""
+        # Vosk takes the byte length from len(), so hand it bytes
+        if self.recognizer.AcceptWaveform(pcm.tobytes()):
+            self.endpointer.note_final()
+            result = json.loads(self.recognizer.Result())
+            text = result.get("text", "")
+            self._last_partial = ""
+            if text:
+                emit(TranscriptEvent("final", text))
+                logger.debug(f"STT segment result: {text}")
+        else:
+            partial = json.loads(self.recognizer.PartialResult()).get("partial", "")
+            if partial and partial != self._last_partial:
+                self._last_partial = partial
+                emit(TranscriptEvent("partial", partial))
+                logger.debug(f"STT partial: {partial}")
+
+    def _speech_flags(self, audio_float: np.ndarray) -> np.ndarray:
+        """Per-frame speech flags for every complete 512-sample frame buffered so far.
+
+        Uses Silero VAD when enabled, otherwise the energy gate; a partial tail frame
+        stays in the ring for the next block.
+        """
+        self.vad_buffer.write(audio_float)
+        n_frames = self.vad_buffer.available // self.vad_blocksize
+        if n_frames == 0:
+            return np.zeros(0, dtype=bool)
+        frames = self.vad_buffer.read(n_frames * self.vad_blocksize).reshape(n_frames, self.vad_blocksize)
+        if self.use_vad and self.vad_provider is not None:
+            try:
+                return np.asarray(self.vad_provider.process_frames(frames), dtype=bool)
+            except Exception as e:
+                logger.error("Silero VAD runtime error; disabling VAD. Reason: %s", e)
+                self.use_vad = False
+                self.vad_provider = None
+        return frame_energy_flags(frames, self.endpoint_energy_dbfs)
 
     def shutdown(self):
         """Signals the transcription loop to stop and closes the audio stream."""
         logger.info("Shutting down STTManager.")
-        self._stop_event.set()
+        for stop in list(self._session_stops):
+            stop.set()
         self.stop_wake_listener()
-        if self.stream and not self.stream.closed:
-            # This is a blocking call, but it's necessary to ensure the stream is closed.
-            # Since we're shutting down, a small block is acceptable.
-            self.stream.stop()
-            self.stream.close()
+        if self.enhancer is not None:
+            self.enhancer.close()
+        # This is a blocking call, but it's necessary to ensure the device is released.
+        # Since we're shutting down, a small block is acceptable.
+        self.capture.stop()
         logger.info("STTManager shutdown complete.")
 
     # --- Passive wake-word listener -------------------------------------------------
@@ -368,62 +744,127 @@ class STTManager:
 
     def _wake_loop(self):
         """Blocking loop running in a worker thread for wake-word spotting."""
-        logger.info("Starting passive wake-word listener.")
-        # Separate recognizer to avoid interfering with active session
-        recognizer = KaldiRecognizer(self.model, self.sample_rate)
+        logger.info("Starting passive wake-word listener (mode=%s).", self.wake_mode)
         try:
-            with sd.RawInputStream(samplerate=self.sample_rate, blocksize=4000, dtype='int16',
-                                   channels=1) as stream:
-                while self._wake_listener_running:
-                    try:
-                        data, _ = stream.read(4000)
-                        if not data:
-                            continue
-                        # Convert numpy array to bytes for Vosk
-                        if hasattr(data, 'tobytes'):
-                            data_bytes = data.tobytes()
-                        else:
-                            data_bytes = bytes(data)
-                        if recognizer.AcceptWaveform(data_bytes):
-                            try:
-                                result = json.loads(recognizer.Result())
-                            except Exception:
-                                result = {"text": ""}
-                            text = (result.get("text") or "").strip().lower()
-                            if text:
-                                logger.debug("Wake listener heard: %s", text)
-                                if self._contains_wake_word(text):
-                                    logger.info("Wake word detected: '%s'", text)
-                                    if self._wake_callback:
-                                        self.loop.call_soon_threadsafe(self._wake_callback)
-                                    # Avoid immediate retriggering
-                                    import time
-                                    time.sleep(0.6)
-                        else:
-                            # Look at partials for faster wake-up
-                            partial_json = recognizer.PartialResult()
-                            if partial_json:
-                                try:
-                                    pj = json.loads(partial_json)
-                                    partial_text = (pj.get("partial") or "").lower()
-                                except Exception:
-                                    partial_text = ""
-                                if partial_text and self._contains_wake_word(partial_text):
-                                    logger.info("Wake word detected (partial): '%s'", partial_text)
-                                    if self._wake_callback:
-                                        self.loop.call_soon_threadsafe(self._wake_callback)
-                                    import time
-                                    time.sleep(0.6)
-                    except Exception:
-                        # Keep listener resilient
-                        logger.exception("Error in wake listener loop; continuing.")
-                        import time
-                        time.sleep(0.2)
+            self.capture.start()
+            subscription = self.capture.subscribe("wake")
+            with closing(subscription):
+                if self.wake_mode == "full":
+                    self._spot_full(subscription)
+                else:
+                    self._spot_passive(subscription)
         except Exception:
-            logger.exception("Failed to start wake listener stream.")
+            logger.exception("Failed to start wake listener capture.")
         finally:
             logger.info("Passive wake-word listener stopped.")
 
+    def _fire_wake(self, text: str, subscription) -> None:
+        logger.info("Wake word detected: '%s'", text)
+        # The command usually follows without a pause; the next session starts from here
+        self._wake_mark = (subscription.cursor, time.monotonic())
+        if self._wake_callback:
+            self.loop.call_soon_threadsafe(self._wake_callback)
+        # Avoid immediate retriggering
+        time.sleep(0.6)
+        subscription.skip_to_now()
+
+    def _spot_full(self, subscription):
+        """Open-vocabulary spotting on every block (highest recall, about one core while idle)."""
+        # Separate recognizer to avoid interfering with active session
+        recognizer = KaldiRecognizer(self._ensure_model(), self.sample_rate)
+        while self._wake_listener_running:
+            try:
+                pcm = subscription.read(4000, timeout=0.5)
+                if pcm is None:
+                    continue
+                # Vosk takes the byte length from len(), so hand it bytes
+                if recognizer.AcceptWaveform(pcm.tobytes()):
+                    try:
+                        result = json.loads(recognizer.Result())
+                    except Exception:
+                        result = {"text": ""}
+                    text = (result.get("text") or "").strip().lower()
+                    if text:
+                        logger.debug("Wake listener heard: %s", text)
+                        if self._contains_wake_word(text):
+                            self._fire_wake(text, subscription)
+                else:
+                    # Look at partials for faster wake-up
+                    partial_json = recognizer.PartialResult()
+                    if partial_json:
+                        try:
+                            pj = json.loads(partial_json)
+                            partial_text = (pj.get("partial") or "").lower()
+                        except Exception:
+                            partial_text = ""
+                        if partial_text and self._contains_wake_word(partial_text):
+                            self._fire_wake(partial_text, subscription)
+            except Exception:
+                # Keep listener resilient
+                logger.exception("Error in wake listener loop; continuing.")
+                time.sleep(0.2)
+
+    def _spot_passive(self, subscription):
+        """Low-CPU spotting: energy gate -> wake-word grammar -> full-vocabulary confirmation.
+
+        Silent blocks cost one RMS computation. Audio above the gate goes to a recognizer
+        restricted to the wake words plus "[unk]", and only its hits are re-decoded with
+        the full vocabulary over the last `wake_confirm_window_s` seconds of audio.
+        """
+        grammar = json.dumps(sorted(set(self.wake_words)) + ["[unk]"])
+        model = self._ensure_model()
+        spotter = KaldiRecognizer(model, self.sample_rate, grammar)
+        verifier = KaldiRecognizer(model, self.sample_rate) if self.wake_confirm else None
+        gate = _EnergyGate(self.sample_rate, self.wake_energy_threshold_dbfs, self.wake_hangover_ms)
+        block = int(self.sample_rate * 0.1)
+        while self._wake_listener_running:
+            try:
+                pcm = subscription.read(block, timeout=0.5)
+                if pcm is None:
+                    continue
+                was_open = gate.is_open
+                if not gate.update(pcm):
+                    if was_open:
+                        # Gate just closed: flush the grammar decoder for a last candidate
+                        self._check_wake_candidate(spotter.FinalResult(), "text", verifier, subscription)
+                        spotter.Reset()
+                    continue
+                # On opening, include the preceding block so the word onset is not clipped
+                audio = self.capture.latest(2 * block) if not was_open else pcm
+                if spotter.AcceptWaveform(audio.tobytes()):
+                    fired = self._check_wake_candidate(spotter.Result(), "text", verifier, subscription)
+                else:
+                    fired = self._check_wake_candidate(spotter.PartialResult(), "partial", verifier, subscription)
+                if fired is not None:
+                    # Start the grammar decoder afresh after any candidate, confirmed or not
+                    spotter.Reset()
+                if fired:
+                    gate.reset()
+            except Exception:
+                # Keep listener resilient
+                logger.exception("Error in wake listener loop; continuing.")
+                time.sleep(0.2)
+
+    def _check_wake_candidate(self, result_json: str, key: str, verifier, subscription) -> Optional[bool]:
+        """None if the result holds no wake word, else whether the wake was confirmed and fired."""
+        try:
+            text = (json.loads(result_json).get(key) or "").strip().lower()
+        except Exception:
+            return None
+        if not text or not self._contains_wake_word(text):
+            return None
+        if verifier is not None:
+            # Second stage: decode the recent audio with the full vocabulary
+            verifier.Reset()
+            recent = self.capture.latest(int(self.sample_rate * self.wake_confirm_window_s))
+            verifier.AcceptWaveform(recent.tobytes())
+            heard = (json.loads(verifier.FinalResult()).get("text") or "").lower()
+            if not self._contains_wake_word(heard):
+                logger.debug("Wake candidate '%s' rejected by full decode: '%s'", text, heard)
+                return False
+        self._fire_wake(text, subscription)
+        return True
+
     def _contains_wake_word(self, text: str) -> bool:
         lowered = (text or "").lower()
         for w in self.wake_words:
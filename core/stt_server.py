@@ -0,0 +1,352 @@
+"""
+STTSessionEngine — Session-based speech recognition for many concurrent audio streams.
+
+- One Vosk Model is loaded once (core.vosk_models) and shared; a RecognizerPool hands each
+  session its own KaldiRecognizer and takes it back (Reset) when the session closes.
+- Every session keeps its own VAD/energy-gate framing and AdaptiveEndpointer, so streams
+  are segmented independently; partials and finals go to the session's callback.
+- Clients push int16 audio from any thread; a fixed set of worker threads decodes it.
+  Sessions are served in the order their audio became pending, and a session is never on
+  two workers at once, so its audio stays in order and a busy stream cannot starve others.
+- Per-session metrics: processing latency (push -> decoded, p50/p95), real-time factor,
+  backlog and endpoint statistics.
+
+The engine is transport-agnostic: a room microphone, a socket or a websocket handler
+only needs to call open_session(), push() and close_session().
+"""
+
+from __future__ import annotations
+import itertools
+import json
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+from vosk import KaldiRecognizer
+
+from core import vosk_models
+from core.audio_buffer import AudioRingBuffer
+from core.config import settings
+from core.endpointing import CONTINUE, NO_SPEECH, AdaptiveEndpointer, frame_energy_flags
+from core.stt_manager import TranscriptEvent, build_vad_provider, stt_profile_config
+
+
+logger = logging.getLogger("nia.core.stt_server")
+
+EventCallback = Callable[[str, TranscriptEvent], None]
+
+
+class RecognizerPool:
+    """KaldiRecognizers over one shared Model, created on demand up to `max_size`."""
+
+    def __init__(self, model: Any, sample_rate: int = 16000, max_size: int = 8) -> None:
+        self.model = model
+        self.sample_rate = sample_rate
+        self.max_size = max_size
+        self._idle: List[Any] = []
+        self._created = 0
+        self._cond = threading.Condition()
+
+    @property
+    def in_use(self) -> int:
+        with self._cond:
+            return self._created - len(self._idle)
+
+    def acquire(self, timeout: Optional[float] = None) -> Any:
+        """Take an idle recognizer (or create one); raises RuntimeError if none frees up in time."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._idle or self._created < self.max_size, timeout):
+                raise RuntimeError(f"All {self.max_size} recognizers are in use")
+            if self._idle:
+                return self._idle.pop()
+            self._created += 1
+        try:
+            return KaldiRecognizer(self.model, self.sample_rate)
+        except Exception:
+            with self._cond:
+                self._created -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, recognizer: Any) -> None:
+        """Reset a recognizer and make it available to the next session."""
+        try:
+            recognizer.Reset()
+        except Exception:
+            logger.exception("Failed to reset a recognizer; discarding it.")
+            with self._cond:
+                self._created -= 1
+                self._cond.notify()
+            return
+        with self._cond:
+            self._idle.append(recognizer)
+            self._cond.notify()
+
+
+class STTSession:
+    """One client stream: its recognizer, speech framing, endpointer and metrics."""
+
+    def __init__(self, session_id: str, recognizer: Any, on_event: EventCallback,
+                 endpointer: AdaptiveEndpointer, vad_provider: Optional[Any], sample_rate: int) -> None:
+        self.session_id = session_id
+        self.recognizer = recognizer
+        self.on_event = on_event
+        self.endpointer = endpointer
+        self.vad_provider = vad_provider
+        self.frames = AudioRingBuffer(sample_rate, dtype=np.float32)
+        self.opened = time.monotonic()
+        self.closed = False
+        self._f32 = np.zeros(0, dtype=np.float32)
+        self._pending: deque = deque()  # (int16 samples, push time)
+        self._scheduled = False  # queued for, or running on, a worker
+        self._release_when_idle = False  # closed while a worker held the recognizer; it releases it
+        self._last_partial = ""
+
+        # Metrics
+        self.latencies_ms: deque = deque(maxlen=1024)
+        self.audio_samples = 0
+        self.cpu_s = 0.0
+        self.max_backlog = 0
+        self.utterances = 0
+
+    def to_float32(self, pcm: np.ndarray) -> np.ndarray:
+        if pcm.shape[0] > self._f32.shape[0]:
+            self._f32 = np.zeros(pcm.shape[0], dtype=np.float32)
+        out = self._f32[:pcm.shape[0]]
+        np.multiply(pcm, 1.0 / 32768.0, out=out, casting="unsafe")
+        return out
+
+    def emit(self, kind: str, text: str) -> None:
+        try:
+            self.on_event(self.session_id, TranscriptEvent(kind, text))
+        except Exception:
+            logger.exception("STT session '%s' event callback failed.", self.session_id)
+
+    def metrics(self, sample_rate: int) -> Dict[str, Any]:
+        latencies = list(self.latencies_ms)
+        audio_s = self.audio_samples / sample_rate
+        return {
+            "audio_s": round(audio_s, 3),
+            "cpu_s": round(self.cpu_s, 4),
+            "rtf": round(self.cpu_s / audio_s, 4) if audio_s else None,
+            "latency_p50_ms": float(np.percentile(latencies, 50)) if latencies else None,
+            "latency_p95_ms": float(np.percentile(latencies, 95)) if latencies else None,
+            "backlog": len(self._pending),
+            "max_backlog": self.max_backlog,
+            "utterances": self.utterances,
+            **{f"endpoint_{k}": v for k, v in self.endpointer.metrics().items()},
+        }
+
+
+class STTSessionEngine:
+    def __init__(
+        self,
+        model_path: Optional[str] = None,
+        workers: Optional[int] = None,
+        max_sessions: Optional[int] = None,
+        use_vad: Optional[bool] = None,
+        profile: Optional[str] = None,
+    ) -> None:
+        server_cfg = settings.get("stt_server", {}) or {}
+        self.stt_cfg = stt_profile_config(settings.get("stt", {}), profile)
+        self.sample_rate = 16000
+        self.frame_size = 512  # Silero VAD frame at 16 kHz
+        self.max_batch = int(server_cfg.get("max_batch_blocks", 4))
+        self.energy_dbfs = float((self.stt_cfg.get("endpointing", {}) or {}).get("energy_threshold_dbfs", -45.0))
+        if use_vad is None:
+            use_vad = bool(server_cfg.get("vad", self.stt_cfg.get("vad", False)))
+        self.use_vad = bool(use_vad)
+
+        self.model = vosk_models.get_model(model_path or self.stt_cfg["vosk_model_path"])
+        self.pool = RecognizerPool(self.model, self.sample_rate,
+                                   max_size=int(max_sessions or server_cfg.get("max_sessions", 8)))
+
+        self._cond = threading.Condition()
+        self._ready: deque = deque()  # sessions with pending audio, oldest first
+        self._sessions: Dict[str, STTSession] = {}
+        self._ids = itertools.count(1)
+        self._running = True
+        n_workers = int(workers or server_cfg.get("workers", 2))
+        self._workers = [
+            threading.Thread(target=self._worker, name=f"nia-stt-{i}", daemon=True) for i in range(n_workers)
+        ]
+        for thread in self._workers:
+            thread.start()
+        logger.info("STT session engine started (workers=%s, max_sessions=%s, vad=%s).",
+                    n_workers, self.pool.max_size, self.use_vad)
+
+    # --- Client API --------------------------------------------------------------
+    def open_session(self, on_event: EventCallback, session_id: Optional[str] = None,
+                     timeout: Optional[float] = 0) -> STTSession:
+        """Start a stream; raises RuntimeError when every recognizer is taken (after `timeout`)."""
+        recognizer = self.pool.acquire(timeout)
+        vad = None
+        if self.use_vad:
+            # Falls back for this session only; the next one tries VAD again
+            try:
+                vad = build_vad_provider(self.stt_cfg, self.sample_rate)
+            except Exception:
+                logger.exception("Building the VAD for an STT session failed.")
+            if vad is None:
+                logger.warning("VAD unavailable for this STT session; using the energy gate.")
+        session = STTSession(
+            session_id or f"session-{next(self._ids)}",
+            recognizer,
+            on_event,
+            AdaptiveEndpointer.from_config(self.stt_cfg),
+            vad,
+            self.sample_rate,
+        )
+        with self._cond:
+            if session.session_id in self._sessions:
+                self.pool.release(recognizer)
+                raise ValueError(f"STT session '{session.session_id}' already exists")
+            self._sessions[session.session_id] = session
+        logger.info("STT session '%s' opened.", session.session_id)
+        return session
+
+    def push(self, session: STTSession, audio: Any) -> None:
+        """Queue int16 PCM (bytes or array) for a session. Never blocks on decoding."""
+        pcm = np.frombuffer(audio, dtype=np.int16) if isinstance(audio, (bytes, bytearray, memoryview)) else \
+            np.array(audio, dtype=np.int16, copy=True)
+        with self._cond:
+            if session.closed:
+                raise RuntimeError(f"STT session '{session.session_id}' is closed")
+            session._pending.append((pcm, time.perf_counter()))
+            session.max_backlog = max(session.max_backlog, len(session._pending))
+            if not session._scheduled:
+                session._scheduled = True
+                self._ready.append(session)
+                self._cond.notify()
+
+    def close_session(self, session: STTSession, timeout: Optional[float] = 5.0) -> Dict[str, Any]:
+        """Decode what is still queued, emit the final result and return the session's metrics."""
+        with self._cond:
+            if session.closed:
+                return session.metrics(self.sample_rate)
+            session.closed = True
+            idle = self._cond.wait_for(lambda: not session._scheduled, timeout)
+            if not idle:
+                logger.warning("STT session '%s' closed with %s blocks undecoded; no final result.",
+                               session.session_id, len(session._pending))
+            session._pending.clear()
+            self._sessions.pop(session.session_id, None)
+            # A worker may still be decoding on the recognizer: it returns it to the pool when done
+            session._release_when_idle = not idle
+        if idle:
+            self._finish_utterance(session)
+            self.pool.release(session.recognizer)
+        metrics = session.metrics(self.sample_rate)
+        logger.info("STT session '%s' closed: %s", session.session_id, metrics)
+        return metrics
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._cond:
+            sessions = list(self._sessions.values())
+            ready = len(self._ready)
+        return {
+            "sessions": {s.session_id: s.metrics(self.sample_rate) for s in sessions},
+            "recognizers_in_use": self.pool.in_use,
+            "ready_queue": ready,
+        }
+
+    def shutdown(self) -> None:
+        with self._cond:
+            sessions = list(self._sessions.values())
+        for session in sessions:
+            self.close_session(session, timeout=1.0)
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        for thread in self._workers:
+            thread.join(timeout=1)
+
+    # --- Workers -----------------------------------------------------------------
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: not self._running or self._ready)
+                if not self._running:
+                    return
+                session = self._ready.popleft()
+            self._serve(session)
+
+    def _serve(self, session: STTSession) -> None:
+        """Decode up to `max_batch` blocks, then requeue the session behind the others."""
+        for _ in range(self.max_batch):
+            with self._cond:
+                if not session._pending:
+                    break
+                pcm, pushed = session._pending.popleft()
+            try:
+                self._process(session, pcm)
+            except Exception:
+                logger.exception("STT session '%s' failed to process audio.", session.session_id)
+            session.latencies_ms.append((time.perf_counter() - pushed) * 1000)
+        release = False
+        with self._cond:
+            if session._pending:
+                self._ready.append(session)
+                self._cond.notify()
+            else:
+                session._scheduled = False
+                release = session._release_when_idle
+                self._cond.notify_all()
+        if release:
+            self.pool.release(session.recognizer)
+
+    def _process(self, session: STTSession, pcm: np.ndarray) -> None:
+        t0 = time.thread_time()
+        flags = self._speech_flags(session, session.to_float32(pcm))
+        if session.endpointer.in_speech or flags.any():
+            self._decode(session, pcm)
+        frame_ms = 1000.0 * self.frame_size / self.sample_rate
+        for is_speech in flags:
+            decision = session.endpointer.update(frame_ms, bool(is_speech))
+            if decision != CONTINUE:
+                if decision != NO_SPEECH:
+                    self._finish_utterance(session)
+                # The stream keeps going: the next frames start a new utterance
+                session.endpointer.start()
+        session.audio_samples += pcm.shape[0]
+        session.cpu_s += time.thread_time() - t0
+
+    def _speech_flags(self, session: STTSession, audio_float: np.ndarray) -> np.ndarray:
+        frames_buf = session.frames
+        frames_buf.write(audio_float)
+        n_frames = frames_buf.available // self.frame_size
+        if n_frames == 0:
+            return np.zeros(0, dtype=bool)
+        frames = frames_buf.read(n_frames * self.frame_size).reshape(n_frames, self.frame_size)
+        if session.vad_provider is not None:
+            try:
+                return np.asarray(session.vad_provider.process_frames(frames), dtype=bool)
+            except Exception as e:
+                logger.error("Silero VAD failed for session '%s'; using the energy gate. Reason: %s",
+                             session.session_id, e)
+                session.vad_provider = None
+        return frame_energy_flags(frames, self.energy_dbfs)
+
+    def _decode(self, session: STTSession, pcm: np.ndarray) -> None:
+        recognizer = session.recognizer
+        if recognizer.AcceptWaveform(pcm.tobytes()):
+            session.endpointer.note_final()
+            text = json.loads(recognizer.Result()).get("text", "")
+            session._last_partial = ""
+            if text:
+                session.emit("final", text)
+        else:
+            partial = json.loads(recognizer.PartialResult()).get("partial", "")
+            if partial and partial != session._last_partial:
+                session._last_partial = partial
+                session.emit("partial", partial)
+
+    def _finish_utterance(self, session: STTSession) -> None:
+        text = json.loads(session.recognizer.FinalResult()).get("text", "")
+        session._last_partial = ""
+        if text:
+            session.utterances += 1
+            session.emit("final", text)
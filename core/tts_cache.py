@@ -0,0 +1,329 @@
+"""
+Synthesized-audio cache for phrases NIA says again and again.
+
+Confirmation prompts, the error apology and the autonomy fallback templates are fixed
+text, yet Coqui would re-render each one every time. TTSAudioCache keeps the rendered
+waveforms:
+
+- keyed on sha1(engine, voice, rate, normalized text), so changing the TTS model or
+  speech rate never replays stale audio;
+- in an in-RAM LRU bounded by bytes, in front of an on-disk store of one compressed .npz
+  per phrase, also LRU-evicted under a byte budget, so the cache survives restarts;
+- only phrases worth keeping reach the disk: those passed to prewarm() and those
+  requested at least `persist_after` times. One-off LLM sentences stay in RAM only;
+- disk writes happen on a background writer thread, so the synthesis path never waits
+  on compression or the filesystem, and misses are answered from an in-memory index
+  of the store rather than a stat() per phrase;
+- prewarm() renders (or loads from disk) a list of phrases in a background thread at
+  startup, so fixed phrases play with near-zero latency the first time they are needed.
+"""
+
+from __future__ import annotations
+import hashlib
+import logging
+import os
+import queue
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+
+logger = logging.getLogger("nia.core.tts_cache")
+
+Rendered = Tuple[np.ndarray, int]
+
+_MAX_TRACKED_PHRASES = 4096  # request counts kept for the persist_after rule
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace and case so trivially different spellings share one entry."""
+    return re.sub(r"\s+", " ", text).strip().casefold()
+
+
+class TTSAudioCache:
+    """Rendered phrases by (engine, voice, rate, text): RAM LRU in front of an on-disk store."""
+
+    def __init__(
+        self,
+        cache_dir: Optional[str],
+        engine: str,
+        voice: Optional[str] = None,
+        rate: Any = None,
+        ram_budget_mb: float = 64,
+        disk_budget_mb: float = 256,
+        persist_after: int = 2,
+    ) -> None:
+        self.cache_dir = cache_dir
+        self.engine = engine
+        self.voice = voice or ""
+        self.rate = "" if rate is None else str(rate)
+        self.budget_bytes = int(float(ram_budget_mb) * 1024 * 1024)
+        self.disk_budget_bytes = int(float(disk_budget_mb) * 1024 * 1024)
+        self.persist_after = max(1, int(persist_after))
+        self._lock = threading.Lock()
+        self._ram: "OrderedDict[str, Rendered]" = OrderedDict()  # least recently used first
+        self._ram_bytes = 0
+        self._disk: "OrderedDict[str, int]" = OrderedDict()  # key -> file size, least recently used first
+        self._disk_bytes = 0
+        self._requests: "OrderedDict[str, int]" = OrderedDict()
+        self._writes: "queue.Queue[Optional[Tuple[str, Rendered]]]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._prewarm_thread: Optional[threading.Thread] = None
+        self.hits_ram = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self.disk_evictions = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            self._scan_disk()
+
+    @classmethod
+    def from_config(cls, voice_cfg: Dict[str, Any], engine: str, voice: Optional[str] = None) -> Optional["TTSAudioCache"]:
+        """Build the cache from the `voice.tts_cache` section; None when it is disabled."""
+        cfg = voice_cfg.get("tts_cache") or {}
+        if not cfg.get("enabled", True):
+            return None
+        return cls(
+            cfg.get("dir", "data/tts_cache"),
+            engine=engine,
+            voice=voice if voice is not None else voice_cfg.get("tts_voice_id"),
+            rate=voice_cfg.get("tts_rate"),
+            ram_budget_mb=float(cfg.get("ram_mb", 64)),
+            disk_budget_mb=float(cfg.get("disk_mb", 256)),
+            persist_after=int(cfg.get("persist_after", 2)),
+        )
+
+    def key(self, text: str) -> str:
+        material = "\x1f".join((self.engine, self.voice, self.rate, normalize_text(text)))
+        return hashlib.sha1(material.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Optional[str]:
+        return os.path.join(self.cache_dir, key[:2], key + ".npz") if self.cache_dir else None
+
+    # --- Access ------------------------------------------------------------------
+    def get(self, text: str) -> Optional[Rendered]:
+        """Cached (audio, sample_rate) for `text`, from RAM or disk; None on a miss."""
+        key = self.key(text)
+        with self._lock:
+            hit = self._ram.get(key)
+            if hit is not None:
+                self._ram.move_to_end(key)
+                self.hits_ram += 1
+                return hit
+            on_disk = key in self._disk
+            if not on_disk:
+                self.misses += 1
+                return None
+        rendered = self._load(key)
+        with self._lock:
+            if rendered is None:
+                self._forget_disk(key)
+                self.misses += 1
+                return None
+            if key in self._disk:
+                self._disk.move_to_end(key)
+            self.hits_disk += 1
+            self._remember(key, rendered)
+        return rendered
+
+    def put(self, text: str, audio: np.ndarray, sample_rate: int, persist: bool = False) -> Rendered:
+        """Keep rendered audio in RAM; with `persist`, also queue it for the disk store."""
+        key = self.key(text)
+        rendered = (np.ascontiguousarray(audio, dtype=np.float32).reshape(-1), int(sample_rate))
+        with self._lock:
+            self._remember(key, rendered)
+            persist = persist and self.cache_dir is not None and key not in self._disk
+        if persist:
+            self._enqueue_write(key, rendered)
+        return rendered
+
+    def get_or_synthesize(self, text: str, synthesize: Callable[[str], Optional[Rendered]],
+                          persist: bool = False) -> Optional[Rendered]:
+        """Cached audio for `text`, rendering it on a miss.
+
+        Rendered audio is persisted when `persist` is set or the phrase has now been
+        requested `persist_after` times.
+        """
+        requests = self._count_request(text)
+        rendered = self.get(text)
+        if rendered is None:
+            rendered = synthesize(text)
+            if rendered is not None:
+                rendered = self.put(text, *rendered, persist=persist or requests >= self.persist_after)
+        elif requests == self.persist_after:
+            # First repeat of a phrase that was only in RAM
+            self.put(text, *rendered, persist=True)
+        return rendered
+
+    def prewarm(self, phrases: Iterable[str], synthesize: Callable[[str], Optional[Rendered]]) -> threading.Thread:
+        """Render or load `phrases` into RAM (and the disk store) in a background thread."""
+        phrases = list(dict.fromkeys(p for p in phrases if p and p.strip()))
+
+        def run() -> None:
+            rendered = 0
+            for phrase in phrases:
+                try:
+                    if self.get_or_synthesize(phrase, synthesize, persist=True) is None:
+                        logger.info("TTS prewarm stopped: the engine cannot render audio.")
+                        return
+                    rendered += 1
+                except Exception:
+                    logger.exception("TTS prewarm failed for '%s'.", phrase[:40])
+            logger.info("TTS cache prewarmed %d phrase(s).", rendered)
+
+        self._prewarm_thread = threading.Thread(target=run, name="nia-tts-prewarm", daemon=True)
+        self._prewarm_thread.start()
+        return self._prewarm_thread
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        """Wait until queued disk writes have finished."""
+        if self._writer is None:
+            return
+        done = threading.Event()
+        self._writes.put(("", done))  # marker: the writer sets it once everything before it is written
+        done.wait(timeout)
+
+    def close(self, timeout: float = 2.0) -> None:
+        """Finish queued disk writes and stop the writer thread."""
+        if self._writer is not None:
+            self._writes.put(None)
+            self._writer.join(timeout)
+            self._writer = None
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._ram),
+                "ram_bytes": self._ram_bytes,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_bytes,
+                "disk_evictions": self.disk_evictions,
+                "pending_writes": self._writes.qsize(),
+                "hits_ram": self.hits_ram,
+                "hits_disk": self.hits_disk,
+                "misses": self.misses,
+            }
+
+    # --- Internals ---------------------------------------------------------------
+    def _count_request(self, text: str) -> int:
+        key = self.key(text)
+        with self._lock:
+            count = self._requests.pop(key, 0) + 1
+            self._requests[key] = count
+            while len(self._requests) > _MAX_TRACKED_PHRASES:
+                self._requests.popitem(last=False)
+        return count
+
+    def _remember(self, key: str, rendered: Rendered) -> None:
+        """Insert as most recently used and evict from the LRU end past the budget (lock held)."""
+        old = self._ram.pop(key, None)
+        if old is not None:
+            self._ram_bytes -= old[0].nbytes
+        self._ram[key] = rendered
+        self._ram_bytes += rendered[0].nbytes
+        while self._ram_bytes > self.budget_bytes and len(self._ram) > 1:
+            _, evicted = self._ram.popitem(last=False)
+            self._ram_bytes -= evicted[0].nbytes
+
+    def _forget_disk(self, key: str) -> None:
+        """Drop a key from the disk index (lock held)."""
+        size = self._disk.pop(key, None)
+        if size is not None:
+            self._disk_bytes -= size
+
+    def _scan_disk(self) -> None:
+        """Index the existing store, least recently used (oldest mtime) first."""
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                if name.endswith(".tmp"):
+                    try:
+                        os.unlink(path)  # left behind by an interrupted write
+                    except OSError:
+                        pass
+                    continue
+                if not name.endswith(".npz"):
+                    continue
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, name[:-4], st.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+        self._evict_disk()
+
+    def _evict_disk(self) -> None:
+        """Delete least recently used files until the store fits its budget."""
+        while True:
+            with self._lock:
+                if self._disk_bytes <= self.disk_budget_bytes or not self._disk:
+                    return
+                key, size = self._disk.popitem(last=False)
+                self._disk_bytes -= size
+                self.disk_evictions += 1
+            try:
+                os.unlink(self._path(key))
+            except OSError:
+                pass
+
+    def _load(self, key: str) -> Optional[Rendered]:
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                rendered = data["audio"].astype(np.float32, copy=False), int(data["sample_rate"])
+            os.utime(path)  # keeps LRU order across restarts
+            return rendered
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning("Discarding unreadable TTS cache entry %s: %s", path, e)
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            return None
+
+    def _enqueue_write(self, key: str, rendered: Rendered) -> None:
+        if self._writer is None:
+            with self._lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._write_loop, name="nia-tts-cache-writer", daemon=True)
+                    self._writer.start()
+        self._writes.put((key, rendered))
+
+    def _write_loop(self) -> None:
+        while True:
+            item = self._writes.get()
+            if item is None:
+                return
+            key, rendered = item
+            if isinstance(rendered, threading.Event):  # flush() marker
+                rendered.set()
+                continue
+            size = self._store(key, rendered)
+            if size is None:
+                continue
+            with self._lock:
+                self._forget_disk(key)
+                self._disk[key] = size
+                self._disk_bytes += size
+            self._evict_disk()
+
+    def _store(self, key: str, rendered: Rendered) -> Optional[int]:
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                np.savez_compressed(f, audio=rendered[0], sample_rate=np.int64(rendered[1]))
+            os.replace(tmp, path)  # readers never see a half-written file
+            return os.path.getsize(path)
+        except OSError as e:
+            logger.warning("Could not write TTS cache entry %s: %s", path, e)
+            return None
@@ -2,12 +2,26 @@
 """
 TTS Engine with Coqui TTS (VITS/Glow-TTS) as primary and pyttsx3 as fallback.
 Provides seamless TTS functionality with automatic fallback to pyttsx3 on errors.
+
+Coqui audio stays in memory: synthesize() returns the waveform as a NumPy array and
+play_audio() writes it straight to an output stream, so no phrase touches the disk and
+other consumers (caching, network streaming) can reuse the buffer.
+
+Synthesis and playback take separate locks, so one phrase can render while the previous
+one plays (see TTSManager); _tts_lock only guards engine setup and shutdown.
+
+Playback is interruptible: play_audio() feeds the output stream in small blocks and
+polls a should_stop callback between them, aborting the stream (which drops whatever
+the device still has buffered) as soon as it returns True. pyttsx3 plays inside
+runAndWait(), so it is interrupted from another thread with stop_pyttsx3().
 """
 
 import logging
 import os
-import tempfile
 import threading
+from typing import Callable, Optional, Tuple
+
+import numpy as np
 
 logger = logging.getLogger("nia.core.tts_engine")
 
@@ -15,6 +29,12 @@ logger = logging.getLogger("nia.core.tts_engine")
 _coqui_tts = None
 _pyttsx3_engine = None
 _tts_lock = threading.Lock()
+_synth_lock = threading.Lock()  # Coqui models are not safe to call from two threads at once
+_playback_lock = threading.Lock()  # one phrase on the output device at a time
+_pyttsx3_speaking = threading.Event()
+
+# Lightweight VITS model; also part of the TTS audio cache key
+COQUI_MODEL_NAME = "tts_models/en/ljspeech/vits"
 
 def _init_coqui_tts():
     """Initialize Coqui TTS model (CPU-only)."""
@@ -30,7 +50,7 @@ def _init_coqui_tts():
         os.environ["CUDA_VISIBLE_DEVICES"] = ""
         
         # Load a lightweight VITS model
-        model_name = "tts_models/en/ljspeech/vits"
+        model_name = COQUI_MODEL_NAME
         logger.info(f"Loading Coqui TTS model: {model_name}")
         
         _coqui_tts = TTS(model_name=model_name, progress_bar=False)
@@ -76,33 +96,77 @@ def _init_pyttsx3():
         _pyttsx3_engine = None
         return None
 
-def _play_audio_file(file_path: str) -> bool:
-    """Play audio file using sounddevice or pygame."""
+def synthesize(text: str) -> Optional[Tuple[np.ndarray, int]]:
+    """
+    Render text with Coqui TTS in memory.
+
+    Returns:
+        (audio, sample_rate) with audio as float32 mono in [-1, 1], or None if Coqui TTS
+        is unavailable or synthesis failed.
+    """
+    with _tts_lock:
+        coqui_engine = _init_coqui_tts()
+    if coqui_engine is None:
+        return None
+    try:
+        with _synth_lock:
+            wav = coqui_engine.tts(text=text)
+        synthesizer = getattr(coqui_engine, "synthesizer", None)
+        sample_rate = int(getattr(synthesizer, "output_sample_rate", None) or 22050)
+        return np.asarray(wav, dtype=np.float32).reshape(-1), sample_rate
+    except Exception as e:
+        logger.warning(f"Coqui TTS synthesis failed: {e}")
+        return None
+
+def play_audio(audio: np.ndarray, sample_rate: int, should_stop: Optional[Callable[[], bool]] = None,
+               block_ms: float = 20) -> bool:
+    """
+    Play a float32 mono waveform through sounddevice (or pygame), blocking until done.
+
+    should_stop is polled every block_ms; once it returns True playback is cut off
+    mid-phrase. Returns False only if the audio could not be played.
+    """
+    should_stop = should_stop or (lambda: False)
+    with _playback_lock:
+        return _play_audio(np.ascontiguousarray(audio, dtype=np.float32).reshape(-1), sample_rate,
+                           should_stop, block_ms)
+
+def _play_audio(audio: np.ndarray, sample_rate: int, should_stop: Callable[[], bool], block_ms: float) -> bool:
     try:
         import sounddevice as sd
-        import soundfile as sf
-        
-        # Load and play audio
-        data, sample_rate = sf.read(file_path)
-        sd.play(data, sample_rate)
-        sd.wait()  # Wait until playback is finished
-        return True
-        
-    except ImportError:
-        # Fallback to pygame if sounddevice is not available
+    except (ImportError, OSError):
+        sd = None
+    if sd is not None:
+        block = max(1, int(sample_rate * block_ms / 1000))
+        frames = audio.reshape(-1, 1)
         try:
-            import pygame
-            pygame.mixer.init()
-            pygame.mixer.music.load(file_path)
-            pygame.mixer.music.play()
-            while pygame.mixer.music.get_busy():
-                pygame.time.wait(100)
+            with sd.OutputStream(samplerate=sample_rate, channels=1, dtype="float32",
+                                 blocksize=block, latency="low") as stream:
+                for start in range(0, frames.shape[0], block):
+                    if should_stop():
+                        stream.abort()  # discard what the device still has buffered
+                        return True
+                    stream.write(frames[start:start + block])
+            # Leaving the context stops the stream, which waits for the last blocks to play
             return True
         except Exception as e:
-            logger.error(f"Failed to play audio with pygame: {e}")
+            logger.error(f"Failed to play audio with sounddevice: {e}")
             return False
+
+    # Fallback to pygame if sounddevice is not available
+    try:
+        import pygame
+        pygame.mixer.init(frequency=sample_rate, size=-16, channels=1)
+        pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+        channel = pygame.mixer.Sound(buffer=pcm.tobytes()).play()
+        while channel is not None and channel.get_busy():
+            if should_stop():
+                channel.stop()
+                break
+            pygame.time.wait(int(block_ms))
+        return True
     except Exception as e:
-        logger.error(f"Failed to play audio with sounddevice: {e}")
+        logger.error(f"Failed to play audio with pygame: {e}")
         return False
 
 def speak(text: str, use_coqui: bool = True) -> bool:
@@ -122,55 +186,55 @@ def speak(text: str, use_coqui: bool = True) -> bool:
     text = text.strip()
     logger.debug(f"Speaking text: '{text[:50]}{'...' if len(text) > 50 else ''}'")
     
+    # Try Coqui TTS first if requested and available
+    if use_coqui:
+        # Synthesize in memory and play the waveform directly (no temp file)
+        rendered = synthesize(text)
+        if rendered is not None:
+            logger.info("Using Coqui TTS engine")
+            if play_audio(*rendered):
+                return True
+            logger.warning("Failed to play Coqui TTS audio, falling back to pyttsx3")
+
+    return speak_pyttsx3(text)
+
+def speak_pyttsx3(text: str, should_stop: Optional[Callable[[], bool]] = None) -> bool:
+    """
+    Speak text with pyttsx3, which synthesizes and plays in one blocking call.
+
+    Interrupt it from another thread with stop_pyttsx3(); should_stop is checked once
+    more right before speaking so a stop that lands just before the call still wins.
+    """
     with _tts_lock:
-        # Try Coqui TTS first if requested and available
-        if use_coqui:
-            coqui_engine = _init_coqui_tts()
-            if coqui_engine is not None:
-                try:
-                    logger.info("Using Coqui TTS engine")
-                    
-                    # Create temporary file for audio output
-                    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_file:
-                        temp_path = temp_file.name
-                    
-                    # Generate speech
-                    coqui_engine.tts_to_file(text=text, file_path=temp_path)
-                    
-                    # Play the generated audio
-                    if _play_audio_file(temp_path):
-                        # Clean up temporary file
-                        try:
-                            os.unlink(temp_path)
-                        except OSError:
-                            pass
-                        return True
-                    else:
-                        logger.warning("Failed to play Coqui TTS audio, falling back to pyttsx3")
-                except Exception as e:
-                    logger.warning(f"Coqui TTS failed: {e}, falling back to pyttsx3")
-                finally:
-                    # Clean up temporary file if it exists
-                    try:
-                        if 'temp_path' in locals():
-                            os.unlink(temp_path)
-                    except OSError:
-                        pass
-        
-        # Fallback to pyttsx3
         pyttsx3_engine = _init_pyttsx3()
-        if pyttsx3_engine is not None:
+    if pyttsx3_engine is None:
+        logger.error("Both TTS engines failed to initialize")
+        return False
+    try:
+        logger.info("Using pyttsx3 engine (fallback)")
+        with _playback_lock:
+            if should_stop is not None and should_stop():
+                return True
+            _pyttsx3_speaking.set()
             try:
-                logger.info("Using pyttsx3 engine (fallback)")
                 pyttsx3_engine.say(text)
                 pyttsx3_engine.runAndWait()
-                return True
-            except Exception as e:
-                logger.error(f"pyttsx3 failed: {e}")
-                return False
-        else:
-            logger.error("Both TTS engines failed to initialize")
-            return False
+            finally:
+                _pyttsx3_speaking.clear()
+        return True
+    except Exception as e:
+        logger.error(f"pyttsx3 failed: {e}")
+        return False
+
+def stop_pyttsx3() -> None:
+    """Cut off the phrase pyttsx3 is speaking; call from a thread other than the speaker."""
+    engine = _pyttsx3_engine
+    if engine is None or not _pyttsx3_speaking.is_set():
+        return
+    try:
+        engine.stop()
+    except Exception as e:
+        logger.warning(f"Error stopping pyttsx3: {e}")
 
 def is_coqui_available() -> bool:
     """Check if Coqui TTS is available."""
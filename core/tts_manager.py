@@ -2,19 +2,30 @@
 """
 Manages Text-to-Speech (TTS) operations in a non-blocking way.
 
-- Runs the blocking pyttsx3 engine in a separate thread.
-- Uses an asyncio.Queue to receive text phrases to be spoken.
+- Runs synthesis and playback in two threads joined by a bounded audio queue, so the
+  next phrase renders while the current one plays instead of after it.
+- Uses a queue to receive text phrases to be spoken.
 - Implements a phrase chunker to stream audio smoothly.
-- Provides methods to stop speech immediately for barge-in.
+- Provides methods to stop speech immediately for barge-in: a generation counter
+  invalidates work already queued or in flight in either stage, and the phrase
+  currently playing is cut off within one playback block (voice.tts_playback_block_ms).
+- Serves recurring phrases from TTSAudioCache and prewarms the fixed ones at startup.
 """
 
 import asyncio
+import collections
 import logging
 import queue
 import re
 import threading
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+from core import tts_engine
 from core.config import settings
-from core.tts_engine import speak as tts_speak
+from core.tts_cache import TTSAudioCache
 
 logger = logging.getLogger("nia.core.tts_manager")
 
@@ -23,17 +34,42 @@ class TTSManager:
         self.loop = loop
         # No longer need to initialize pyttsx3 directly - tts_engine handles this
 
+        # Text phrases wait here for synthesis; rendered audio waits in the bounded
+        # audio_queue for playback, which caps how far synthesis runs ahead.
         self.phrase_queue = queue.Queue()
+        self.audio_queue = queue.Queue(maxsize=max(1, int(settings["voice"].get("tts_prefetch_phrases", 2))))
         self.stop_event = threading.Event()
         self.is_speaking_event = threading.Event()
         self.speak_complete_event = asyncio.Event()
 
+        # Bumped by stop(): queued or in-flight work from an older generation is dropped
+        self._generation = 0
+        self._pending = 0  # phrases of the current generation not yet played
+        self._state_lock = threading.Lock()
+
+        # Inter-phrase gap: silence between consecutive phrases that were already queued
+        self._last_playback_end = None
+        self.gaps_ms = collections.deque(maxlen=200)
+        self.synthesis_ms = collections.deque(maxlen=200)
+
+        # Barge-in: playback polls for cancellation every block; stop-to-silence is timed
+        self.playback_block_ms = float(settings["voice"].get("tts_playback_block_ms", 20))
+        self._stop_requested_at = None
+        self.stop_latency_ms = collections.deque(maxlen=200)
+
+        # Rendered Coqui audio for recurring phrases (RAM LRU + on-disk store)
+        self.audio_cache = TTSAudioCache.from_config(
+            settings["voice"], engine="coqui", voice=tts_engine.COQUI_MODEL_NAME
+        )
+
         self.buffer = ""
         self.boundary_regex = re.compile(settings["voice"]["sentence_boundary_regex"])
 
-        self.worker_thread = threading.Thread(target=self._tts_worker, daemon=True)
+        self.synthesis_thread = threading.Thread(target=self._synthesis_worker, name="nia-tts-synth", daemon=True)
+        self.worker_thread = threading.Thread(target=self._playback_worker, name="nia-tts-play", daemon=True)
+        self.synthesis_thread.start()
         self.worker_thread.start()
-        logger.info("TTSManager initialized and worker thread started.")
+        logger.info("TTSManager initialized and worker threads started.")
 
     def _clean_text_for_speech(self, text: str) -> str:
         """
@@ -70,34 +106,130 @@ class TTSManager:
         return cleaned
 
 
-    def _tts_worker(self):
-        """The main loop for the TTS worker thread."""
+    def _is_current(self, generation: int) -> bool:
+        return generation == self._generation and not self.stop_event.is_set()
+
+    def _phrase_done(self, generation: int):
+        """Count a phrase of `generation` as finished; signal completion when none remain."""
+        with self._state_lock:
+            if generation != self._generation:
+                return
+            self._pending = max(self._pending - 1, 0)
+            done = self._pending == 0
+        if done:
+            self._last_playback_end = None  # the next phrase starts a new utterance
+            self.loop.call_soon_threadsafe(self.speak_complete_event.set)
+
+    def _synthesis_worker(self):
+        """Stage 1: render queued phrases to audio ahead of playback."""
         while not self.stop_event.is_set():
             try:
-                # Wait for a phrase to be added to the queue
-                phrase = self.phrase_queue.get(timeout=1)
-                if phrase is None:  # Sentinel for shutdown
+                item = self.phrase_queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            if item is None:  # Sentinel for shutdown
+                break
+            generation, phrase, queued_at = item
+            if not self._is_current(generation):
+                continue
+
+            t0 = time.perf_counter()
+            # None means Coqui is unavailable; playback falls back to pyttsx3, which
+            # synthesizes and plays in one call
+            rendered = self._render(phrase)
+            if rendered is not None:
+                self.synthesis_ms.append((time.perf_counter() - t0) * 1000.0)
+
+            # Block while playback is prefetch phrases behind, but give up on cancellation
+            while self._is_current(generation):
+                try:
+                    self.audio_queue.put((generation, phrase, rendered, queued_at), timeout=0.1)
                     break
+                except queue.Full:
+                    continue
+        logger.info("TTS synthesis thread finished.")
 
-                self.is_speaking_event.set()
-                # Use the new tts_engine module
-                success = tts_speak(phrase)
+    def _playback_worker(self):
+        """Stage 2: play rendered phrases in order."""
+        while not self.stop_event.is_set():
+            try:
+                item = self.audio_queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            if item is None:  # Sentinel for shutdown
+                break
+            generation, phrase, rendered, queued_at = item
+            if not self._is_current(generation):
+                continue
+
+            started = time.perf_counter()
+            if self._last_playback_end is not None:
+                # Only time the phrase was already waiting for counts as a gap
+                gap_ms = (started - max(self._last_playback_end, queued_at)) * 1000.0
+                self.gaps_ms.append(max(gap_ms, 0.0))
+                logger.debug("Inter-phrase gap: %.1f ms", gap_ms)
+
+            def cancelled(generation=generation):
+                return not self._is_current(generation)
+
+            self.is_speaking_event.set()
+            try:
+                if rendered is not None:
+                    success = (tts_engine.play_audio(*rendered, should_stop=cancelled, block_ms=self.playback_block_ms)
+                               or tts_engine.speak_pyttsx3(phrase, should_stop=cancelled))
+                else:
+                    success = tts_engine.speak_pyttsx3(phrase, should_stop=cancelled)
                 if not success:
                     logger.warning("TTS engine failed to speak phrase")
+            finally:
                 self.is_speaking_event.clear()
+            stop_requested_at = self._stop_requested_at
+            if cancelled() and stop_requested_at is not None:
+                self._stop_requested_at = None
+                latency_ms = (time.perf_counter() - stop_requested_at) * 1000.0
+                self.stop_latency_ms.append(latency_ms)
+                logger.info("TTS silenced %.1f ms after stop.", latency_ms)
+            # A phrase cut off by stop() does not start a gap for the next utterance
+            self._last_playback_end = time.perf_counter() if self._is_current(generation) else None
+            self._phrase_done(generation)
+        logger.info("TTS playback thread finished.")
 
-                self.phrase_queue.task_done()
+    def _render(self, phrase: str) -> Optional[Tuple[np.ndarray, int]]:
+        if self.audio_cache is None:
+            return tts_engine.synthesize(phrase)
+        return self.audio_cache.get_or_synthesize(phrase, tts_engine.synthesize)
 
-                # If the queue is now empty, signal completion
-                if self.phrase_queue.empty():
-                    self.loop.call_soon_threadsafe(self.speak_complete_event.set)
+    def prewarm(self, phrases: Iterable[str]) -> Optional[threading.Thread]:
+        """Render fixed phrases into the audio cache in the background (cleaned as speak() would)."""
+        if self.audio_cache is None:
+            return None
+        cleaned = [self._clean_text_for_speech(p) for p in phrases]
+        return self.audio_cache.prewarm(cleaned, tts_engine.synthesize)
 
-            except queue.Empty:
-                # This can happen during shutdown or if the queue is empty
-                if self.phrase_queue.empty() and not self.is_speaking_event.is_set():
-                    self.loop.call_soon_threadsafe(self.speak_complete_event.set)
-                continue
-        logger.info("TTS worker thread finished.")
+    def metrics(self) -> Dict[str, Any]:
+        """Inter-phrase gap, synthesis time and stop-to-silence latency over recent phrases (ms)."""
+        gaps = list(self.gaps_ms)
+        synthesis = list(self.synthesis_ms)
+        stops = list(self.stop_latency_ms)
+        return {
+            "gap_p50_ms": float(np.percentile(gaps, 50)) if gaps else None,
+            "gap_p95_ms": float(np.percentile(gaps, 95)) if gaps else None,
+            "gap_max_ms": max(gaps) if gaps else None,
+            "gaps": len(gaps),
+            "synthesis_p50_ms": float(np.percentile(synthesis, 50)) if synthesis else None,
+            "stop_to_silence_p50_ms": float(np.percentile(stops, 50)) if stops else None,
+            "stop_to_silence_max_ms": max(stops) if stops else None,
+            "stops": len(stops),
+            "queued_phrases": self.phrase_queue.qsize(),
+            "queued_audio": self.audio_queue.qsize(),
+            "cache": self.audio_cache.metrics() if self.audio_cache is not None else None,
+        }
+
+    def _enqueue(self, phrase: str):
+        with self._state_lock:
+            generation = self._generation
+            self._pending += 1
+        self.phrase_queue.put((generation, phrase, time.perf_counter()))
 
     def add_to_buffer(self, text: str):
         """
@@ -130,7 +262,7 @@ class TTSManager:
             cleaned_phrase = self._clean_text_for_speech(phrase)
             if cleaned_phrase:  # Only add if there's content after cleaning
                 self.speak_complete_event.clear()
-                self.phrase_queue.put(cleaned_phrase)
+                self._enqueue(cleaned_phrase)
                 logger.debug("Queued for TTS: '%s'", cleaned_phrase)
                 await self.speak_complete_event.wait()
 
@@ -140,7 +272,7 @@ class TTSManager:
             # Clean the text before adding to queue
             cleaned_phrase = self._clean_text_for_speech(phrase)
             if cleaned_phrase:  # Only add if there's content after cleaning
-                self.phrase_queue.put(cleaned_phrase)
+                self._enqueue(cleaned_phrase)
                 logger.debug("Queued for TTS: '%s'", cleaned_phrase)
 
     def flush_buffer(self):
@@ -150,17 +282,26 @@ class TTSManager:
             self.buffer = ""
 
     def stop(self):
-        """Stops the current speech and clears the queue."""
+        """Stops the current speech mid-phrase and clears the queue."""
         logger.info("TTS stop requested (barge-in).")
-        # Clear any pending phrases
-        with self.phrase_queue.mutex:
-            self.phrase_queue.queue.clear()
-        
-        # Note: The tts_engine module doesn't support stopping mid-speech
-        # This is a limitation of the current implementation
-        # The stop will be effective for the next phrase in the queue
-        
+        if self.is_speaking_event.is_set():
+            self._stop_requested_at = time.perf_counter()
+        # Invalidate everything queued or in flight in both stages; the playing phrase
+        # sees the new generation at its next block
+        with self._state_lock:
+            self._generation += 1
+            self._pending = 0
+        for q in (self.phrase_queue, self.audio_queue):
+            with q.mutex:
+                q.queue.clear()
+                q.not_full.notify_all()
+        self._last_playback_end = None
+        if self.is_speaking_event.is_set():
+            # pyttsx3 blocks its thread in runAndWait(); it can only be stopped from outside
+            threading.Thread(target=tts_engine.stop_pyttsx3, name="nia-tts-stop", daemon=True).start()
+
         self.buffer = "" # Clear the text buffer as well
+        self.loop.call_soon_threadsafe(self.speak_complete_event.set)
 
     def is_speaking(self) -> bool:
         """Returns True if the TTS engine is currently speaking."""
@@ -170,6 +311,13 @@ class TTSManager:
         """Shuts down the TTS worker thread gracefully."""
         logger.info("Shutting down TTSManager.")
         self.stop_event.set()
-        self.phrase_queue.put(None)  # Sentinel to unblock the worker
+        self.phrase_queue.put(None)  # Sentinels to unblock the workers
+        try:
+            self.audio_queue.put_nowait(None)
+        except queue.Full:
+            pass  # the playback worker sees stop_event within its poll timeout
+        self.synthesis_thread.join(timeout=2)
         self.worker_thread.join(timeout=2)
+        if self.audio_cache is not None:
+            self.audio_cache.close()
         # No need to stop engine directly - tts_engine handles this
@@ -0,0 +1,274 @@
+"""
+MmapVectorStore — Append-only on-disk vector index used as the KnowledgeManager fallback.
+
+Layout (all files live in one directory):
+- vectors.f32: 16-byte header (magic, version, dim) followed by unit-normalized float32 rows.
+- meta.jsonl: one compact JSON record per row (name, text, source, meta).
+- offsets.u64: end byte offset of each meta.jsonl line; the commit record for a row.
+
+Appends write the metadata line, then the vector row, then the offset entry, fsyncing
+each file. On open, any partially written tail is truncated so all three files agree.
+Vectors are memory-mapped read-only, so opening a large index costs milliseconds and
+search runs directly on the mapped pages.
+"""
+
+from __future__ import annotations
+import json
+import logging
+import os
+import struct
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+logger = logging.getLogger("nia.core.vector_store")
+
+_MAGIC = b"NIAV"
+_VERSION = 1
+_HEADER = struct.Struct("<4sII4x")  # magic, version, dim, padding -> 16 bytes
+_OFFSET = np.dtype("<u8")
+
+
+class MmapVectorStore:
+    VECTORS_FILE = "vectors.f32"
+    META_FILE = "meta.jsonl"
+    OFFSETS_FILE = "offsets.u64"
+
+    def __init__(self, path: str, dim: Optional[int] = None) -> None:
+        """Open (or prepare) a store at `path`.
+
+        `dim` is only needed to create a new store; existing stores read it from the header.
+        """
+        self.path = path
+        self.dim: Optional[int] = None
+        self._count = 0
+        self._vectors: Optional[np.memmap] = None
+        self._offsets: Optional[np.memmap] = None
+
+        os.makedirs(self.path, exist_ok=True)
+        if os.path.exists(self._file(self.VECTORS_FILE)):
+            self._open_existing()
+        elif dim is not None:
+            self._create(int(dim))
+
+    # --- Properties --------------------------------------------------------------
+    @property
+    def ready(self) -> bool:
+        """True once the vector dimension is known and files exist."""
+        return self.dim is not None
+
+    def __len__(self) -> int:
+        return self._count
+
+    # --- Open / create -----------------------------------------------------------
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _create(self, dim: int) -> None:
+        if dim <= 0:
+            raise ValueError("Vector dimension must be positive")
+        with open(self._file(self.VECTORS_FILE), "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, _VERSION, dim))
+            f.flush()
+            os.fsync(f.fileno())
+        for name in (self.META_FILE, self.OFFSETS_FILE):
+            open(self._file(name), "wb").close()
+        self.dim = dim
+        self._count = 0
+        logger.info("Created vector store at '%s' (dim=%s).", self.path, dim)
+
+    def _open_existing(self) -> None:
+        vec_path = self._file(self.VECTORS_FILE)
+        with open(vec_path, "rb") as f:
+            header = f.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            raise ValueError(f"Corrupt vector store header in '{vec_path}'")
+        magic, version, dim = _HEADER.unpack(header)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f"Unsupported vector store format in '{vec_path}'")
+        self.dim = int(dim)
+
+        for name in (self.META_FILE, self.OFFSETS_FILE):
+            if not os.path.exists(self._file(name)):
+                open(self._file(name), "wb").close()
+
+        row_bytes = self.dim * 4
+        n_vec = (os.path.getsize(vec_path) - _HEADER.size) // row_bytes
+        n_off = os.path.getsize(self._file(self.OFFSETS_FILE)) // _OFFSET.itemsize
+        count = min(n_vec, n_off)
+
+        # The offsets file is the commit record; trust it only as far as the
+        # metadata it points at actually exists.
+        meta_size = os.path.getsize(self._file(self.META_FILE))
+        if count:
+            offsets = np.fromfile(self._file(self.OFFSETS_FILE), dtype=_OFFSET, count=count)
+            while count and int(offsets[count - 1]) > meta_size:
+                count -= 1
+        self._recover(count)
+        self._count = count
+        logger.info("Opened vector store at '%s' (%s rows, dim=%s).", self.path, count, self.dim)
+
+    def _recover(self, count: int) -> None:
+        """Truncate every file to `count` committed rows, dropping torn appends."""
+        row_bytes = (self.dim or 0) * 4
+        targets = {
+            self.VECTORS_FILE: _HEADER.size + count * row_bytes,
+            self.OFFSETS_FILE: count * _OFFSET.itemsize,
+            self.META_FILE: self._meta_end(count),
+        }
+        for name, size in targets.items():
+            path = self._file(name)
+            if os.path.getsize(path) != size:
+                logger.warning("Recovering '%s': truncating to %s bytes.", path, size)
+                with open(path, "r+b") as f:
+                    f.truncate(size)
+
+    def _meta_end(self, count: int) -> int:
+        if count == 0:
+            return 0
+        with open(self._file(self.OFFSETS_FILE), "rb") as f:
+            f.seek((count - 1) * _OFFSET.itemsize)
+            return int(np.frombuffer(f.read(_OFFSET.itemsize), dtype=_OFFSET)[0])
+
+    # --- Mapping -----------------------------------------------------------------
+    def _invalidate(self) -> None:
+        self._vectors = None
+        self._offsets = None
+
+    def vectors(self) -> np.ndarray:
+        """Return a read-only (count, dim) view of all stored unit vectors."""
+        if not self.ready or self._count == 0:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        if self._vectors is None or self._vectors.shape[0] != self._count:
+            self._vectors = np.memmap(
+                self._file(self.VECTORS_FILE), dtype=np.float32, mode="r",
+                offset=_HEADER.size, shape=(self._count, self.dim),
+            )
+        return self._vectors
+
+    def _offset_table(self) -> np.ndarray:
+        if self._offsets is None or self._offsets.shape[0] != self._count:
+            self._offsets = np.memmap(self._file(self.OFFSETS_FILE), dtype=_OFFSET, mode="r", shape=(self._count,))
+        return self._offsets
+
+    # --- Write path --------------------------------------------------------------
+    def _normalize(self, vector: Optional[Sequence[float]]) -> np.ndarray:
+        row = np.zeros(self.dim, dtype=np.float32)
+        if vector is None:
+            return row  # zero row == "no vector yet"; scores 0 until backfilled
+        arr = np.asarray(vector, dtype=np.float32)
+        if arr.shape != (self.dim,):
+            raise ValueError(f"Vector has shape {arr.shape}, store expects ({self.dim},)")
+        norm = float(np.linalg.norm(arr))
+        if norm > 0:
+            np.divide(arr, norm, out=row)
+        return row
+
+    def append(self, record: Dict[str, Any], vector: Optional[Sequence[float]]) -> int:
+        """Append one record durably and return its row index."""
+        return self.append_many([(record, vector)])[0]
+
+    def append_many(self, items: Iterable[Tuple[Dict[str, Any], Optional[Sequence[float]]]]) -> List[int]:
+        """Append records in one batch (one fsync per file) and return their row indices."""
+        items = list(items)
+        if not items:
+            return []
+        if not self.ready:
+            first = next((v for _, v in items if v is not None), None)
+            if first is None:
+                raise ValueError("Cannot create a vector store before any vector dimension is known")
+            self._create(len(first))
+
+        rows = np.stack([self._normalize(v) for _, v in items])
+        lines = [
+            (json.dumps(rec, separators=(",", ":"), ensure_ascii=False, default=str) + "\n").encode("utf-8")
+            for rec, _ in items
+        ]
+
+        meta_path = self._file(self.META_FILE)
+        with open(meta_path, "ab") as f:
+            start = f.tell()
+            f.write(b"".join(lines))
+            f.flush()
+            os.fsync(f.fileno())
+        ends = np.cumsum([len(line) for line in lines], dtype=np.uint64) + np.uint64(start)
+
+        with open(self._file(self.VECTORS_FILE), "ab") as f:
+            f.write(rows.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        with open(self._file(self.OFFSETS_FILE), "ab") as f:
+            f.write(ends.astype(_OFFSET).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+        first_row = self._count
+        self._count += len(items)
+        self._invalidate()
+        return list(range(first_row, self._count))
+
+    def update_vectors(self, rows: Sequence[int], vectors: Sequence[Sequence[float]]) -> None:
+        """Overwrite existing rows in place, e.g. to backfill rows appended without a vector."""
+        if not self.ready:
+            raise ValueError("Vector store is empty")
+        row_bytes = self.dim * 4
+        with open(self._file(self.VECTORS_FILE), "r+b") as f:
+            for row, vector in zip(rows, vectors):
+                if not 0 <= row < self._count:
+                    raise IndexError(row)
+                f.seek(_HEADER.size + int(row) * row_bytes)
+                f.write(self._normalize(vector).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        self._invalidate()
+
+    # --- Read path ---------------------------------------------------------------
+    def get_record(self, row: int) -> Dict[str, Any]:
+        """Read the metadata record for a row without loading the whole sidecar."""
+        if not 0 <= row < self._count:
+            raise IndexError(row)
+        offsets = self._offset_table()
+        start = int(offsets[row - 1]) if row > 0 else 0
+        end = int(offsets[row])
+        with open(self._file(self.META_FILE), "rb") as f:
+            f.seek(start)
+            return json.loads(f.read(end - start).decode("utf-8"))
+
+    def missing_rows(self, limit: Optional[int] = None) -> List[int]:
+        """Rows stored without a vector (all-zero rows), oldest first."""
+        if not self.ready or self._count == 0:
+            return []
+        missing = np.flatnonzero(~self.vectors().any(axis=1))
+        return [int(i) for i in missing[:limit]]
+
+    def search(self, query: Sequence[float], top_k: int) -> List[Tuple[int, float]]:
+        """Return (row, cosine similarity) pairs for the `top_k` best rows."""
+        if not self.ready or self._count == 0 or top_k <= 0:
+            return []
+        q = np.asarray(query, dtype=np.float32)
+        if q.shape != (self.dim,):
+            logger.warning("Query vector has shape %s, store expects (%s,)", q.shape, self.dim)
+            return []
+        norm = float(np.linalg.norm(q))
+        if norm == 0:
+            return []
+        scores = self.vectors() @ (q / norm)
+        k = min(int(top_k), self._count)
+        if k < self._count:
+            idx = np.argpartition(-scores, k - 1)[:k]
+        else:
+            idx = np.arange(self._count)
+        idx = idx[np.argsort(-scores[idx], kind="stable")]
+        return [(int(i), float(scores[i])) for i in idx]
+
+    def clear(self) -> None:
+        """Delete all rows and files; the dimension is re-learned on the next append."""
+        self._invalidate()
+        for name in (self.VECTORS_FILE, self.META_FILE, self.OFFSETS_FILE):
+            try:
+                os.remove(self._file(name))
+            except FileNotFoundError:
+                pass
+        self.dim = None
+        self._count = 0
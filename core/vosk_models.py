@@ -0,0 +1,253 @@
+"""
+Shared Vosk model cache with background loading.
+
+- load_model_async(path) starts loading on a background thread and returns a Future;
+  every caller asking for the same path gets the same Future and the same Model.
+- After loading, a short silent decode warms the model so the first real utterance
+  does not pay first-use costs.
+- get_model(path) is the blocking form, for worker threads.
+- VoskModelRegistry addresses models by key (e.g. a language), keeps the loaded ones in an
+  LRU under a RAM budget, and preloads the model most likely to be needed next.
+"""
+
+from __future__ import annotations
+import logging
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional
+
+from vosk import Model, KaldiRecognizer
+
+
+logger = logging.getLogger("nia.core.vosk_models")
+
+_lock = threading.Lock()
+_futures: Dict[str, Future] = {}
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="nia-vosk-load")
+
+
+def _key(path: str) -> str:
+    return os.path.realpath(path)
+
+
+def _load(path: str, warm_up: bool, sample_rate: int) -> Model:
+    t0 = time.perf_counter()
+    try:
+        model = Model(path)
+    except Exception:
+        logger.error(
+            "Failed to load Vosk model from '%s'. "
+            "Please ensure you have downloaded and placed the model correctly.",
+            path,
+        )
+        raise
+    t1 = time.perf_counter()
+    if warm_up:
+        try:
+            recognizer = KaldiRecognizer(model, sample_rate)
+            recognizer.AcceptWaveform(bytes(2 * sample_rate // 2))  # 0.5 s of int16 silence
+            recognizer.FinalResult()
+        except Exception as exc:
+            logger.warning("Vosk warm-up decode failed (model still usable): %s", exc)
+    logger.info("Vosk model '%s' ready (load %.0f ms, warm-up %.0f ms).",
+                path, (t1 - t0) * 1000, (time.perf_counter() - t1) * 1000)
+    return model
+
+
+def load_model_async(path: str, warm_up: bool = True, sample_rate: int = 16000) -> Future:
+    """Start (or join) loading the model at `path`; returns a Future[Model]."""
+    key = _key(path)
+    with _lock:
+        fut = _futures.get(key)
+        if fut is None or (fut.done() and fut.exception() is not None):
+            fut = _executor.submit(_load, path, warm_up, sample_rate)
+            _futures[key] = fut
+    return fut
+
+
+def register(path: str, model: Model) -> None:
+    """Seed the cache with an already-built model (e.g. a stand-in for replay benchmarks)."""
+    fut: Future = Future()
+    fut.set_result(model)
+    with _lock:
+        _futures[_key(path)] = fut
+
+
+def get_model(path: str, timeout: Optional[float] = None) -> Model:
+    """Blocking access to the shared model for `path`, loading it if needed."""
+    return load_model_async(path).result(timeout=timeout)
+
+
+def forget(path: str) -> None:
+    """Drop the cached model for `path`; it is freed once no recognizer still uses it."""
+    with _lock:
+        _futures.pop(_key(path), None)
+
+
+def clear() -> None:
+    """Forget cached models (mainly for tests)."""
+    with _lock:
+        _futures.clear()
+
+
+def model_size_bytes(path: str) -> int:
+    """On-disk size of a model directory, used as the estimate of its resident size."""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class VoskModelRegistry:
+    """Vosk models by key, loaded on demand and kept in an LRU under a RAM budget.
+
+    Every get() records which model followed which; after a switch the most frequent
+    successor of the new model is preloaded in the background, if it fits in the budget
+    without evicting the model in use.
+    """
+
+    def __init__(
+        self,
+        paths: Dict[str, str],
+        default: Optional[str] = None,
+        budget_mb: float = 2048,
+        warm_up: bool = True,
+        sample_rate: int = 16000,
+    ) -> None:
+        if not paths:
+            raise ValueError("VoskModelRegistry needs at least one model path")
+        self.paths = dict(paths)
+        self.default = default if default in self.paths else next(iter(self.paths))
+        self.budget_bytes = int(float(budget_mb) * 1024 * 1024)
+        self.warm_up = warm_up
+        self.sample_rate = sample_rate
+        self._lock = threading.Lock()
+        self._loaded: "OrderedDict[str, Future]" = OrderedDict()  # least recently used first
+        self._sizes: Dict[str, int] = {}
+        self._successors: Dict[str, Counter] = {}
+        self._current: Optional[str] = None
+        self.evictions = 0
+
+    @classmethod
+    def from_config(cls, stt_cfg: Dict[str, Any], sample_rate: int = 16000) -> "VoskModelRegistry":
+        paths = dict(stt_cfg.get("vosk_models") or {})
+        default = stt_cfg.get("default_model")
+        if not paths or default not in paths:
+            # The single-model setting still works, as the default entry
+            default = default or "default"
+            paths.setdefault(default, stt_cfg["vosk_model_path"])
+        return cls(
+            paths,
+            default=default,
+            budget_mb=float(stt_cfg.get("model_ram_budget_mb", 2048)),
+            warm_up=bool(stt_cfg.get("model_warmup", True)),
+            sample_rate=sample_rate,
+        )
+
+    # --- Access ------------------------------------------------------------------
+    def get_async(self, key: Optional[str] = None) -> Future:
+        """Start (or join) loading model `key`, mark it most recently used; returns a Future[Model]."""
+        key = key or self.default
+        if key not in self.paths:
+            raise KeyError(f"Unknown Vosk model '{key}' (known: {', '.join(self.paths)})")
+        with self._lock:
+            previous, self._current = self._current, key
+            if previous is not None and previous != key:
+                self._successors.setdefault(previous, Counter())[key] += 1
+            fut = self._admit(key, protect={key})
+            likely = self._likely_successor(key)
+        if likely is not None:
+            logger.debug("Preloading Vosk model '%s' (usually follows '%s').", likely, key)
+            self.preload([likely])
+        return fut
+
+    def get(self, key: Optional[str] = None, timeout: Optional[float] = None) -> Any:
+        """Blocking access, for worker threads."""
+        return self.get_async(key).result(timeout=timeout)
+
+    def preload(self, keys: Iterable[str]) -> List[Future]:
+        """Load models in the background without making them current; skips any that do not fit."""
+        futures = []
+        with self._lock:
+            protect = {self._current} if self._current else set()
+            for key in keys:
+                if key not in self.paths:
+                    logger.warning("Cannot preload unknown Vosk model '%s'.", key)
+                    continue
+                fut = self._admit(key, protect=protect | {key}, required=False)
+                if fut is not None:
+                    futures.append(fut)
+        return futures
+
+    def loaded(self) -> List[str]:
+        """Keys of loaded (or loading) models, least recently used first."""
+        with self._lock:
+            return list(self._loaded)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "current": self._current,
+                "loaded": list(self._loaded),
+                "resident_mb": round(self._resident_bytes() / (1024 * 1024), 1),
+                "budget_mb": round(self.budget_bytes / (1024 * 1024), 1),
+                "evictions": self.evictions,
+            }
+
+    # --- Internals (call with self._lock held) ------------------------------------
+    def _size(self, key: str) -> int:
+        if key not in self._sizes:
+            self._sizes[key] = model_size_bytes(self.paths[key])
+        return self._sizes[key]
+
+    def _resident_bytes(self) -> int:
+        return sum(self._size(k) for k in self._loaded)
+
+    def _admit(self, key: str, protect: set, required: bool = True) -> Optional[Future]:
+        """Make `key` resident, evicting least recently used models to stay within budget."""
+        if key in self._loaded:
+            fut = self._loaded[key]
+            if not (fut.done() and fut.exception() is not None):
+                if required:
+                    self._loaded.move_to_end(key)
+                return fut
+            del self._loaded[key]  # a failed load is retried
+        needed = self._resident_bytes() + self._size(key) - self.budget_bytes
+        victims = []
+        for other in self._loaded:
+            if needed <= 0:
+                break
+            if other not in protect:
+                victims.append(other)
+                needed -= self._size(other)
+        if needed > 0 and not required:
+            logger.debug("Not preloading Vosk model '%s': it does not fit in the RAM budget.", key)
+            return None
+        for victim in victims:
+            del self._loaded[victim]
+            forget(self.paths[victim])
+            self.evictions += 1
+            logger.info("Evicted Vosk model '%s' to stay within the RAM budget.", victim)
+        if needed > 0:
+            logger.warning("Vosk model '%s' exceeds the %.0f MB RAM budget on its own.",
+                           key, self.budget_bytes / (1024 * 1024))
+        fut = load_model_async(self.paths[key], warm_up=self.warm_up, sample_rate=self.sample_rate)
+        self._loaded[key] = fut
+        if not required:
+            self._loaded.move_to_end(key, last=False)  # preloaded, not used yet: first to go
+        return fut
+
+    def _likely_successor(self, key: str) -> Optional[str]:
+        """The model that most often follows `key`, if it is not loaded yet."""
+        successors = self._successors.get(key)
+        if not successors:
+            return None
+        likely, _ = successors.most_common(1)[0]
+        return None if likely in self._loaded else likely
@@ -23,6 +23,9 @@ from core.confirmation_manager import ConfirmationManager
 
 logger = logging.getLogger("nia.interface.voice")
 
+ERROR_APOLOGY = "I'm sorry, I encountered an error while processing your request."
+DEFAULT_CONFIRM_PROMPT = "I have a suggestion. Would you like to hear it?"
+
 class VoiceState(Enum):
     IDLE = auto()
     LISTENING = auto()
@@ -58,6 +61,10 @@ class VoiceInterface:
         print(f"📢 Press '{self.hotkey.upper()}' to speak")
         print("⏱️  Note: Responses may be slower on this system")
         print("=" * 60)
+        # Keep the microphone open so the pre-roll is already filled when listening starts
+        self.stt_manager.start_capture()
+        # Render fixed phrases into the TTS audio cache while we wait for the first command
+        self.tts_manager.prewarm(self._fixed_phrases())
         # Start the hotkey listener as a managed asyncio task
         self.hotkey_listener_task = self.loop.run_in_executor(None, self._hotkey_listener)
         # Start passive wake-word listener
@@ -75,6 +82,14 @@ class VoiceInterface:
         finally:
             await self.shutdown()
 
+    def _fixed_phrases(self) -> list[str]:
+        """Text NIA speaks verbatim, worth keeping pre-rendered."""
+        phrases = [ERROR_APOLOGY, self.autonomy_cfg.get("confirm_prompt", DEFAULT_CONFIRM_PROMPT)]
+        phrases.extend(self.confirmation_manager.fixed_phrases())
+        if self.autonomy:
+            phrases.extend(self.autonomy.fixed_phrases())
+        return phrases
+
     def _hotkey_listener(self):
         """
         A blocking listener that waits for the hotkey and triggers the async handler.
@@ -147,6 +162,10 @@ class VoiceInterface:
                 self.autonomy.resume()
             return
         
+        # Start retrieval for this turn right away; Brain and autonomy share the result
+        if getattr(self.brain, "retrieval", None) is not None:
+            self.brain.retrieval.submit(user_text)
+
         # Feed user input to autonomy agent for context analysis
         if self.autonomy:
             self.autonomy.update_user_input(user_text)
@@ -178,9 +197,17 @@ class VoiceInterface:
         """
         print("🎤 Listening... (speak clearly, I'll wait up to 5 seconds)")
         try:
-            # This single call now handles the entire streaming recognition process
-            user_text = await self.stt_manager.listen_and_transcribe()
-            
+            # Stream partials to the console as they arrive; join the final segments
+            finals = []
+            async for event in self.stt_manager.listen_stream():
+                if event.kind == "partial":
+                    print(f"\r💬 {' '.join(finals + [event.text])}", end="", flush=True)
+                elif event.text:
+                    finals.append(event.text)
+            if finals:
+                print()
+            user_text = " ".join(finals).strip()
+
             if user_text:
                 print(f"✅ You said: {user_text}")
                 logger.info("USER (voice): %s", user_text)
@@ -215,7 +242,7 @@ class VoiceInterface:
                     break
         except Exception as e:
             logger.exception("Error while streaming from brain.")
-            self.tts_manager.add_to_buffer("I'm sorry, I encountered an error while processing your request.")
+            self.tts_manager.add_to_buffer(ERROR_APOLOGY)
         
         # Flush any remaining text in the TTS buffer
         self.tts_manager.flush_buffer()
@@ -262,7 +289,7 @@ class VoiceInterface:
         Ask the user if they want to hear an autonomous suggestion.
         Returns True if user confirms, False otherwise.
         """
-        prompt = self.autonomy_cfg.get("confirm_prompt", "I have a suggestion. Would you like to hear it?")
+        prompt = self.autonomy_cfg.get("confirm_prompt", DEFAULT_CONFIRM_PROMPT)
         yes_words = [w.lower() for w in self.autonomy_cfg.get("confirm_yes_keywords", ["yes", "sure", "go ahead", "okay"]) ]
         no_words = [w.lower() for w in self.autonomy_cfg.get("confirm_no_keywords", ["no", "not now", "later"]) ]
         timeout_s = int(self.autonomy_cfg.get("confirm_timeout_s", 4))
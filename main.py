@@ -48,6 +48,7 @@ async def main():
     from core.tts_manager import TTSManager
     from core.stt_manager import STTManager # Import the new manager
     from core.autonomy_agent import AutonomyAgent
+    from core.embedding_backfill import EmbeddingBackfill
     from interface.console_interface import ConsoleInterface
     from interface.voice_interface import VoiceInterface
 
@@ -65,23 +66,35 @@ async def main():
     stt_manager = None # Add stt_manager
     autonomy = None
     voice_iface = None  # Initialize voice_iface to None
+    backfill = None
     
     try:
         if use_voice:
             tts_manager = TTSManager(loop)
             stt_manager = STTManager(loop) # Initialize it
             autonomy = AutonomyAgent(loop)
+            if brain.retrieval is not None:
+                # One embedding per turn serves knowledge and memory retrieval
+                brain.retrieval.memory = autonomy.memory
+                autonomy.retrieval = brain.retrieval
+            # Repair rows stored without vectors while the embedding service was unavailable
+            backfill = EmbeddingBackfill(memory=autonomy.memory, knowledge=brain.knowledge_mgr)
+            backfill.start()
             logger.info("Using voice interface.")
             voice_iface = VoiceInterface(brain, tts_manager, stt_manager, autonomy) # Pass it in
             await voice_iface.start()
         else:
             logger.info("Using console interface.")
+            backfill = EmbeddingBackfill(knowledge=brain.knowledge_mgr)
+            backfill.start()
             console = ConsoleInterface(brain)
             await loop.run_in_executor(None, console.run)
     finally:
         logger.info("NIA is shutting down...")
         if use_voice and voice_iface:
             await voice_iface.shutdown()
+        if backfill:
+            backfill.stop()
         if tts_manager:
             tts_manager.shutdown()
         if stt_manager:
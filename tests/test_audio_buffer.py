@@ -0,0 +1,151 @@
+import numpy as np
+
+from core.audio_buffer import AudioRingBuffer
+
+
+def test_frames_are_contiguous_views_across_wraparound():
+    ring = AudioRingBuffer(1200)
+    block = np.arange(800, dtype=np.float32)
+    ring.write(block)
+    assert [len(f) for f in ring.frames(512)] == [512]
+    assert ring.available == 288
+
+    ring.write(block + 800)
+    frames = list(ring.frames(512))
+    assert len(frames) == 2
+    # The second frame wraps the physical end of the ring but is still one view, no copy
+    assert np.array_equal(frames[0], np.arange(512, 1024, dtype=np.float32))
+    assert np.array_equal(frames[1], np.arange(1024, 1536, dtype=np.float32))
+    assert frames[1].base is not None
+    assert ring.available == 64
+
+
+def test_overrun_drops_oldest_unread_samples():
+    ring = AudioRingBuffer(100)
+    ring.write(np.arange(80, dtype=np.float32))
+    ring.write(np.arange(80, 160, dtype=np.float32))
+    assert ring.dropped == 60
+    assert ring.available == 100
+    assert ring.read(10)[0] == 60
+    assert np.array_equal(ring.latest(5), np.arange(155, 160, dtype=np.float32))
+
+
+class _FakeStream:
+    def __init__(self, callback, **kwargs):
+        self.callback = callback
+        self.kwargs = kwargs
+        self.started = self.closed = False
+
+    def start(self):
+        self.started = True
+
+    def stop(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def push(self, samples):
+        self.callback(np.asarray(samples, dtype=np.int16).tobytes(), len(samples), None, None)
+
+
+def test_capture_hub_fans_out_one_stream_to_independent_cursors():
+    from core.audio_capture import AudioCaptureHub
+
+    streams = []
+    hub = AudioCaptureHub(sample_rate=16000, blocksize=160, capacity_s=0.1,
+                          stream_factory=lambda **kw: streams.append(_FakeStream(**kw)) or streams[-1])
+    hub.start()
+    hub.start()
+    assert len(streams) == 1 and streams[0].started
+
+    wake = hub.subscribe("wake")
+    streams[0].push(np.arange(160))
+    transcriber = hub.subscribe("transcriber", preroll_samples=100)
+    streams[0].push(np.arange(160, 320))
+
+    assert np.array_equal(wake.read(320, timeout=0.1), np.arange(320))
+    assert np.array_equal(transcriber.read(260, timeout=0.1), np.arange(60, 320))
+    assert wake.read(1, timeout=0.01) is None
+
+    hub.stop()
+    assert streams[0].closed
+
+
+def test_capture_hub_counts_drops_per_subscription_not_in_the_ring():
+    from core.audio_capture import AudioCaptureHub
+
+    streams = []
+    hub = AudioCaptureHub(sample_rate=16000, blocksize=160, capacity_s=0.02,
+                          stream_factory=lambda **kw: streams.append(_FakeStream(**kw)) or streams[-1])
+    hub.start()
+    sub = hub.subscribe("slow")
+    for i in range(4):  # 640 samples through a 320-sample ring
+        streams[0].push(np.arange(i * 160, (i + 1) * 160))
+
+    assert hub.ring.dropped == 0  # the writer-only ring keeps no reader accounting
+    assert np.array_equal(sub.read(320, timeout=0.1), np.arange(320, 640))
+    assert sub.dropped == hub.dropped == 320
+    hub.stop()
+
+
+def test_shared_ring_reports_samples_the_writer_overwrote():
+    from core.shared_audio import SharedAudioRing
+
+    ring = SharedAudioRing.create(1000)
+    reader = SharedAudioRing.attach(ring.name, 1000)
+    try:
+        ring.write(np.arange(700, dtype=np.int16))
+        samples, cursor, dropped = reader.read_since(0)
+        assert np.array_equal(samples, np.arange(700)) and (cursor, dropped) == (700, 0)
+
+        ring.write(np.arange(700, 2000, dtype=np.int16), overflow=True)
+        samples, cursor, dropped = reader.read_since(cursor)
+        assert (cursor, dropped, reader.overflows) == (2000, 300, 1)
+        assert np.array_equal(samples, np.arange(1000, 2000))  # wraps the end of the segment
+    finally:
+        reader.close()
+        ring.close()
+
+
+class _RampStream:
+    """Picklable stand-in for sd.RawInputStream, run inside the capture process."""
+
+    def __init__(self, samplerate, blocksize, callback, **kwargs):
+        import threading
+
+        self.blocksize = blocksize
+        self.callback = callback
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        for i in range(20):
+            block = (np.arange(self.blocksize) + i * self.blocksize).astype(np.int16)
+            self.callback(block.tobytes(), self.blocksize, None, None)
+            if self._stop.wait(0.005):
+                return
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def close(self):
+        pass
+
+
+def test_capture_process_feeds_the_hub_through_shared_memory():
+    from core.audio_capture import AudioCaptureHub
+    from core.shared_audio import ProcessCaptureStream
+
+    hub = AudioCaptureHub(sample_rate=16000, blocksize=160, capacity_s=1.0,
+                          stream_factory=ProcessCaptureStream.factory(capacity_s=1.0, stream_factory=_RampStream))
+    sub = hub.subscribe("transcriber")
+    hub.start()
+    try:
+        audio = sub.read(20 * 160, timeout=10)
+    finally:
+        hub.stop()
+    assert np.array_equal(audio, np.arange(20 * 160).astype(np.int16))
@@ -0,0 +1,44 @@
+import numpy as np
+
+from benchmarks.retrieval_bench import SyntheticCorpus, run
+from benchmarks.stt_replay import replay
+
+
+def test_synthetic_corpus_is_deterministic():
+    a = SyntheticCorpus(300, 16, n_queries=5, seed=7)
+    b = SyntheticCorpus(300, 16, n_queries=5, seed=7)
+    assert np.array_equal(a.vectors, b.vectors)
+    assert np.array_equal(a.exact_top_k(3, chunk=64), b.exact_top_k(3))
+
+
+def test_retrieval_benchmark_reports_metrics(tmp_path):
+    results = run(sizes=[300], dim=16, targets=["knowledge", "memory"], backends=["lancedb", "mmap"],
+                  k=5, n_queries=10, workdir=str(tmp_path))
+    assert {(r["target"], r["backend"]) for r in results} == {
+        ("knowledge", "lancedb"), ("knowledge", "mmap"), ("memory", "lancedb"),
+    }
+    for r in results:
+        assert r["recall_at_k"] == 1.0  # all backends search exhaustively at this size
+        assert r["query_p50_ms"] <= r["query_p99_ms"]
+        assert r["ingest_rows_per_s"] > 0
+        assert r["disk_bytes"] > 0
+
+
+def test_stt_replay_drives_the_listening_loop_and_reports_metrics():
+    from core import vosk_models
+    from core.config import settings
+
+    rate = 16000
+    tone = 0.3 * np.sin(2 * np.pi * 220 * np.arange(rate) / rate)
+    quiet = np.zeros(2 * rate)
+    audio = np.concatenate([quiet[: rate // 2], tone, quiet, tone, quiet]).astype(np.float32)
+    result = replay(audio, speed=20, use_vad=False, use_dfn=False, fake_recognizer=True)
+    # The fake model is not left in the process-wide cache for later STTManagers
+    assert vosk_models._key(settings["stt"]["vosk_model_path"]) not in vosk_models._futures
+
+    assert result["utterances"] == 2
+    assert result["eou_latency_p50_ms"] > 0
+    assert result["dropped_blocks"] == 0
+    assert result["replayed_s"] >= result["audio_s"]
+    assert 0 < result["rtf"] < 1
+    assert result["alloc_peak_kib"] > 0
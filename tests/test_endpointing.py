@@ -0,0 +1,50 @@
+import numpy as np
+
+from core.endpointing import CONTINUE, ENDPOINT, NO_SPEECH, AdaptiveEndpointer, frame_energy_flags
+
+
+FRAME_MS = 32
+
+
+def feed(ep, pattern):
+    """pattern: list of (is_speech, duration_ms); returns (decision, elapsed_ms at decision)."""
+    for is_speech, duration in pattern:
+        for _ in range(duration // FRAME_MS):
+            decision = ep.update(FRAME_MS, is_speech)
+            if decision != CONTINUE:
+                return decision, ep.elapsed_ms
+    return CONTINUE, ep.elapsed_ms
+
+
+def test_trailing_silence_threshold_adapts_to_speaker_pauses():
+    ep = AdaptiveEndpointer(min_silence_ms=250, max_silence_ms=1200, initial_silence_ms=700)
+    assert feed(ep, [(True, 640), (False, 1000)])[0] == ENDPOINT
+    assert 700 <= ep.last_eou_latency_ms < 700 + FRAME_MS
+
+    # A speaker with short, regular pauses ends utterances sooner next time
+    ep.start()
+    feed(ep, [(True, 320), (False, 160)] * 5 + [(True, 320)])
+    assert ep.silence_threshold_ms < 300
+    ep.start()
+    assert feed(ep, [(True, 640), (False, 1000)])[0] == ENDPOINT
+    assert ep.last_eou_latency_ms < 300
+    assert ep.metrics()["eou_latency_p50_ms"] is not None
+
+
+def test_recognizer_final_and_no_speech_timeout():
+    ep = AdaptiveEndpointer(min_silence_ms=250, initial_silence_ms=900, no_speech_timeout_ms=2000)
+    feed(ep, [(True, 640)])
+    ep.note_final()
+    assert feed(ep, [(False, 1000)])[0] == ENDPOINT
+    assert ep.last_eou_latency_ms < 300
+
+    ep.start()
+    decision, elapsed = feed(ep, [(False, 3000)])
+    assert decision == NO_SPEECH and elapsed >= 2000
+
+
+def test_frame_energy_flags():
+    frames = np.zeros((3, 512), dtype=np.float32)
+    frames[1] = 0.1  # -20 dBFS
+    frames[2] = 0.001  # -60 dBFS
+    assert frame_energy_flags(frames, -45.0).tolist() == [False, True, False]
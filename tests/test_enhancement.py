@@ -0,0 +1,75 @@
+import time
+
+import numpy as np
+
+from core.enhancement import EnhancementStage
+
+
+class _SlowEnhancer:
+    enabled = True
+    hop_size = 160
+
+    def __init__(self, delay_s=0.0):
+        self.delay_s = delay_s
+        self.calls = []
+
+    def enhance_frame(self, audio):
+        self.calls.append(len(audio))
+        time.sleep(self.delay_s)
+        return audio * 0.5
+
+
+def _collect(stage, blocks):
+    out = []
+    for audio, is_speech in blocks:
+        stage.submit(audio, is_speech)
+        out.extend(stage.drain())
+    out.extend(stage.flush(timeout=2.0))
+    return np.concatenate(out)
+
+
+def test_enhances_hop_aligned_speech_and_keeps_order():
+    enhancer = _SlowEnhancer()
+    stage = EnhancementStage(enhancer, max_lag_ms=1000)
+    speech = np.ones(1000, dtype=np.float32)
+    silence = np.full(500, 0.25, dtype=np.float32)
+    out = _collect(stage, [(speech, True), (silence, False)])
+    stage.close()
+
+    assert all(n % 160 == 0 for n in enhancer.calls)
+    assert out.shape[0] == 1500
+    # 960 hop-aligned samples enhanced; the 40-sample remainder and the silence pass through
+    assert np.all(out[:960] == 0.5) and np.all(out[960:1000] == 1.0) and np.all(out[1000:] == 0.25)
+
+
+def test_falls_back_to_passthrough_when_behind():
+    stage = EnhancementStage(_SlowEnhancer(delay_s=0.05), max_queue=2, max_lag_ms=20)
+    blocks = [(np.full(1600, i, dtype=np.float32), True) for i in range(10)]
+    t0 = time.perf_counter()
+    for audio, is_speech in blocks:
+        stage.submit(audio, is_speech)
+    assert time.perf_counter() - t0 < 0.05  # submitting never waits on the enhancer
+    out = np.concatenate(stage.flush(timeout=2.0))
+    stage.close()
+
+    assert out.shape[0] == 16000
+    assert stage.stats["passthrough"] >= 5
+    # Order is preserved: block i comes out as i (passed through) or i / 2 (enhanced)
+    for i in range(1, 10):
+        assert out[i * 1600 + 800] in (i, i / 2)
+
+
+def test_flush_timeout_discards_the_previous_sessions_blocks():
+    stage = EnhancementStage(_SlowEnhancer(delay_s=0.2), max_lag_ms=1000)
+    stage.submit(np.full(1600, 7.0, dtype=np.float32), True)
+    stage.submit(np.full(1600, 7.0, dtype=np.float32), True)
+    time.sleep(0.05)  # the first block is now inside the enhancer
+    assert stage.flush(timeout=0.01) == []
+
+    # Next utterance: only its own audio comes out
+    stage.submit(np.full(320, 1.0, dtype=np.float32), False)
+    out = np.concatenate(stage.flush(timeout=2.0))
+    stage.close()
+
+    assert out.shape[0] == 320 and np.all(out == 1.0)
+    assert stage.metrics()["discarded"] == 2
@@ -48,3 +48,134 @@ def test_clear_index(tmp_knowledge_dir):
     assert km.query("alpha", top_k=5) == []
 
 
+
+
+def test_mmap_fallback_persists_across_restart(tmp_knowledge_dir):
+    km = KnowledgeManager(index_path=tmp_knowledge_dir, embeddings_client=FakeEmbeddings(), enabled=True, backend="mmap")
+    km.add_source("fruit", "Apples and bananas are fruits.", {"topic": "food"})
+    km.add_source("vehicle", "Cars and engines are related to automobiles.", {"topic": "transport"})
+
+    reopened = KnowledgeManager(index_path=tmp_knowledge_dir, embeddings_client=FakeEmbeddings(), enabled=True, backend="mmap")
+    results = reopened.query("apples", top_k=1)
+    assert len(results) == 1
+    assert results[0]["name"] == "fruit"
+    assert results[0]["meta"] == {"topic": "food"}
+
+    reopened.clear_index()
+    assert reopened.query("apples", top_k=1) == []
+
+
+def test_mmap_store_recovers_torn_append(tmp_knowledge_dir):
+    from core.vector_store import MmapVectorStore
+
+    store = MmapVectorStore(tmp_knowledge_dir, dim=3)
+    store.append({"name": "a"}, [1.0, 0.0, 0.0])
+    store.append({"name": "b"}, [0.0, 1.0, 0.0])
+    # Simulate a crash after the metadata and vector were written but before the offset commit
+    with open(os.path.join(tmp_knowledge_dir, store.META_FILE), "ab") as f:
+        f.write(b'{"name":"c"}\n')
+    with open(os.path.join(tmp_knowledge_dir, store.VECTORS_FILE), "ab") as f:
+        f.write(b"\x00" * 6)
+
+    reopened = MmapVectorStore(tmp_knowledge_dir)
+    assert len(reopened) == 2
+    assert reopened.search([0.0, 2.0, 0.0], top_k=1) == [(1, 1.0)]
+    assert reopened.get_record(1) == {"name": "b"}
+    assert reopened.append({"name": "c"}, [0.0, 0.0, 1.0]) == 2
+    assert reopened.get_record(2) == {"name": "c"}
+
+
+def test_query_with_memory_embeds_once(tmp_knowledge_dir):
+    from core.memory_manager import MemoryManager
+
+    class CountingEmbeddings(FakeEmbeddings):
+        calls = 0
+
+        def embed_query(self, text: str):
+            CountingEmbeddings.calls += 1
+            return super().embed_query(text)
+
+    emb = CountingEmbeddings()
+    km = KnowledgeManager(index_path=os.path.join(tmp_knowledge_dir, "kg"), embeddings_client=emb, enabled=True)
+    mm = MemoryManager(persist=True, enabled=True, db_path=os.path.join(tmp_knowledge_dir, "mem"),
+                       collection="tests", embeddings_client=emb)
+    km.add_source("fruit", "Apples and bananas are fruits.")
+    mm.store_message("user", "I ate apples today")
+
+    CountingEmbeddings.calls = 0
+    combined = km.query_with_memory("apples", mm)
+    assert CountingEmbeddings.calls == 1
+    assert combined["knowledge"] and combined["knowledge"][0]["name"] == "fruit"
+    assert combined["memory"] and combined["memory"][0]["text"] == "I ate apples today"
+
+    # Same turn, same text: served from the coordinator without re-embedding
+    bundle = km._retrieval.retrieve("Apples ")
+    assert CountingEmbeddings.calls == 1
+    assert {item.kind for item in bundle.items} == {"knowledge", "memory"}
+    assert all(0.0 <= item.score <= 1.0 for item in bundle.items)
+
+    # A write drops the cached bundle, so the next lookup sees the new rows
+    km.add_source("more-fruit", "Apples grow on apple trees.")
+    mm.store_message("user", "apples again")
+    CountingEmbeddings.calls = 0
+    refreshed = km.query_with_memory("apples", mm)
+    assert CountingEmbeddings.calls == 1
+    assert "more-fruit" in [d["name"] for d in refreshed["knowledge"]]
+    assert "apples again" in [r["text"] for r in refreshed["memory"]]
+    km.close()
+
+
+def test_sharded_query_merges_across_shards(tmp_knowledge_dir):
+    km = KnowledgeManager(index_path=tmp_knowledge_dir, embeddings_client=FakeEmbeddings(), enabled=True,
+                          shard_strategy="source")
+    km.add_source("fruit", "Apples and bananas are fruits.", {"source": "groceries"})
+    km.add_source("vehicle", "Cars and engines are related to automobiles.", {"source": "garage"})
+    assert km.list_shards() == {"groceries": 1, "garage": 1}
+
+    results = km.query("apples", top_k=2)
+    assert [r["name"] for r in results] == ["fruit", "vehicle"]
+    assert results[0]["score"] >= results[1]["score"]
+
+    reopened = KnowledgeManager(index_path=tmp_knowledge_dir, embeddings_client=FakeEmbeddings(), enabled=True,
+                                shard_strategy="source")
+    reopened.drop_shard("garage")
+    assert [r["name"] for r in reopened.query("apples", top_k=2)] == ["fruit"]
+    reopened.clear_index()
+    assert reopened.list_shards() == {}
+
+    # Documents without source metadata share one shard instead of a table each
+    reopened.add_source("note-1", "Apples are red.")
+    reopened.add_source("note-2", "Bananas are yellow.")
+    assert reopened.list_shards() == {"default": 2}
+    reopened.close()
+
+
+def test_enabling_sharding_keeps_earlier_documents_searchable(tmp_knowledge_dir):
+    km = KnowledgeManager(index_path=tmp_knowledge_dir, embeddings_client=FakeEmbeddings(), enabled=True)
+    km.add_source("fruit", "Apples and bananas are fruits.", {"source": "groceries"})
+
+    sharded = KnowledgeManager(index_path=tmp_knowledge_dir, embeddings_client=FakeEmbeddings(), enabled=True,
+                               shard_strategy="source")
+    sharded.add_source("vehicle", "Cars and engines are related to automobiles.", {"source": "garage"})
+    assert [r["name"] for r in sharded.query("apples", top_k=2)] == ["fruit", "vehicle"]
+    sharded.close()
+
+
+def test_documents_held_without_a_table_survive_a_restart(tmp_knowledge_dir):
+    class DownEmbeddings(FakeEmbeddings):
+        def embed_query(self, text: str):
+            raise ConnectionError("ollama unavailable")
+
+    km = KnowledgeManager(index_path=tmp_knowledge_dir, embeddings_client=DownEmbeddings(), enabled=True)
+    km.add_source("fruit", "Apples and bananas are fruits.", {"source": "groceries"})
+    assert km._table is None and km.count_pending_embeddings() == 1
+
+    # A new process finds the document and the backfill writes it once embeddings are back
+    restarted = KnowledgeManager(index_path=tmp_knowledge_dir, embeddings_client=FakeEmbeddings(), enabled=True)
+    [(handle, text)] = restarted.pending_embeddings(10)
+    assert text == "Apples and bananas are fruits."
+    assert restarted.apply_embeddings([(handle, FakeEmbeddings().embed_query(text))]) == 1
+    assert restarted.count_pending_embeddings() == 0
+    assert not os.path.exists(os.path.join(tmp_knowledge_dir, "documents.pending.jsonl"))
+    [result] = restarted.query("apples", top_k=1)
+    assert result["name"] == "fruit" and result["source"] == "groceries"
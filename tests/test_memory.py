@@ -125,3 +125,61 @@ async def test_autonomy_uses_async_memory(monkeypatch, tmp_lancedb_dir):
     assert suggestion is not None
     assert suggestion.metadata and "memory_context" in suggestion.metadata
 
+
+
+def test_backfill_embeds_rows_stored_without_vectors(tmp_lancedb_dir):
+    from core.embedding_backfill import EmbeddingBackfill
+
+    class FlakyEmbeddings(FakeEmbeddings):
+        down = True
+
+        def embed_query(self, text: str):
+            if self.down:
+                raise ConnectionError("ollama unavailable")
+            return super().embed_query(text)
+
+    emb = FlakyEmbeddings()
+    mm = MemoryManager(persist=True, enabled=True, db_path=tmp_lancedb_dir, collection="tests", embeddings_client=emb)
+    mm.clear_memory()
+    mm.store_message("user", "stored while embeddings were down")
+    assert mm.count_pending_embeddings() == 1
+
+    emb.down = False
+    mm.store_message("user", "stored with a vector")
+    emb.down = True
+    mm.store_message("user", "another row without a vector")
+    assert mm.count_pending_embeddings() == 2
+
+    backfill = EmbeddingBackfill(memory=mm, batch_size=1)
+    progress = backfill.run_once()
+    assert progress.healthy is False and progress.pending == 2
+
+    emb.down = False
+    progress = backfill.run_once()
+    assert progress.embedded == 2
+    assert progress.pending == 0
+    assert mm.count_pending_embeddings() == 0
+    texts = {r["text"] for r in mm.get_similar_messages("another row without a vector", top_k=3)}
+    assert texts == {"stored while embeddings were down", "stored with a vector", "another row without a vector"}
+
+
+def test_rows_held_without_a_table_survive_a_restart(tmp_lancedb_dir):
+    class DownEmbeddings(FakeEmbeddings):
+        def embed_query(self, text: str):
+            raise ConnectionError("ollama unavailable")
+
+    mm = MemoryManager(persist=True, enabled=True, db_path=tmp_lancedb_dir, collection="tests",
+                       embeddings_client=DownEmbeddings())
+    mm.clear_memory()
+    mm.store_message("user", "said before any table existed")
+    assert mm._table is None and mm.count_pending_embeddings() == 1
+
+    # A new process finds the row and the backfill writes it once embeddings are back
+    restarted = MemoryManager(persist=True, enabled=True, db_path=tmp_lancedb_dir, collection="tests",
+                              embeddings_client=FakeEmbeddings())
+    [(handle, text)] = restarted.pending_embeddings(10)
+    assert text == "said before any table existed"
+    assert restarted.apply_embeddings([(handle, FakeEmbeddings().embed_query(text))]) == 1
+    assert restarted.count_pending_embeddings() == 0
+    assert not os.path.exists(os.path.join(tmp_lancedb_dir, "tests.pending.jsonl"))
+    assert [r["text"] for r in restarted.get_similar_messages(text, top_k=1)] == [text]
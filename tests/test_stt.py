@@ -0,0 +1,430 @@
+import asyncio
+import json
+import os
+
+import numpy as np
+import pytest
+
+
+def test_onnx_vad_state_carries_across_calls():
+    pytest.importorskip("onnxruntime")
+    from core.stt_manager import _SileroOnnxVADProvider
+
+    path = _SileroOnnxVADProvider._packaged_model_path()
+    if path is None:
+        pytest.skip("silero-vad model files not installed")
+
+    t = np.arange(16000 * 2) / 16000
+    audio = (0.3 * np.sin(2 * np.pi * 220 * t) * (np.sin(2 * np.pi * 2 * t) > 0)).astype(np.float32)
+    frames = audio[: (audio.size // 512) * 512].reshape(-1, 512)
+
+    whole = _SileroOnnxVADProvider(16000, model_path=path)
+    chunked = _SileroOnnxVADProvider(16000, model_path=path)
+    expected = whole.speech_probs(frames)
+    got = np.concatenate([chunked.speech_probs(frames[i:i + 7]) for i in range(0, len(frames), 7)])
+    assert np.allclose(expected, got, atol=1e-5)
+
+
+def test_energy_gate_skips_silence_and_holds_through_hangover():
+    from core.stt_manager import _EnergyGate
+
+    gate = _EnergyGate(16000, threshold_dbfs=-40.0, hangover_ms=200)
+    silence = np.zeros(1600, dtype=np.int16)
+    speech = (np.sin(np.arange(1600) / 5.0) * 8000).astype(np.int16)
+
+    assert gate.update(silence) is False
+    assert gate.update(speech) is True
+    assert gate.level_dbfs > -40.0
+    # 100 ms and 200 ms of quiet are still inside the hangover, 300 ms is not
+    assert gate.update(silence) is True
+    assert gate.update(silence) is True
+    assert gate.update(silence) is False
+
+
+class _ScriptedRecognizer:
+    """Stands in for KaldiRecognizer: every third block completes a segment."""
+
+    def __init__(self, *args):
+        self.blocks = 0
+
+    def AcceptWaveform(self, data):
+        self.blocks += 1
+        return self.blocks % 3 == 0
+
+    def Result(self):
+        return json.dumps({"text": f"segment {self.blocks}"})
+
+    def PartialResult(self):
+        return json.dumps({"partial": f"partial {self.blocks}"})
+
+    def FinalResult(self):
+        return json.dumps({"text": "tail"})
+
+
+class _SilentStream:
+    def __init__(self, callback, **kwargs):
+        self.callback = callback
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def scripted_stt(monkeypatch):
+    from core import stt_manager, vosk_models
+
+    vosk_models.clear()
+    monkeypatch.setattr(vosk_models, "Model", lambda path: object())
+    monkeypatch.setattr(vosk_models, "KaldiRecognizer", _ScriptedRecognizer)
+    monkeypatch.setattr(stt_manager, "KaldiRecognizer", _ScriptedRecognizer)
+
+    def make(loop):
+        mgr = stt_manager.STTManager(loop)
+        mgr.use_dfn, mgr.enhancer = False, None
+        mgr.capture._stream_factory = _SilentStream
+        return mgr
+
+    yield make
+    vosk_models.clear()
+
+
+def test_listen_stream_yields_partials_then_finals(scripted_stt):
+    async def run():
+        mgr = scripted_stt(asyncio.get_running_loop())
+
+        async def speak(blocks):
+            await asyncio.sleep(0.05)
+            for _ in range(blocks):
+                mgr.capture._callback(np.full(mgr.blocksize, 1000, dtype=np.int16).tobytes(), mgr.blocksize, None, None)
+                await asyncio.sleep(0.01)
+
+        feeder = asyncio.create_task(speak(6))
+        events = []
+        async for event in mgr.listen_stream():
+            events.append((event.kind, event.text))
+            if len(events) == 6:
+                break
+        await feeder
+        return events
+
+    assert asyncio.run(run()) == [
+        ("partial", "partial 1"), ("partial", "partial 2"), ("final", "segment 3"),
+        ("partial", "partial 4"), ("partial", "partial 5"), ("final", "segment 6"),
+    ]
+
+
+def test_listen_stream_raises_when_the_recognizer_cannot_be_built(scripted_stt):
+    async def run():
+        mgr = scripted_stt(asyncio.get_running_loop())
+        await mgr.wait_until_ready()
+
+        def broken_model():
+            raise RuntimeError("model failed to load")
+
+        mgr._ensure_model = broken_model
+        mgr.recognizer = None  # e.g. select_model() to a model that fails to load
+
+        async def consume():
+            async for _ in mgr.listen_stream():
+                pass
+
+        with pytest.raises(RuntimeError, match="failed to load"):
+            await asyncio.wait_for(consume(), 2)
+        assert not mgr.is_listening
+
+    asyncio.run(run())
+
+
+def test_recognizers_share_one_background_loaded_model(scripted_stt):
+    from core import vosk_models
+    from core.config import settings
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        first, second = scripted_stt(loop), scripted_stt(loop)
+        await first.wait_until_ready()
+        return first.model_ready, second.model_ready
+
+    a, b = asyncio.run(run())
+    assert a is b
+    assert vosk_models.get_model(settings["stt"]["vosk_model_path"]) is a.result()
+
+
+def test_batch_transcriber_splits_files_into_segments(tmp_path, monkeypatch):
+    sf = pytest.importorskip("soundfile")
+    from core import batch_transcriber, vosk_models
+
+    class FileRecognizer(_ScriptedRecognizer):
+        def FinalResult(self):
+            return json.dumps({"text": f"utterance after {self.blocks} blocks"})
+
+    vosk_models.clear()
+    monkeypatch.setattr(vosk_models, "Model", lambda path: object())
+    monkeypatch.setattr(vosk_models, "KaldiRecognizer", FileRecognizer)
+    monkeypatch.setattr(batch_transcriber, "KaldiRecognizer", FileRecognizer)
+
+    rate = 8000  # resampled to 16 kHz on load
+    tone = 0.3 * np.sin(2 * np.pi * 220 * np.arange(rate) / rate)
+    quiet = np.zeros(2 * rate)
+    (tmp_path / "sessions").mkdir()
+    sf.write(tmp_path / "sessions" / "a.wav", np.concatenate([tone, quiet, tone, quiet]), rate)
+    sf.write(tmp_path / "sessions" / "notes.txt", np.zeros(10), rate, format="WAV")
+
+    with batch_transcriber.BatchTranscriber(workers=0, use_vad=False, use_dfn=False) as batch:
+        results = list(batch.transcribe([str(tmp_path / "sessions")]))
+    vosk_models.clear()
+
+    assert [os.path.basename(r["path"]) for r in results] == ["a.wav"]
+    result = results[0]
+    assert result["duration_s"] == pytest.approx(6.0)
+    assert len(result["segments"]) == 2
+    assert result["segments"][0]["start_s"] == 0.0
+    assert result["segments"][1]["start_s"] == pytest.approx(3.0)
+    assert result["rtf"] is not None
+
+
+def test_session_decodes_preroll_and_held_audio_before_speech_onset(scripted_stt):
+    class RecordingRecognizer(_ScriptedRecognizer):
+        def __init__(self, *args):
+            super().__init__(*args)
+            self.fed = []
+
+        def AcceptWaveform(self, data):
+            self.fed.append(np.frombuffer(data, dtype=np.int16).copy())
+            return False
+
+    async def run():
+        mgr = scripted_stt(asyncio.get_running_loop())
+        mgr.recognizer = RecordingRecognizer()
+        mgr.preroll_samples = 2 * mgr.blocksize
+        block = mgr.blocksize
+
+        def push(value):
+            mgr.capture._callback(np.full(block, value, dtype=np.int16).tobytes(), block, None, None)
+
+        # Spoken before the session starts: a quiet onset (below the energy gate), then speech
+        mgr.start_capture()
+        push(0)
+        push(20)
+        push(1000)
+
+        async def trailing_silence():
+            await asyncio.sleep(0.05)
+            for _ in range(4):
+                push(0)
+                await asyncio.sleep(0.01)
+
+        feeder = asyncio.create_task(trailing_silence())
+        async for _ in mgr.listen_stream():
+            pass
+        await feeder
+        return np.concatenate(mgr.recognizer.fed)
+
+    fed = asyncio.run(run())
+    # The session started two blocks back; the gated quiet onset was decoded ahead of the speech
+    # Without enhancement the captured samples reach the recognizer unconverted
+    assert np.array_equal(fed[:16000], np.repeat(np.array([20, 1000], dtype=np.int16), 8000))
+
+
+def test_stt_profile_overrides_base_settings():
+    from core.stt_manager import stt_profile_config
+
+    base = {
+        "capture_blocksize": 1600,
+        "endpointing": {"min_silence_ms": 300, "max_utterance_ms": 20000},
+        "profile": "balanced",
+        "profiles": {
+            "balanced": {"read_blocksize": 8000},
+            "low_latency": {"capture_blocksize": 320, "read_blocksize": 512, "endpointing": {"min_silence_ms": 100}},
+        },
+    }
+    assert stt_profile_config(base)["read_blocksize"] == 8000
+    fast = stt_profile_config(base, "low_latency")
+    assert fast["profile"] == "low_latency"
+    assert (fast["capture_blocksize"], fast["read_blocksize"]) == (320, 512)
+    assert fast["endpointing"] == {"min_silence_ms": 100, "max_utterance_ms": 20000}
+    assert base["endpointing"]["min_silence_ms"] == 300  # the base settings are not modified
+    assert stt_profile_config(base, "missing")["capture_blocksize"] == 1600
+
+
+def test_session_engine_serves_concurrent_streams_from_a_recognizer_pool(monkeypatch):
+    import threading
+
+    from core import stt_server, vosk_models
+
+    class StreamRecognizer:
+        created = 0
+
+        def __init__(self, *args):
+            StreamRecognizer.created += 1
+            self.samples = 0
+
+        def AcceptWaveform(self, data):
+            self.samples += len(data) // 2
+            return False
+
+        def PartialResult(self):
+            return json.dumps({"partial": ""})
+
+        def FinalResult(self):
+            text, self.samples = (f"{self.samples} samples" if self.samples else ""), 0
+            return json.dumps({"text": text})
+
+        def Reset(self):
+            self.samples = 0
+
+    vosk_models.clear()
+    monkeypatch.setattr(vosk_models, "Model", lambda path: object())
+    monkeypatch.setattr(vosk_models, "KaldiRecognizer", _ScriptedRecognizer)  # warm-up decode
+    monkeypatch.setattr(stt_server, "KaldiRecognizer", StreamRecognizer)
+
+    engine = stt_server.STTSessionEngine(workers=2, max_sessions=2, use_vad=False)
+    events = {}
+    on_event = lambda sid, event: events.setdefault(sid, []).append(event.text)
+    try:
+        rooms = [engine.open_session(on_event, f"room-{i}") for i in range(2)]
+        with pytest.raises(RuntimeError):
+            engine.open_session(on_event, "room-2")
+
+        block = 1600
+        speech = np.full(block, 3000, dtype=np.int16)
+        silence = np.zeros(block, dtype=np.int16)
+
+        def stream(session, speech_blocks):
+            for chunk in [speech] * speech_blocks + [silence] * 10:
+                engine.push(session, chunk.tobytes())
+
+        feeders = [threading.Thread(target=stream, args=(room, 5 + 5 * i)) for i, room in enumerate(rooms)]
+        for t in feeders:
+            t.start()
+        for t in feeders:
+            t.join()
+        metrics = [engine.close_session(room) for room in rooms]
+
+        # A later session reuses a pooled recognizer
+        engine.close_session(engine.open_session(on_event, "room-2"))
+    finally:
+        engine.shutdown()
+        vosk_models.clear()
+
+    assert StreamRecognizer.created == 2
+    # Each stream's endpoint closed its own utterance: 5 or 10 speech blocks plus trailing silence
+    first, second = (int(events[f"room-{i}"][0].split()[0]) for i in range(2))
+    assert second - first == 5 * block
+    for m in metrics:
+        assert m["utterances"] == 1
+        assert m["audio_s"] > 0 and m["latency_p50_ms"] is not None
+        assert m["endpoint_last_reason"] == "endpoint"
+
+
+def test_session_engine_falls_back_to_the_energy_gate_per_session(monkeypatch):
+    from core import stt_server, vosk_models
+
+    vosk_models.clear()
+    monkeypatch.setattr(vosk_models, "Model", lambda path: object())
+    monkeypatch.setattr(vosk_models, "KaldiRecognizer", _ScriptedRecognizer)
+    monkeypatch.setattr(stt_server, "KaldiRecognizer", _ScriptedRecognizer)
+    vad = object()
+    providers = iter([None, vad])
+    monkeypatch.setattr(stt_server, "build_vad_provider", lambda cfg, rate: next(providers))
+
+    engine = stt_server.STTSessionEngine(workers=1, max_sessions=2, use_vad=True)
+    try:
+        first = engine.open_session(lambda sid, event: None)
+        second = engine.open_session(lambda sid, event: None)
+        assert first.vad_provider is None  # this session uses the energy gate...
+        assert second.vad_provider is vad  # ...but the engine keeps trying VAD
+        assert engine.use_vad
+    finally:
+        engine.shutdown()
+        vosk_models.clear()
+
+
+def test_session_close_timeout_leaves_the_busy_recognizer_to_its_worker(monkeypatch):
+    import threading
+
+    from core import stt_server, vosk_models
+
+    decoding, proceed = threading.Event(), threading.Event()
+
+    class BlockingRecognizer(_ScriptedRecognizer):
+        busy = False
+
+        def AcceptWaveform(self, data):
+            self.busy = True
+            decoding.set()
+            proceed.wait(2)
+            self.busy = False
+            return False
+
+        def PartialResult(self):
+            return json.dumps({"partial": ""})
+
+        def FinalResult(self):
+            assert not self.busy, "FinalResult while a worker decodes"
+            return json.dumps({"text": ""})
+
+        def Reset(self):
+            pass
+
+    vosk_models.clear()
+    monkeypatch.setattr(vosk_models, "Model", lambda path: object())
+    monkeypatch.setattr(vosk_models, "KaldiRecognizer", _ScriptedRecognizer)
+    monkeypatch.setattr(stt_server, "KaldiRecognizer", BlockingRecognizer)
+
+    engine = stt_server.STTSessionEngine(workers=1, max_sessions=1, use_vad=False)
+    try:
+        session = engine.open_session(lambda sid, event: None)
+        engine.push(session, np.full(1600, 3000, dtype=np.int16).tobytes())
+        assert decoding.wait(1)
+        engine.close_session(session, timeout=0.05)
+        # The recognizer is not back in the pool while the worker still decodes on it
+        assert engine.pool.in_use == 1
+        with pytest.raises(RuntimeError):
+            engine.open_session(lambda sid, event: None, timeout=0.01)
+
+        proceed.set()
+        reopened = engine.open_session(lambda sid, event: None, timeout=1)
+        assert reopened.recognizer is session.recognizer
+    finally:
+        proceed.set()
+        engine.shutdown()
+        vosk_models.clear()
+
+
+def test_model_registry_evicts_lru_and_preloads_the_usual_next_model(tmp_path, monkeypatch):
+    from core import vosk_models
+
+    vosk_models.clear()
+    monkeypatch.setattr(vosk_models, "Model", lambda path: ("model", os.path.basename(path)))
+    monkeypatch.setattr(vosk_models, "KaldiRecognizer", _ScriptedRecognizer)
+    paths = {}
+    for key in ("en", "de", "fr"):
+        (tmp_path / key).mkdir()
+        (tmp_path / key / "final.mdl").write_bytes(bytes(1024 * 1024))
+        paths[key] = str(tmp_path / key)
+
+    registry = vosk_models.VoskModelRegistry(paths, default="en", budget_mb=2.5)
+    try:
+        assert registry.get() == ("model", "en")
+        assert registry.get("de") == ("model", "de")
+        assert registry.get("fr") == ("model", "fr")
+        # Three 1 MB models do not fit in 2.5 MB: the least recently used one went
+        assert registry.loaded() == ["de", "fr"]
+        assert registry.metrics()["evictions"] == 1
+
+        # 'en' has been followed by 'de' before, so switching back to 'en' preloads 'de'
+        # (first in line for eviction until it is actually used)
+        registry.get("en")
+        assert registry.loaded() == ["de", "en"]
+        # ...and using 'de' preloads its usual successor 'fr', evicting 'en' but never 'de'
+        registry.get("de")
+        assert registry.loaded() == ["fr", "de"]
+    finally:
+        vosk_models.clear()
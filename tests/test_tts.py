@@ -0,0 +1,197 @@
+import sys
+import threading
+import time
+import types
+
+import numpy as np
+
+
+class _FakeCoqui:
+    def __init__(self):
+        self.synthesizer = types.SimpleNamespace(output_sample_rate=22050)
+        self.calls = []
+
+    def tts(self, text):
+        self.calls.append(text)
+        return [0.0, 0.5, -0.5, 0.25]
+
+
+class _FakeOutputStream:
+    written = []
+    aborted = False
+    block_s = 0.0  # simulated device time per write
+
+    def __init__(self, samplerate, channels, dtype, **kwargs):
+        self.samplerate = samplerate
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def write(self, data):
+        _FakeOutputStream.written.append((self.samplerate, data.copy()))
+        time.sleep(self.block_s)
+
+    def abort(self):
+        _FakeOutputStream.aborted = True
+
+
+def test_coqui_speech_is_synthesized_and_played_in_memory(monkeypatch):
+    from core import tts_engine
+
+    engine = _FakeCoqui()
+    monkeypatch.setattr(tts_engine, "_init_coqui_tts", lambda: engine)
+    monkeypatch.setitem(sys.modules, "sounddevice", types.SimpleNamespace(OutputStream=_FakeOutputStream))
+    _FakeOutputStream.written = []
+
+    audio, rate = tts_engine.synthesize("hello")
+    assert rate == 22050
+    assert audio.dtype == np.float32 and audio.tolist() == [0.0, 0.5, -0.5, 0.25]
+
+    assert tts_engine.speak("hello there")
+    assert engine.calls == ["hello", "hello there"]
+    assert {rate for rate, _ in _FakeOutputStream.written} == {22050}
+    played = np.concatenate([data.reshape(-1) for _, data in _FakeOutputStream.written])
+    assert played.tolist() == [0.0, 0.5, -0.5, 0.25]
+
+
+def test_playback_is_chunked_and_stops_mid_phrase(monkeypatch):
+    from core import tts_engine
+
+    monkeypatch.setitem(sys.modules, "sounddevice", types.SimpleNamespace(OutputStream=_FakeOutputStream))
+    monkeypatch.setattr(_FakeOutputStream, "written", [])
+    monkeypatch.setattr(_FakeOutputStream, "aborted", False)
+    monkeypatch.setattr(_FakeOutputStream, "block_s", 0.02)
+
+    stop = threading.Event()
+    threading.Timer(0.1, stop.set).start()
+    t0 = time.perf_counter()
+    assert tts_engine.play_audio(np.zeros(16000 * 5, dtype=np.float32), 16000, should_stop=stop.is_set, block_ms=20)
+    assert time.perf_counter() - t0 < 0.5  # a 5 s phrase cut off after ~0.1 s
+    assert _FakeOutputStream.aborted
+    assert all(data.shape[0] == 320 for _, data in _FakeOutputStream.written)
+
+
+def test_tts_manager_renders_next_phrase_during_playback_and_cancels_both_stages(monkeypatch):
+    import asyncio
+
+    from core import tts_engine
+    from core.config import settings
+    from core.tts_manager import TTSManager
+
+    log, lock = [], threading.Lock()
+    release_first = threading.Event()
+
+    def synthesize(text):
+        with lock:
+            log.append(("synth", text))
+        time.sleep(0.02)
+        return np.zeros(4, dtype=np.float32), 16000
+
+    def play_audio(audio, rate, should_stop, block_ms):
+        with lock:
+            log.append(("play", len(log)))
+        while not (release_first.is_set() or should_stop()):
+            time.sleep(block_ms / 1000)
+        return True
+
+    monkeypatch.setattr(tts_engine, "synthesize", synthesize)
+    monkeypatch.setattr(tts_engine, "play_audio", play_audio)
+    monkeypatch.setitem(settings["voice"], "tts_cache", {"enabled": False})
+
+    async def scenario():
+        tts = TTSManager(asyncio.get_running_loop())
+        try:
+            for phrase in ("One.", "Two.", "Three.", "Four.", "Five."):
+                tts.speak(phrase)
+            deadline = time.monotonic() + 2
+            while time.monotonic() < deadline and sum(k == "synth" for k, _ in log) < 3:
+                await asyncio.sleep(0.01)
+            # Phrase one is still playing, yet two and three are already rendered
+            assert [k for k, _ in log].count("play") == 1
+            assert [t for k, t in log if k == "synth"][:3] == ["One.", "Two.", "Three."]
+
+            tts.stop()  # cuts phrase one off mid-playback
+            await asyncio.wait_for(tts.speak_complete_event.wait(), 2)
+            await asyncio.sleep(0.2)
+            assert [k for k, _ in log].count("play") == 1  # nothing queued before stop() plays
+            assert tts.metrics()["stops"] == 1 and tts.metrics()["stop_to_silence_max_ms"] < 100
+            release_first.set()
+
+            tts.speak_complete_event.clear()
+            tts.speak("After.")
+            tts.speak("Again.")
+            await asyncio.wait_for(tts.speak_complete_event.wait(), 2)
+            metrics = tts.metrics()
+            assert metrics["gaps"] == 1 and metrics["gap_max_ms"] < 100
+        finally:
+            tts.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_audio_cache_keys_on_normalized_text_and_persists_only_recurring_phrases(tmp_path):
+    from core.tts_cache import TTSAudioCache
+
+    calls = []
+
+    def synthesize(text):
+        calls.append(text)
+        return np.full(1000, len(calls), dtype=np.float32), 22050
+
+    cache = TTSAudioCache(str(tmp_path), engine="coqui", voice="vits", rate=165, ram_budget_mb=0.01)
+    audio, rate = cache.get_or_synthesize("Would you  like to hear it?", synthesize)
+    cache.get_or_synthesize("Just this once.", synthesize)
+    cache.flush(2)
+    assert cache.metrics()["disk_entries"] == 0  # one-off sentences stay in RAM
+
+    again, _ = cache.get_or_synthesize("would you like to hear it? ", synthesize)
+    assert calls == ["Would you  like to hear it?", "Just this once."] and rate == 22050
+    assert again is audio
+    cache.flush(2)
+    assert cache.metrics()["disk_entries"] == 1  # the repeat made it worth keeping
+
+    # A restart finds the phrase on disk; another speech rate is a different entry
+    fresh = TTSAudioCache(str(tmp_path), engine="coqui", voice="vits", rate=165)
+    loaded, _ = fresh.get("Would you like to hear it?")
+    assert np.array_equal(loaded, audio)
+    assert fresh.get("Just this once.") is None
+    assert TTSAudioCache(str(tmp_path), engine="coqui", voice="vits", rate=200).get("Would you like to hear it?") is None
+    assert fresh.metrics()["hits_disk"] == 1
+
+    # Prewarm renders only what is missing and persists it; the RAM budget (~2.5 entries) evicts the oldest
+    cache.prewarm(["Would you like to hear it?", "One.", "Two."], synthesize).join(2)
+    cache.flush(2)
+    assert calls == ["Would you  like to hear it?", "Just this once.", "One.", "Two."]
+    assert cache.metrics()["entries"] == 2 and cache.metrics()["disk_entries"] == 3
+    assert cache.get("Would you like to hear it?") is not None  # back from disk
+    assert cache.metrics()["hits_disk"] == 1
+    cache.close()
+
+
+def test_audio_cache_disk_store_stays_under_its_budget(tmp_path):
+    from core.tts_cache import TTSAudioCache
+
+    def synthesize(text):
+        return np.random.default_rng(len(text)).standard_normal(2000).astype(np.float32), 22050
+
+    probe = TTSAudioCache(str(tmp_path / "probe"), engine="coqui")
+    probe.prewarm(["Phrase 0."], synthesize).join(2)
+    probe.flush(2)
+    entry_bytes = probe.metrics()["disk_bytes"]
+    probe.close()
+
+    budget_mb = 2.5 * entry_bytes / (1024 * 1024)
+    cache = TTSAudioCache(str(tmp_path / "store"), engine="coqui", disk_budget_mb=budget_mb)
+    cache.prewarm([f"Phrase {i}." for i in range(5)], synthesize).join(2)
+    cache.flush(2)
+    metrics = cache.metrics()
+    assert metrics["disk_entries"] == 2 and metrics["disk_evictions"] == 3
+    assert metrics["disk_bytes"] <= budget_mb * 1024 * 1024
+    cache.close()
+
+    # The least recently written phrases were the ones deleted
+    reopened = TTSAudioCache(str(tmp_path / "store"), engine="coqui", disk_budget_mb=budget_mb, ram_budget_mb=0)
+    assert reopened.get("Phrase 0.") is None and reopened.get("Phrase 4.") is not None